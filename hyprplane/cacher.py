@@ -1,28 +1,32 @@
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 
-from cachetools import TTLCache
-
 from .utils import hyprctl_cmd
 
-MAX_POOL = 4
 SHORT_LIVE_CACHE = 1
 LONG_LIVE_CACHE = 600
 
-executor = ThreadPoolExecutor(MAX_POOL)
-
 
-class CacheControl(TTLCache):
+class CacheControl:
     def __init__(self, coroutine_factory, retention=SHORT_LIVE_CACHE) -> None:
         self.coFactory = coroutine_factory
         self.ready = False
         self.event = asyncio.Event()
-        super().__init__(maxsize=1024, ttl=retention)
+        self.retention = retention
+        # the TTLCache is only built on the first fetch, keeping cachetools
+        # off the daemon's import path
+        self.store = None
+
+    def getStore(self):
+        if self.store is None:
+            from cachetools import TTLCache
+
+            self.store = TTLCache(maxsize=1024, ttl=self.retention)
+        return self.store
 
     async def fetch(self):
         self.event.set()
-        result: asyncio.Task | None = self.get("_STORE")
+        result: asyncio.Task | None = self.getStore().get("_STORE")
         if result is None:
             if self.coFactory is None:
                 raise Exception("Must set coroutine factory before fetching data.")
@@ -31,12 +35,12 @@ class CacheControl(TTLCache):
             # print("no cache hit", result)
             return result
 
-        self.__setitem__("_STORE", result)
+        self.getStore()["_STORE"] = result
         self.event.clear()
         return result
 
     def revoke(self):
-        self.__setitem__("_STORE", None)
+        self.getStore()["_STORE"] = None
 
 
 @dataclass
@@ -1,54 +1,181 @@
+from __future__ import annotations
+
 import json
 from abc import ABC, abstractmethod
 from asyncio.subprocess import PIPE
+from dataclasses import dataclass
 from subprocess import Popen
+from typing import TYPE_CHECKING
+
+from hyprplane.controller.layout_core import plan_cache_stats
+from hyprplane.controller.spatial import DIRECTIONS
+from hyprplane.controller.stage_manager import page_step
+from hyprplane.metrics import metrics
+from hyprplane.tracing import tracer
+from hyprplane.utils import hyprctl_session
+
+if TYPE_CHECKING:
+    from hyprplane.controller.layout import LayoutController
+    from hyprplane.controller.stage_manager import StageController
+    from hyprplane.controller.focus import FocusHistory
+    from hyprplane.controller.window import WindowController
+
+PIPELINE_SEPARATOR = ","
+
+
+@dataclass(frozen=True)
+class CommandSpec:
+    name: str
+    strategy: type
+    description: str
+    # which controller the strategy receives: "window", "layout" or "pipeline"
+    controlMode: str = "window"
+    # repeats sent while the command runs fold into one run after it, see
+    # CommandStrategy.fold
+    coalesce: bool = False
+    # changes pin or stage state, the journal is written after it ran
+    mutates: bool = False
+
+
+# every command the daemon understands, filled in by the @command decorator
+COMMAND_REGISTRY: dict[str, CommandSpec] = {}
+_instances: dict[str, CommandStrategy] = {}
+
+
+def command(name, description, controlMode="window", coalesce=False, mutates=False):
+    def register(strategy):
+        COMMAND_REGISTRY[name] = CommandSpec(
+            name, strategy, description, controlMode, coalesce, mutates
+        )
+        return strategy
 
-from hyprplane.controller.layout import LayoutController
-from hyprplane.controller.stage_manager import StageController
-from hyprplane.controller.window import WindowController, WindowStack
+    return register
+
+
+def describeCommands():
+    return {name: spec.description for name, spec in COMMAND_REGISTRY.items()}
+
+
+def splitCommand(msg: str):
+    command_parts = msg.split(maxsplit=1)
+    if not command_parts:
+        return None, []
+    return command_parts[0], command_parts[1:]
 
 
 class CommandStrategy(ABC):
     @abstractmethod
-    async def execute(self, controller: WindowController, windStack: WindowStack, args):
+    async def execute(self, controller: WindowController, focus: FocusHistory, args):
         pass
 
+    def fold(self, queued, args):
+        """Args of the run owed after the running one once `args` is pressed
+        on top of the `queued` ones (None if no run is owed yet). Returning
+        None owes no run. Only the latest press counts by default, which
+        suits commands that end in the same state however often they run."""
+        return args
+
 
+class ToggleStrategy(CommandStrategy):
+    """A command that flips state: two folded presses cancel out, so the
+    state still ends where the number of presses says."""
+
+    def fold(self, queued, args):
+        return args if queued is None else None
+
+
+@command("toggle", "Toggle between two windows")
 class ToggleCommand(CommandStrategy):
-    async def execute(self, controller, windStack, args):
-        arg = args[0]
-        prev = windStack.getPrev()
-        if arg is None:
+    """Focus the most recent window of a class, or go back to the previous
+    window when that class is already focused. Answered from the focus
+    history, hyprland is only asked for a class it never reported."""
+
+    async def execute(self, controller, focus, args):
+        if not args:
             print("Must supply argument to toggle window")
             return
 
-        windAddrs = await controller.getWindowAddress(arg[0])
-        if prev is None:
-            active = await controller.get_active_window()
-            if windAddrs is None or active is None:
-                print("Invalid window classname")
-                return
-
-            windStack.appendToStack(active["address"])
-            await controller.focus_window(windAddrs)
+        className = args[0].strip()
+        active = focus.active()
+        if active is not None and focus.window_class(active) == className:
+            target = focus.nth(1)
         else:
-            await controller.focus_window(prev)
-            windStack.appendToStack(windAddrs)
+            target = focus.most_recent_of(className)
+            if target is None:
+                target = await controller.getWindowAddress(className)
 
+        if target is None:
+            print("Invalid window classname")
+            return
+        await controller.focus_window(target)
+        focus.push(target)
 
+
+@command("lockpin", "Lock the current window", mutates=True)
 class LockPinCommand(CommandStrategy):
-    async def execute(self, controller, windStack, args):
+    async def execute(self, controller, focus, args):
         await controller.lockWindow()
 
 
+@command("get_actions", "List the actions the daemon understands")
 class GetActionsCommand(CommandStrategy):
-    async def execute(self, controller, windStack, args):
-        actions = controller.get_available_actions()
-        return json.dumps(actions).encode()
+    async def execute(self, controller, focus, args):
+        return json.dumps(describeCommands()).encode()
+
+
+@command("stats", "Latency percentiles per command and hyprctl call, `reset` clears")
+class StatsCommand(CommandStrategy):
+    async def execute(self, controller, focus, args):
+        stats = metrics.snapshot()
+        stats["plan_cache"] = plan_cache_stats()
+        if args and args[0].strip() == "reset":
+            metrics.reset()
+        return json.dumps(stats).encode()
+
+
+@command(
+    "memstats",
+    "Entry counts and approximate bytes of the daemon state",
+    controlMode="layout",
+)
+class MemStatsCommand(CommandStrategy):
+    async def execute(self, controller: StageController, focus, args):
+        return json.dumps(controller.memory_stats()).encode()
+
+
+@command(
+    "focus-dir",
+    "Focus the nearest window left|right|up|down of the active one",
+    controlMode="layout",
+)
+class FocusDirectionCommand(CommandStrategy):
+    async def execute(self, controller: LayoutController, focus, args):
+        direction = args[0].strip() if args else ""
+        if direction not in DIRECTIONS:
+            print("Usage: focus-dir left|right|up|down")
+            return
+        await controller.focusDirection(direction)
+
+
+@command("trace", "Record spans: `trace start [path]`, `trace stop` writes the file")
+class TraceCommand(CommandStrategy):
+    async def execute(self, controller, focus, args):
+        action, traceArgs = splitCommand(args[0]) if args else (None, [])
+        if action == "start":
+            tracer.start(traceArgs[0] if traceArgs else None)
+            return json.dumps({"tracing": True, "path": tracer.path}).encode()
+        elif action == "stop":
+            if not tracer.enabled:
+                return json.dumps({"tracing": False}).encode()
+            path = await tracer.stop_async()
+            return json.dumps({"tracing": False, "path": path}).encode()
+
+        print("Usage: trace start [path] | trace stop")
+        return json.dumps({"tracing": tracer.enabled}).encode()
 
 
 class PinCommand(CommandStrategy):
-    async def execute(self, controller, windStack, args):
+    async def execute(self, controller, focus, args):
         if len(args) < 2:
             print("Must supply at least 2 windows to pin")
             return
@@ -57,27 +184,13 @@ class PinCommand(CommandStrategy):
         win1Addrs = await controller.getWindowAddress(win1)
         win2Addrs = await controller.getWindowAddress(win2)
 
-        windStack.setPinLock()
-        windStack.appendToStack(win1Addrs)
-        windStack.appendToStack(win2Addrs)
-
-        wIndex1 = windStack.stacks[-1]
-        wIndex2 = windStack.stacks[-2]
-
-        active = await controller.get_active_window()
-        if active is None:
-            return
-
-        active = active["address"]
-        prev = windStack.getPrev()
-        if prev is None or active == wIndex1:
-            await controller.focus_window(wIndex2)
-        else:
-            await controller.focus_window(wIndex1)
+        target = win2Addrs if focus.active() == win1Addrs else win1Addrs
+        await controller.focus_window(target)
+        focus.push(target)
 
 
 class LaunchPair(CommandStrategy):
-    async def execute(self, controller, windStack, args):
+    async def execute(self, controller, focus, args):
         if len(args) < 2:
             print("Must supply at least 2 windows to pin")
             return
@@ -90,38 +203,41 @@ class LaunchPair(CommandStrategy):
 
 
 class CommandResolver:
-    def __init__(self):
-        self._strategies = {
-            "toggle": ToggleCommand(),
-            "lockpin": LockPinCommand(),
-            "get_actions": GetActionsCommand(),
-            "toggle-lock": ToggleLockCommand(),
-            "switch-group": ToggleLockGroupCommand(),
-            "pin": ModifyLockGroupCommand(),
-            "generate-lock": GenerateLockGroupCommand(),
-            "toggle-float": ToggleFloatMode(),
-            "estage": EnterStage(),
-            "cycle-stage": CycleStage(),
-        }
+    """Resolve command names against COMMAND_REGISTRY.
+
+    Strategies are stateless so each one is created the first time it is
+    requested and reused for every later message.
+    """
+
+    def getSpec(self, command):
+        return COMMAND_REGISTRY.get(command, None)
 
     def getStrategy(self, command):
-        return self._strategies.get(command, None)
+        strategy = _instances.get(command)
+        if strategy is None:
+            spec = COMMAND_REGISTRY.get(command)
+            if spec is None:
+                return None
+            strategy = _instances[command] = spec.strategy()
+        return strategy
 
 
+@command("generate-lock", "Generate window lock group", mutates=True)
 class GenerateLockGroupCommand(CommandStrategy):
-    async def execute(self, controller: WindowController, windStack: WindowStack, args):
+    async def execute(self, controller: WindowController, focus: FocusHistory, args):
         # groupName = args[0] if args else "default"
         controller.createGroup(args[0] if args else None)
 
 
+@command("pin", "Pinning window for toggle", mutates=True)
 class ModifyLockGroupCommand(CommandStrategy):
-    async def execute(self, controller: WindowController, windStack: WindowStack, args):
+    async def execute(self, controller: WindowController, focus: FocusHistory, args):
         if len(args) < 2:
             print("Must supply group name and window class.")
             return
 
         win = await controller.get_active_window()
-        curr = controller.pinLockTable["currentGroup"]
+        curr = controller.pins.current
         if win is None:
             return
 
@@ -134,20 +250,27 @@ class ModifyLockGroupCommand(CommandStrategy):
                 await controller.lockWindow()
 
 
+@command("toggle-lock", "Toggle between pinned windows", mutates=True)
 class ToggleLockCommand(CommandStrategy):
     def __init__(self, direction="forward"):
         self.direction = direction
 
-    async def execute(self, controller: WindowController, windStack: WindowStack, args):
+    async def execute(self, controller: WindowController, focus: FocusHistory, args):
         dir = args[0] if args else self.direction
-        await controller.toggleWithinGroup(dir)
+        # step from the focused window without asking hyprland, and send
+        # focuswindow and bringactivetotop in one round trip
+        async with hyprctl_session():
+            target = await controller.toggleWithinGroup(dir, focus.active())
+        if target is not None:
+            focus.push(target)
 
 
+@command("switch-group", "Switch to the next lock group", mutates=True)
 class ToggleLockGroupCommand(CommandStrategy):
     def __init__(self, direction="forward"):
         self.direction = direction
 
-    async def execute(self, controller: WindowController, windStack: WindowStack, args):
+    async def execute(self, controller: WindowController, focus: FocusHistory, args):
         dir = args[0] if args else self.direction
         await controller.toggleGroup()
 
@@ -156,38 +279,122 @@ class ClearGroup(CommandStrategy):
     def __init__(self, clearance="current"):
         self.clearance = clearance
 
-    async def execute(self, controller: WindowController, windStack: WindowStack, args):
+    async def execute(self, controller: WindowController, focus: FocusHistory, args):
         dir = args[0] if args else self.clearance
-        controller.pinLockTable["group"]
-        # await controller.clearLockGroup()
+        controller.clearGroup(controller.pins.current)
 
 
-class ToggleFloatMode(CommandStrategy):
+@command(
+    "toggle-float",
+    "Toggle floating layout on the current workspace",
+    controlMode="layout",
+    coalesce=True,
+)
+class ToggleFloatMode(ToggleStrategy):
     def __init__(self, clearance="current"):
         self.clearance = clearance
-        self.controlMode = "layout"
 
-    async def execute(self, controller: LayoutController, windStack: WindowStack, args):
+    async def execute(self, controller: LayoutController, focus: FocusHistory, args):
         dir = args[0] if args else self.clearance
         print("CEN", controller)
         await controller.toggleFloatMode()
 
 
-class EnterStage(CommandStrategy):
+@command(
+    "estage",
+    "Toggle stage manager on the current workspace",
+    controlMode="layout",
+    coalesce=True,
+    mutates=True,
+)
+class EnterStage(ToggleStrategy):
     def __init__(self, clearance="current"):
         self.clearance = clearance
-        self.controlMode = "layout"
 
-    async def execute(self, controller: StageController, windStack: WindowStack, args):
+    async def execute(self, controller: StageController, focus: FocusHistory, args):
         dir = args[0] if args else self.clearance
         await controller.toggle_layout_mode()
 
 
+@command(
+    "cycle-stage",
+    "Cycle the main stage window",
+    controlMode="layout",
+    mutates=True,
+)
 class CycleStage(CommandStrategy):
     def __init__(self, clearance="current"):
         self.clearance = clearance
-        self.controlMode = "layout"
 
-    async def execute(self, controller: StageController, windStack: WindowStack, args):
+    async def execute(self, controller: StageController, focus: FocusHistory, args):
         dir = args[0] if args else self.clearance
         await controller.cycle_main_window()
+
+
+@command(
+    "stage-page",
+    "Page the stage mini windows: next, prev, +N, -N or a page number",
+    controlMode="layout",
+    coalesce=True,
+)
+class PageStage(CommandStrategy):
+    async def execute(self, controller: StageController, focus: FocusHistory, args):
+        await controller.page_stage(args[0].strip() if args else "next")
+
+    def fold(self, queued, args):
+        # relative steps add up, an absolute page resets the count
+        page = args[0].strip() if args else "next"
+        step = page_step(page)
+        if queued is None or step is None:
+            return [page]
+        previous = queued[0]
+        if previous.isdigit():
+            return [str(max(int(previous) + step, 1))]
+        queuedStep = page_step(previous)
+        if queuedStep is None:
+            return [page]
+        total = queuedStep + step
+        return [f"{total:+d}"] if total else None
+
+
+@command(
+    "relayout-all",
+    "Relayout every stage workspace on every monitor in one batch",
+    controlMode="layout",
+    coalesce=True,
+)
+class RelayoutAll(CommandStrategy):
+    async def execute(self, controller: StageController, focus: FocusHistory, args):
+        await controller.relayout_all()
+
+
+@command(
+    "pipeline",
+    "Run comma separated actions in one batched round trip",
+    controlMode="pipeline",
+)
+class PipelineCommand(CommandStrategy):
+    """Run several actions in one request, e.g. `pipeline generate-lock, lockpin`.
+
+    Steps share one snapshot of the active window and clients and their
+    dispatches are flushed to hyprland as a single batch once every step ran.
+    """
+
+    async def execute(self, runStep, focus: FocusHistory, args):
+        if not args:
+            print("Must supply at least one action to pipeline")
+            return
+
+        steps = [step for step in args[0].split(PIPELINE_SEPARATOR) if step.strip()]
+        ran, skipped = [], []
+        async with hyprctl_session():
+            for step in steps:
+                name, stepArgs = splitCommand(step)
+                spec = COMMAND_REGISTRY.get(name)
+                if spec is None or spec.controlMode == "pipeline":
+                    skipped.append(name)
+                    continue
+                await runStep(name, stepArgs)
+                ran.append(name)
+
+        return json.dumps({"ran": ran, "skipped": skipped}).encode()
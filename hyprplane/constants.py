@@ -1,2 +1,4 @@
 SOCKET_PATH = "/tmp/hyprland_controller.sock"
 TIMEOUT = 5
+# a restarting daemon asks the running one for the control socket here
+HANDOFF_PATH = f"{SOCKET_PATH}.handoff"
@@ -0,0 +1,178 @@
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, Optional
+
+from hyprplane.controller.handles import WindowRecord
+
+# addresses remembered per ring, the global one and one per workspace
+FOCUS_RING_SIZE = 32
+
+
+class FocusRing:
+    """The last `capacity` focused addresses, most recent first.
+
+    The OrderedDict is the address -> node map and the linked list in one,
+    so push, dedup and dropping the oldest entry are all O(1).
+    """
+
+    __slots__ = ("capacity", "entries")
+
+    def __init__(self, capacity: int = FOCUS_RING_SIZE) -> None:
+        self.capacity = capacity
+        self.entries: OrderedDict[str, None] = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, address: str):
+        return address in self.entries
+
+    def __iter__(self) -> Iterator[str]:
+        return reversed(self.entries)
+
+    def push(self, address: str):
+        entries = self.entries
+        if address in entries:
+            entries.move_to_end(address)
+            return
+        entries[address] = None
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+
+    def remove(self, address: str):
+        self.entries.pop(address, None)
+
+    def nth(self, n: int) -> Optional[str]:
+        return next(itertools.islice(reversed(self.entries), n, None), None)
+
+
+class FocusHistory:
+    """MRU rings of focused windows, globally and per workspace name.
+
+    Fed from socket2 by track_event, so focus changes made outside hyprplane
+    count too, and reseeded from the focusHistoryID of the clients after a
+    reconnect. The event thread writes and command handlers read, hence the
+    lock.
+    """
+
+    def __init__(self, capacity: int = FOCUS_RING_SIZE) -> None:
+        self.capacity = capacity
+        self.recent = FocusRing(capacity)
+        self.workspaces: Dict[str, FocusRing] = {}
+        # every open window we heard of, focused or not
+        self.classes: Dict[str, str] = {}
+        self.window_workspace: Dict[str, str] = {}
+        # activewindow carries the class, the activewindowv2 after it the address
+        self.pending_class: Optional[str] = None
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.recent)
+
+    def seed(self, clients: Iterable[WindowRecord]):
+        """Rebuild every ring from hyprland's own focus order."""
+        clients = list(clients)
+        with self.lock:
+            self.recent = FocusRing(self.capacity)
+            self.workspaces.clear()
+            self.classes = {c.address: c.window_class for c in clients}
+            self.window_workspace = {c.address: c.workspace_name for c in clients}
+            focused = [c for c in clients if c.focus_history >= 0]
+            # focusHistoryID 0 is the active window, push it last
+            for client in sorted(focused, key=lambda c: -c.focus_history):
+                self._push(client.address)
+
+    def track_event(self, event):
+        fields = event.data.split(",")
+        address = f"0x{fields[0]}"
+        with self.lock:
+            if event.name == "activewindow":
+                self.pending_class = fields[0] or None
+            elif event.name == "activewindowv2":
+                if fields[0]:
+                    if self.pending_class and address not in self.classes:
+                        self.classes[address] = self.pending_class
+                    self._push(address)
+                self.pending_class = None
+            elif event.name == "openwindow" and len(fields) > 2:
+                self.window_workspace[address] = fields[1]
+                self.classes[address] = fields[2]
+            elif event.name == "movewindowv2" and len(fields) > 2:
+                self._move(address, fields[2])
+            elif event.name == "closewindow":
+                self._forget(address)
+            elif event.name.startswith("destroyworkspace"):
+                # destroyworkspace>>name, destroyworkspacev2>>id,name
+                self.workspaces.pop(fields[-1], None)
+
+    def push(self, address: str):
+        """Record a focus change we made before its event comes back."""
+        with self.lock:
+            self._push(address)
+
+    def active(self) -> Optional[str]:
+        return self.nth(0)
+
+    def nth(self, n: int, workspace: Optional[str] = None) -> Optional[str]:
+        """The nth most recently focused window, 0 being the active one."""
+        with self.lock:
+            ring = self.recent if workspace is None else self.workspaces.get(workspace)
+            return ring.nth(n) if ring is not None else None
+
+    def window_class(self, address: str) -> Optional[str]:
+        return self.classes.get(address)
+
+    def most_recent_of(
+        self, window_class: str, workspace: Optional[str] = None, skip: int = 0
+    ) -> Optional[str]:
+        """Most recently focused window of `window_class`, `skip` matches in.
+
+        Open windows of that class that were never focused come after the
+        ones in the ring.
+        """
+        with self.lock:
+            ring = self.recent if workspace is None else self.workspaces.get(workspace)
+            seen = dict.fromkeys(ring) if ring is not None else {}
+            unfocused = (
+                address
+                for address, workspace_name in self.window_workspace.items()
+                if (workspace is None or workspace_name == workspace)
+                and address not in seen
+            )
+            matches = (
+                address
+                for address in itertools.chain(seen, unfocused)
+                if self.classes.get(address) == window_class
+            )
+            return next(itertools.islice(matches, skip, None), None)
+
+    def _push(self, address: str):
+        self.recent.push(address)
+        workspace = self.window_workspace.get(address)
+        if workspace is not None:
+            self._ring(workspace).push(address)
+
+    def _ring(self, workspace: str) -> FocusRing:
+        ring = self.workspaces.get(workspace)
+        if ring is None:
+            ring = self.workspaces[workspace] = FocusRing(self.capacity)
+        return ring
+
+    def _move(self, address: str, workspace: str):
+        previous = self.window_workspace.get(address)
+        self.window_workspace[address] = workspace
+        if previous is None or previous == workspace:
+            return
+        ring = self.workspaces.get(previous)
+        if ring is not None and address in ring:
+            ring.remove(address)
+            self._ring(workspace).push(address)
+
+    def _forget(self, address: str):
+        self.recent.remove(address)
+        self.classes.pop(address, None)
+        workspace = self.window_workspace.pop(address, None)
+        ring = self.workspaces.get(workspace)
+        if ring is not None:
+            ring.remove(address)
@@ -0,0 +1,161 @@
+import itertools
+import sys
+import threading
+from typing import Dict, Optional
+
+
+class WindowRegistry:
+    """Interns window addresses to small int handles.
+
+    Layout structures key windows by handle, so group and slot lookups hash
+    and compare ints; the "0x..." string is only needed again to talk to
+    hyprland. Handles are never reused, a record that outlives its window
+    can't be mistaken for a newer one, and release() only forgets the
+    address of a closed window.
+    """
+
+    def __init__(self) -> None:
+        self.handles: Dict[str, int] = {}
+        self.addresses: Dict[int, str] = {}
+        self.counter = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.handles)
+
+    def __contains__(self, address: str):
+        return address in self.handles
+
+    def intern(self, address: str) -> int:
+        handle = self.handles.get(address)
+        if handle is None:
+            # the event thread and command handlers both open windows
+            with self.lock:
+                handle = self.handles.get(address)
+                if handle is None:
+                    address = sys.intern(address)
+                    handle = self.handles[address] = next(self.counter)
+                    self.addresses[handle] = address
+        return handle
+
+    def get(self, address: str) -> Optional[int]:
+        return self.handles.get(address)
+
+    def address(self, handle: int) -> Optional[str]:
+        """Address of a handle, None once its window was released."""
+        return self.addresses.get(handle)
+
+    def release(self, address: str):
+        with self.lock:
+            handle = self.handles.pop(address, None)
+            self.addresses.pop(handle, None)
+
+
+window_handles = WindowRegistry()
+
+
+# the only fields of a hyprctl client the controllers read, see WindowRecord
+CLIENT_FIELDS = (
+    "address",
+    "at",
+    "size",
+    "workspace",
+    "class",
+    "title",
+    "floating",
+    "monitor",
+    "focusHistoryID",
+)
+
+
+class WindowRecord:
+    """A window as the controllers keep it: handle, the interned address and
+    the CLIENT_FIELDS of its client, geometry as ints, instead of the whole
+    client dict. `hyprctl_cmd("clients", True)` returns these."""
+
+    __slots__ = (
+        "handle",
+        "address",
+        "workspace",
+        "workspace_name",
+        "window_class",
+        "title",
+        "x",
+        "y",
+        "w",
+        "h",
+        "floating",
+        "monitor",
+        "focus_history",
+    )
+
+    def __init__(
+        self,
+        address: str,
+        workspace: Optional[int] = None,
+        window_class: str = "",
+        title: str = "",
+        x: int = 0,
+        y: int = 0,
+        w: int = 0,
+        h: int = 0,
+        floating: bool = False,
+        monitor: int = -1,
+        focus_history: int = -1,
+        workspace_name: str = "",
+    ) -> None:
+        self.handle = window_handles.intern(address)
+        self.address = sys.intern(address)
+        self.workspace = workspace
+        self.workspace_name = workspace_name or str(workspace)
+        self.window_class = window_class
+        self.title = title
+        self.x, self.y, self.w, self.h = x, y, w, h
+        self.floating = floating
+        self.monitor = monitor
+        self.focus_history = focus_history
+
+    @classmethod
+    def from_client(cls, client: Dict) -> "WindowRecord":
+        workspace = client.get("workspace") or {}
+        x, y = client.get("at", (0, 0))
+        w, h = client.get("size", (0, 0))
+        return cls(
+            client["address"],
+            workspace.get("id"),
+            client.get("class", ""),
+            client.get("title", ""),
+            x,
+            y,
+            w,
+            h,
+            client.get("floating", False),
+            client.get("monitor", -1),
+            client.get("focusHistoryID", -1),
+            workspace.get("name", ""),
+        )
+
+    def as_client(self) -> Dict:
+        """Client shaped dict with the CLIENT_FIELDS, for JSON snapshots."""
+        return {
+            "address": self.address,
+            "at": [self.x, self.y],
+            "size": [self.w, self.h],
+            "workspace": {"id": self.workspace, "name": self.workspace_name},
+            "class": self.window_class,
+            "title": self.title,
+            "floating": self.floating,
+            "monitor": self.monitor,
+            "focusHistoryID": self.focus_history,
+        }
+
+    def __eq__(self, other):
+        if not isinstance(other, WindowRecord):
+            return NotImplemented
+        return self.handle == other.handle
+
+    def __hash__(self):
+        return self.handle
+
+    def __repr__(self):
+        return f"WindowRecord({self.address}, workspace={self.workspace})"
@@ -1,10 +1,13 @@
-import random
 from typing import Dict, List, Optional, Tuple
 
+from hyprplane.controller.handles import WindowRecord, window_handles
+from hyprplane.controller.layout_core import Move, layout_plan, note_monitors
+from hyprplane.controller.spatial import EDGE_TOLERANCE, SpatialIndex
 from hyprplane.controller.window import WindowController
 from hyprplane.drawer import printWindowLayout
 
-from ..utils import hyprctl_cmd
+from ..tracing import traced
+from ..utils import hyprctl_cmd, hyprctl_session
 
 
 class LayoutController(WindowController):
@@ -12,8 +15,11 @@ class LayoutController(WindowController):
         super().__init__()
         self.is_floating = False
         self.window_control = windCont
-        self.layout_history: Dict[int, List[Dict]] = {}
+        self.layout_history: Dict[int, List[WindowRecord]] = {}
         self.current_workspace_id: Optional[int] = None
+        self.spatial = SpatialIndex()
+        # workspaces laid out by applyFloatingLayout, redone on monitor changes
+        self.floating_workspaces: set = set()
 
     # async def applyStageManagerLayout(self, clients: List[Dict]):
     #     screen_width, screen_height, offset_x, offset_y = await self.getScreenSize()
@@ -57,15 +63,9 @@ class LayoutController(WindowController):
             return
 
         workspace_clients = [
-            {
-                "address": client["address"],
-                "size": client["size"],
-                "at": client["at"],
-                "class": client["class"],
-                "workspace": client["workspace"]["id"],
-            }
+            client
             for client in clients
-            if client["workspace"]["id"] == self.current_workspace_id
+            if client.workspace == self.current_workspace_id
         ]
         self.layout_history[self.current_workspace_id] = workspace_clients
 
@@ -82,7 +82,7 @@ class LayoutController(WindowController):
         current_workspace_clients = [
             client
             for client in current_clients
-            if client["workspace"]["id"] == self.current_workspace_id
+            if client.workspace == self.current_workspace_id
         ]
 
         if self.current_workspace_id not in self.layout_history:
@@ -95,13 +95,14 @@ class LayoutController(WindowController):
 
         for stored, current in zip(stored_clients, current_workspace_clients):
             if (
-                stored["address"] != current["address"]
-                or stored["class"] != current["class"]
+                stored.address != current.address
+                or stored.window_class != current.window_class
             ):
                 return False
 
         return Trueget_active_window
 
+    @traced("layout.toggle_float")
     async def toggleFloatMode(self):
         active_window = await self.window_control.get_active_window()
         if active_window is None:
@@ -116,7 +117,7 @@ class LayoutController(WindowController):
 
         if not self.is_floating:
             for client in clients:
-                address = client["address"]
+                address = client.address
                 res = await hyprctl_cmd(f"dispatch setfloating address:{address}", True)
                 print("RRRRR ", res)
             # await self.applyFloatingLayout(clients)
@@ -126,184 +127,67 @@ class LayoutController(WindowController):
             print("IS FLOATINGGGGGGGGGGGGGGGGGGGGGGGGGG", self.layout_history)
 
             for client in clients:
-                address = client["address"]
+                address = client.address
                 await hyprctl_cmd(f"dispatch settiled address:{address}", True)
 
         await self.applyFloatingLayout(clients)
         # await self.toggleFloatingWorkspace(clients)
 
         self.is_floating = not self.is_floating
-
-    async def applyFloatingLayout(self, clients: List[Dict]):
-        num_clients = len(clients)
-        if num_clients == 1:
-            await self.floatSingleWindow(clients[0])
-        elif num_clients == 2:
-            await self.floatTwoWindows(clients)
-        elif num_clients == 3:
-            await self.floatThreeWindows(clients)
-            # await self.applyStageManagerLayout(clients)
-        elif num_clients == 4:
-            await self.floatFourWindows(clients)
-        elif num_clients == 5:
-            await self.floatFiveWindows(clients)
+        if self.is_floating:
+            self.floating_workspaces.add(self.current_workspace_id)
         else:
-            await self.floatSixOrMoreWindows(clients)
-            # await self.applyStageManagerLayout(clients)
-
-    async def floatSingleWindow(self, client):
-        screen_width, screen_height, offset_x, offset_y, _ = await self.getScreenSize()
-        window_width = int(screen_width * 0.6)
-        window_height = int(screen_height * 0.6)
-        x = offset_x + (screen_width - window_width) // 2
-        y = offset_y + (screen_height - window_height) // 2
-        await self.move_and_resize_window(
-            client["address"], x, y, window_width, window_height
-        )
+            self.floating_workspaces.discard(self.current_workspace_id)
 
-    async def floatTwoWindows(self, clients):
-        screen_width, screen_height, offset_x, offset_y, _ = await self.getScreenSize()
-        window_width = int(screen_width * 0.5)
-        window_height = int(screen_height * 0.5)
-        overlap = int(window_width * 0.1)
-        positions = [
-            (
-                offset_x + (screen_width - window_width) // 2,
-                offset_y + (screen_height - window_height) // 2 - overlap,
-            ),
-            (
-                offset_x + (screen_width - window_width) // 2,
-                offset_y + (screen_height - window_height) // 2 + overlap,
-            ),
-        ]
-        for client, (x, y) in zip(clients, positions):
-            await self.move_and_resize_window(
-                client["address"], x, y, window_width, window_height
-            )
+    @traced("layout.apply_floating")
+    async def applyFloatingLayout(
+        self, clients: List[Dict], workspace: Optional[int] = None
+    ):
+        if workspace is None:
+            workspace = self.current_workspace_id
+        screen = await self.getScreenSize(workspace=workspace)
+        if screen is None or not clients:
+            return
 
-    async def floatThreeWindows(self, clients):
-        screen_width, screen_height, offset_x, offset_y, _ = await self.getScreenSize()
-        back_width = int(screen_width * 0.45)
-        back_height = int(screen_height * 0.45)
-        center_width = int(screen_width * 0.5)
-        center_height = int(screen_height * 0.5)
-        overlap = int(back_width * 0.1)
-        positions = [
-            (
-                offset_x + (screen_width - back_width) // 2,
-                offset_y + (screen_height - back_height) // 2 - overlap,
-            ),
-            (
-                offset_x + (screen_width - back_width) // 2,
-                offset_y + (screen_height - back_height) // 2 + overlap,
-            ),
-            (
-                offset_x + (screen_width - center_width) // 2,
-                offset_y + (screen_height - center_height) // 2,
-            ),
-        ]
-        for client, (x, y) in zip(clients, positions):
-            width, height = (
-                (back_width, back_height)
-                if client != clients[2]
-                else (center_width, center_height)
-            )
-            print("Waa Haa", width, height)
-            await self.move_and_resize_window(client["address"], x, y, width, height)
-
-    async def floatFourWindows(self, clients):
-        screen_width, screen_height, offset_x, offset_y, _ = await self.getScreenSize()
-        window_width = int(screen_width * 0.45)
-        window_height = int(screen_height * 0.45)
-        overlap = int(window_width * 0.1)
-        base_positions = [
-            (offset_x, offset_y),
-            (offset_x + screen_width - window_width, offset_y),
-            (offset_x, offset_y + screen_height - window_height),
-            (
-                offset_x + screen_width - window_width,
-                offset_y + screen_height - window_height,
-            ),
-        ]
-        positions = [
-            (
-                x + random.randint(-overlap, overlap),
-                y + random.randint(-overlap, overlap),
-            )
-            for x, y in base_positions
-        ]
-        for client, (x, y) in zip(clients, positions):
-            await self.move_and_resize_window(
-                client["address"], x, y, window_width, window_height
-            )
+        # seeded per workspace so the plan can come from the cache
+        seed = workspace or 0
+        slots = layout_plan("float", tuple(screen[:4]), len(clients), seed)
+        await self.apply_plan(
+            [
+                (client.address, *slot)
+                for client, slot in zip(clients, slots)
+            ]
+        )
 
-    async def floatFiveWindows(self, clients):
-        screen_width, screen_height, offset_x, offset_y, _ = await self.getScreenSize()
-        outer_width = int(screen_width * 0.4)
-        outer_height = int(screen_height * 0.4)
-        center_width = max(int(outer_width * 0.8), 400)
-        center_height = max(int(outer_height * 0.8), 400)
-        overlap = int(outer_width * 0.1)
-        base_positions = [
-            (offset_x, offset_y),
-            (offset_x + screen_width - outer_width, offset_y),
-            (offset_x, offset_y + screen_height - outer_height),
-            (
-                offset_x + screen_width - outer_width,
-                offset_y + screen_height - outer_height,
-            ),
-            (
-                offset_x + (screen_width - center_width) // 2,
-                offset_y + (screen_height - center_height) // 2,
-            ),
-        ]
-        positions = [
-            (
-                x + random.randint(-overlap, overlap),
-                y + random.randint(-overlap, overlap),
-            )
-            for x, y in base_positions
-        ]
-        for client, (x, y) in zip(clients, positions):
-            width, height = (
-                (center_width, center_height)
-                if client == clients[4]
-                else (outer_width, outer_height)
-            )
-            await self.move_and_resize_window(client["address"], x, y, width, height)
-
-    async def floatSixOrMoreWindows(self, clients):
-        screen_width, screen_height, offset_x, offset_y, _ = await self.getScreenSize()
-        num_clients = len(clients)
-        grid_size = max(2, int((num_clients - 1) ** 0.5) + 1)
-        window_width = screen_width // grid_size
-        window_height = screen_height // grid_size
-        overlap = int(window_width * 0.1)
-        positions = [
-            (
-                offset_x
-                + i % grid_size * window_width
-                + random.randint(-overlap, overlap),
-                offset_y
-                + i // grid_size * window_height
-                + random.randint(-overlap, overlap),
-            )
-            for i in range(num_clients)
-        ]
-        for client, (x, y) in zip(clients, positions):
-            await self.move_and_resize_window(
-                client["address"], x, y, window_width, window_height
-            )
+    def evict_window(self, address: str):
+        """Drop a closed window from the saved layouts and the pin groups."""
+        handle = window_handles.get(address)
+        for windows in self.layout_history.values():
+            windows[:] = [w for w in windows if w.handle != handle]
+        self.window_control.pruneWindow(address)
+        window_handles.release(address)
+
+    def evict_workspace(self, workspace: int):
+        """Drop everything kept for a workspace hyprland destroyed."""
+        self.layout_history.pop(workspace, None)
+        self.floating_workspaces.discard(workspace)
+        self.spatial.dropWorkspace(workspace)
+
+    async def apply_plan(self, plan: List[Move]):
+        """Dispatch a list of (address, x, y, w, h) moves in one batch."""
+        async with hyprctl_session():
+            for address, x, y, width, height in plan:
+                await self.move_and_resize_window(address, x, y, width, height)
 
     async def toggle_floating_workspace(self, clients):
         if self.is_floating:
             for client in clients:
-                address = client["address"]
+                address = client.address
                 await hyprctl_cmd(f"dispatch settiled address:{address}", True)
 
         else:
             for client in clients:
-                address = client["address"]
+                address = client.address
                 await hyprctl_cmd(f"dispatch setfloating address:{address}", True)
             pass
 
@@ -317,12 +201,10 @@ class LayoutController(WindowController):
         windows = self.layout_history[self.current_workspace_id]
 
         for stored in windows:
-            address = stored["address"]
-            x, y = stored["at"]
-            width, height = stored["size"]
-
             # await hyprctlCommand(f"dispatch setfloating address:{address}", True)
-            await self.move_and_resize_window(address, x, y, width, height)
+            await self.move_and_resize_window(
+                stored.address, stored.x, stored.y, stored.w, stored.h
+            )
 
     async def ensureFullWindow(self):
         if (
@@ -336,9 +218,8 @@ class LayoutController(WindowController):
             return
 
         for stored in windows:
-            address = stored["address"]
             await hyprctl_cmd(
-                f"dispatch resizewindowpixel exact 100% 100%,address:{address}"
+                f"dispatch resizewindowpixel exact 100% 100%,address:{stored.address}"
             )
 
     async def move_and_resize_window(
@@ -356,26 +237,35 @@ class LayoutController(WindowController):
         await hyprctl_cmd(
             f"dispatch resizewindowpixel exact {minW} {minH},address:{address}"
         )
+        self.spatial.update(address, x, y, minW, minH)
 
         # await hyprctlCommand(f"dispatch movewindowpixel exact {x} {y},address:{address}")
         # await hyprctlCommand(f"dispatch resizewindowpixel exact {width} {height},address:{address}")
 
+    @traced("layout.get_screen_size")
     async def getScreenSize(
-        self, hint: str | None = None
+        self, hint: str | None = None, workspace: int | None = None
     ) -> Tuple[int, int, int, int, str]:
         monitor_info = await hyprctl_cmd("monitors", True)
+        if not monitor_info:
+            return None
+        note_monitors(monitor_info)
+
+        if workspace is None:
+            workspace = self.current_workspace_id
+
         current_monitor = None
         if hint is not None:
             current_monitor = next((m for m in monitor_info if m["name"] == hint), None)
         else:
             current_monitor = next(
-                (
-                    m
-                    for m in monitor_info
-                    if m["activeWorkspace"]["id"] == self.current_workspace_id
-                ),
+                (m for m in monitor_info if m["activeWorkspace"]["id"] == workspace),
                 None,
             )
+        if current_monitor is None and workspace is not None:
+            # the workspace is not shown right now, ask where it lives
+            hint = await self.getWorkspaceMonitor(workspace)
+            current_monitor = next((m for m in monitor_info if m["name"] == hint), None)
 
         # print("CM", current_monitor, monitor_info, self.current_workspace_id, hint)
 
@@ -395,81 +285,50 @@ class LayoutController(WindowController):
             current_monitor["name"],
         )
 
+    async def getWorkspaceMonitor(self, workspace: int) -> Optional[str]:
+        workspaces = await hyprctl_cmd("workspaces", True) or []
+        return next(
+            (ws["monitor"] for ws in workspaces if ws["id"] == workspace), None
+        )
+
     async def printNeighbors(self, workspace_id: int) -> None:
         await printWindowLayout(self, workspace_id)
 
-    async def findNeighbors(self, workspace_id: int) -> Dict[str, Dict[str, str]]:
+    async def refreshSpatialIndex(self) -> bool:
         cl = self.window_control.props.get("clients")
         if cl is None:
-            return {}
+            return False
         clients = await cl.fetch()
         if clients is None:
-            return {}
+            return False
+        self.spatial.rebuild(clients)
+        return True
 
-        workspace_clients = [
-            {
-                "address": client["address"],
-                "size": client["size"],
-                "at": client["at"],
-                "class": client["class"],
-                "workspace": client["workspace"]["id"],
-                "focusHistoryID": client["focusHistoryID"],
-                "floating": client["floating"],
-            }
-            for client in clients
-            if client["workspace"]["id"] == workspace_id
-        ]
+    async def findNeighbors(self, workspace_id: int) -> Dict[str, Dict[str, str]]:
+        if self.spatial.needsRebuild(workspace_id):
+            await self.refreshSpatialIndex()
+        return self.spatial.neighbors(workspace_id, EDGE_TOLERANCE)
+
+    async def focusDirection(self, direction: str):
+        active_window = await self.window_control.get_active_window()
+        if active_window is None:
+            return
+
+        address = active_window["address"]
+        workspace_id = active_window["workspace"]["id"]
+        if (
+            self.spatial.needsRebuild(workspace_id)
+            or self.spatial.windowWorkspace.get(address) != workspace_id
+        ):
+            await self.refreshSpatialIndex()
+        else:
+            # the active window reply carries its geometry, keep it current
+            self.spatial.update(address, *active_window["at"], *active_window["size"])
+
+        target = self.spatial.nearest(address, direction)
+        if target is None:
+            # nothing on this workspace that way, let hyprland cross monitors
+            await hyprctl_cmd(f"dispatch movefocus {direction[0]}")
+            return
 
-        neighbors = {}
-        threshold = 50  # Define a threshold for proximity
-
-        for client in workspace_clients:
-            neighbors[client["address"]] = {
-                "left": None,
-                "right": None,
-                "top": None,
-                "bottom": None,
-            }
-            client_x, client_y = client["at"]
-            client_width, client_height = client["size"]
-
-            for other_client in workspace_clients:
-                if client["address"] == other_client["address"]:
-                    continue
-
-                other_x, other_y = other_client["at"]
-                other_width, other_height = other_client["size"]
-
-                # Check if other_client is to the right and within proximity threshold
-                if (
-                    client_y < other_y + other_height
-                    and client_y + client_height > other_y
-                    and abs(client_x + client_width - other_x) <= threshold
-                ):
-                    neighbors[client["address"]]["right"] = other_client["address"]
-
-                # Check if other_client is to the left and within proximity threshold
-                if (
-                    client_y < other_y + other_height
-                    and client_y + client_height > other_y
-                    and abs(other_x + other_width - client_x) <= threshold
-                ):
-                    neighbors[client["address"]]["left"] = other_client["address"]
-
-                # Check if other_client is above and within proximity threshold
-                if (
-                    client_x < other_x + other_width
-                    and client_x + client_width > other_x
-                    and abs(other_y + other_height - client_y) <= threshold
-                ):
-                    neighbors[client["address"]]["top"] = other_client["address"]
-
-                # Check if other_client is below and within proximity threshold
-                if (
-                    client_x < other_x + other_width
-                    and client_x + client_width > other_x
-                    and abs(client_y + client_height - other_y) <= threshold
-                ):
-                    neighbors[client["address"]]["bottom"] = other_client["address"]
-
-        return neighbors
+        await self.focus_window(target)
@@ -0,0 +1,528 @@
+"""Slot geometry for the stage manager and floating layouts.
+
+Window geometry is kept column-wise in a structured numpy array when numpy is
+installed (plain lists of tuples otherwise), whole layouts are computed as
+array operations and turned straight into a list of moves to dispatch.
+"""
+
+import random
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from hyprplane.controller.handles import WindowRecord, window_handles
+
+Rect = Tuple[int, int, int, int]
+Move = Tuple[str, int, int, int, int]
+
+# stage manager: main window on the right, minified windows in columns
+MAIN_WIDTH = 0.8
+MAIN_HEIGHT = 0.9
+MAIN_PADDING = 20
+MINI_WIDTH = 0.18
+MINI_HEIGHT = 0.24
+MINI_GAP = 30
+
+WINDOW_DTYPE = [
+    ("handle", "<i8"),
+    ("x", "<i4"),
+    ("y", "<i4"),
+    ("w", "<i4"),
+    ("h", "<i4"),
+    ("monitor", "<i2"),
+    ("floating", "?"),
+]
+
+# layout plans kept around, one per (kind, monitor geometry, count, seed)
+PLAN_CACHE_SIZE = 256
+
+_numpy = None
+
+
+def get_numpy():
+    """numpy if it is installed, imported on first use, else None."""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+
+class Screen(NamedTuple):
+    # same order as LayoutController.getScreenSize
+    width: int
+    height: int
+    x: int
+    y: int
+    name: str
+
+
+class StageGeometry(NamedTuple):
+    main: Rect
+    mini_w: int
+    mini_h: int
+    mini_x: int
+    mini_y: int
+    step_x: int
+    step_y: int
+    per_col: int
+    max_cols: int
+    # mini columns left of the main slot, one page of the mini stack
+    page_cols: int
+
+
+def stage_geometry(screen: Sequence) -> StageGeometry:
+    width, height, offset_x, offset_y = screen[:4]
+    main_w = int(width * MAIN_WIDTH)
+    main_h = int(height * MAIN_HEIGHT)
+    main = (
+        offset_x + (width - main_w) - MAIN_PADDING,
+        offset_y + (height - main_h) // 2,
+        main_w,
+        main_h,
+    )
+
+    mini_w = int(width * MINI_WIDTH)
+    mini_h = int(height * MINI_HEIGHT)
+    step_x = mini_w + MINI_GAP
+    step_y = mini_h + MINI_GAP
+    # counted relative to the monitor, a monitor placed below or right of
+    # another one still fits the same number of slots
+    per_col = max(1, height // step_y)
+    max_cols = max(1, width // step_x)
+    page_cols = max(1, (main[0] - offset_x + MINI_GAP) // step_x)
+    return StageGeometry(
+        main,
+        mini_w,
+        mini_h,
+        offset_x,
+        offset_y,
+        step_x,
+        step_y,
+        per_col,
+        max_cols,
+        page_cols,
+    )
+
+
+def stage_slots(geometry: StageGeometry, count: int):
+    """x and y of the first `count` mini slots, filled column by column.
+
+    Every page of the mini stack reuses the same on-screen columns.
+    """
+    g = geometry
+    np = get_numpy()
+    if np is not None:
+        i = np.arange(count)
+        return (
+            g.mini_x + (i // g.per_col % g.page_cols) * g.step_x,
+            g.mini_y + (i % g.per_col) * g.step_y,
+        )
+
+    xs = [g.mini_x + (i // g.per_col % g.page_cols) * g.step_x for i in range(count)]
+    ys = [g.mini_y + (i % g.per_col) * g.step_y for i in range(count)]
+    return xs, ys
+
+
+def _jitter(rng: random.Random, overlap: int):
+    return rng.randint(-overlap, overlap)
+
+
+def float_slots(screen: Sequence, count: int, seed: Optional[int] = None) -> List[Rect]:
+    """Rectangles of the floating layout for `count` windows.
+
+    One to five windows use hand made templates, more windows are spread on
+    a grid. Corner and grid slots are jittered, pass `seed` to make the
+    jitter reproducible.
+    """
+    width, height, offset_x, offset_y = screen[:4]
+    rng = random.Random(seed)
+
+    def centered(w, h, dy=0):
+        return (offset_x + (width - w) // 2, offset_y + (height - h) // 2 + dy, w, h)
+
+    def corners(w, h):
+        overlap = int(w * 0.1)
+        return [
+            (x + _jitter(rng, overlap), y + _jitter(rng, overlap), w, h)
+            for x, y in (
+                (offset_x, offset_y),
+                (offset_x + width - w, offset_y),
+                (offset_x, offset_y + height - h),
+                (offset_x + width - w, offset_y + height - h),
+            )
+        ]
+
+    if count <= 0:
+        return []
+    if count == 1:
+        return [centered(int(width * 0.6), int(height * 0.6))]
+    if count == 2:
+        w, h = int(width * 0.5), int(height * 0.5)
+        overlap = int(w * 0.1)
+        return [centered(w, h, -overlap), centered(w, h, overlap)]
+    if count == 3:
+        w, h = int(width * 0.45), int(height * 0.45)
+        overlap = int(w * 0.1)
+        return [
+            centered(w, h, -overlap),
+            centered(w, h, overlap),
+            centered(int(width * 0.5), int(height * 0.5)),
+        ]
+    if count == 4:
+        return corners(int(width * 0.45), int(height * 0.45))
+    if count == 5:
+        w, h = int(width * 0.4), int(height * 0.4)
+        overlap = int(w * 0.1)
+        cx, cy, cw, ch = centered(max(int(w * 0.8), 400), max(int(h * 0.8), 400))
+        return corners(w, h) + [
+            (cx + _jitter(rng, overlap), cy + _jitter(rng, overlap), cw, ch)
+        ]
+    return grid_slots(screen, count, rng)
+
+
+def grid_slots(screen: Sequence, count: int, rng: random.Random) -> List[Rect]:
+    width, height, offset_x, offset_y = screen[:4]
+    grid_size = max(2, int((count - 1) ** 0.5) + 1)
+    w = width // grid_size
+    h = height // grid_size
+    overlap = int(w * 0.1)
+
+    np = get_numpy()
+    if np is not None:
+        i = np.arange(count)
+        jitter = np.random.default_rng(rng.getrandbits(32))
+        dx = jitter.integers(-overlap, overlap + 1, count)
+        dy = jitter.integers(-overlap, overlap + 1, count)
+        xs = offset_x + (i % grid_size) * w + dx
+        ys = offset_y + (i // grid_size) * h + dy
+        return [(x, y, w, h) for x, y in zip(xs.tolist(), ys.tolist())]
+
+    return [
+        (
+            offset_x + i % grid_size * w + _jitter(rng, overlap),
+            offset_y + i // grid_size * h + _jitter(rng, overlap),
+            w,
+            h,
+        )
+        for i in range(count)
+    ]
+
+
+def position_moves(positions: List["SlotRecord"]) -> List[Move]:
+    return [(p.address, p.x, p.y, p.w, p.h) for p in positions]
+
+
+class SlotRecord:
+    """Mini slot of one window, geometry as ints."""
+
+    __slots__ = ("handle", "address", "x", "y", "w", "h", "page", "monitor")
+
+    def __init__(self, handle: int, address: str, w: int, h: int, monitor: str):
+        self.handle = handle
+        self.address = address
+        self.x = self.y = self.page = 0
+        self.w, self.h = w, h
+        self.monitor = monitor
+
+    def __repr__(self):
+        return f"SlotRecord({self.address}, {self.x}, {self.y}, page={self.page})"
+
+
+class SlotAllocator:
+    """Mini window slots of one stage workspace on one monitor.
+
+    Slots are handed out column by column. A closed window leaves a hole
+    that compact() closes by moving every window after it one slot up, into
+    earlier columns and pages too, so only the last column has free rows.
+    `positions` holds one SlotRecord per window in allocation order; it is
+    updated in place, so it can be shared as the workspace's prevPos list.
+    Columns, slots and records are keyed by window handle (see handles.py),
+    addresses are interned once when they come in.
+
+    Columns are grouped in pages of `geometry.page_cols`, only the windows
+    of the current page are on screen, the others are parked by the caller.
+    """
+
+    def __init__(self, geometry: StageGeometry, monitor: str) -> None:
+        self.geometry = geometry
+        self.monitor = monitor
+        self.columns: List[List[Optional[int]]] = [[]]
+        self.slots: Dict[int, Tuple[int, int]] = {}
+        self.records: Dict[int, SlotRecord] = {}
+        self.positions: List[SlotRecord] = []
+        # vacant (column, row) slots, popped from the end
+        self.free_slots: List[Tuple[int, int]] = []
+        self.dirty_columns: set = set()
+        self.page = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, address: str):
+        return window_handles.get(address) in self.slots
+
+    def record(self, address: str) -> Optional[SlotRecord]:
+        return self.records.get(window_handles.get(address))
+
+    def _place(self, record: SlotRecord, col: int, row: int):
+        g = self.geometry
+        record.x = g.mini_x + col % g.page_cols * g.step_x
+        record.y = g.mini_y + row * g.step_y
+        record.page = col // g.page_cols
+        self.slots[record.handle] = (col, row)
+
+    @property
+    def page_count(self) -> int:
+        return (len(self.columns) - 1) // self.geometry.page_cols + 1
+
+    def visible(self, record: SlotRecord) -> bool:
+        return record.page == self.page
+
+    def page_records(self, page: int) -> List[SlotRecord]:
+        cols = self.geometry.page_cols
+        return [
+            self.records[handle]
+            for column in self.columns[page * cols : (page + 1) * cols]
+            for handle in column
+            if handle is not None
+        ]
+
+    def set_page(self, page: int) -> Tuple[List[SlotRecord], List[SlotRecord]]:
+        """Switch the visible page, returns the records entering and leaving
+        the screen. Only those two pages are looked at."""
+        page = min(max(page, 0), self.page_count - 1)
+        if page == self.page:
+            return [], []
+        leaving = self.page_records(self.page)
+        self.page = page
+        return self.page_records(page), leaving
+
+    def _vacant(self, col: int, row: int) -> bool:
+        if col >= len(self.columns) or row >= self.geometry.per_col:
+            return False
+        column = self.columns[col]
+        # a hole, or the first row past the end of a compacted column
+        return row == len(column) or (row < len(column) and column[row] is None)
+
+    def allocate(self, address: str) -> SlotRecord:
+        handle = window_handles.intern(address)
+        if handle in self.records:
+            return self.records[handle]
+
+        while self.free_slots:
+            col, row = self.free_slots.pop()
+            if self._vacant(col, row):
+                break
+        else:
+            col = len(self.columns) - 1
+            if len(self.columns[col]) >= self.geometry.per_col:
+                col += 1
+                self.columns.append([])
+            row = len(self.columns[col])
+
+        column = self.columns[col]
+        if row == len(column):
+            column.append(handle)
+        else:
+            column[row] = handle
+        record = SlotRecord(
+            handle, address, self.geometry.mini_w, self.geometry.mini_h, self.monitor
+        )
+        self._place(record, col, row)
+        self.records[handle] = record
+        self.positions.append(record)
+        return record
+
+    def free(self, address: str) -> bool:
+        handle = window_handles.get(address)
+        slot = self.slots.pop(handle, None)
+        if slot is None:
+            return False
+        col, row = slot
+        self.columns[col][row] = None
+        self.positions.remove(self.records.pop(handle))
+        self.free_slots.append(slot)
+        self.dirty_columns.add(col)
+        return True
+
+    def compact(
+        self,
+    ) -> Tuple[List[SlotRecord], List[SlotRecord], List[SlotRecord]]:
+        """Close the holes left by free().
+
+        Returns the records that moved on the visible page, the ones that
+        came onto it from a later page and the ones that left it; the caller
+        moves the first, unparks the second and parks the third. A visible
+        page that emptied at the end of the stack gives way to the one before.
+        """
+        if not self.dirty_columns:
+            return [], [], []
+        first = min(self.dirty_columns)
+        per_col = self.geometry.per_col
+        handles = [
+            handle
+            for column in self.columns[first:]
+            for handle in column
+            if handle is not None
+        ]
+        del self.columns[first:]
+        # handle -> page it was on, for every record that changed slot
+        moved: Dict[int, int] = {}
+        for i, handle in enumerate(handles):
+            col, row = first + i // per_col, i % per_col
+            if row == 0:
+                self.columns.append([])
+            self.columns[-1].append(handle)
+            if self.slots[handle] != (col, row):
+                record = self.records[handle]
+                moved[handle] = record.page
+                self._place(record, col, row)
+        if not self.columns:
+            self.columns.append([])
+        self.dirty_columns.clear()
+        # every column but the last is full again
+        self.free_slots.clear()
+
+        shown_page = self.page
+        self.page = min(self.page, self.page_count - 1)
+        if self.page != shown_page:
+            for record in self.page_records(self.page):
+                moved.setdefault(record.handle, record.page)
+
+        shown, entering, leaving = [], [], []
+        for handle, page in moved.items():
+            record = self.records[handle]
+            if self.visible(record):
+                (shown if page == shown_page else entering).append(record)
+            elif page == shown_page:
+                leaving.append(record)
+        return shown, entering, leaving
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def layout_plan(
+    kind: str, geometry: Rect, count: int, seed: Optional[int] = None
+) -> Tuple[Rect, ...]:
+    """Slot rectangles of a layout, memoized.
+
+    `geometry` is the monitor (width, height, x, y). "stage" returns the main
+    slot followed by `count` mini slots, "float" the floating layout of
+    `count` windows with its jitter drawn from `seed`.
+    """
+    if kind == "stage":
+        g = stage_geometry(geometry)
+        xs, ys = stage_slots(g, count)
+        if not isinstance(xs, list):
+            xs, ys = xs.tolist(), ys.tolist()
+        return (g.main, *((x, y, g.mini_w, g.mini_h) for x, y in zip(xs, ys)))
+    if kind == "float":
+        return tuple(float_slots(geometry, count, seed))
+    raise ValueError(f"Unknown layout kind {kind}")
+
+
+_monitors: Optional[tuple] = None
+
+
+def note_monitors(monitors: List[dict]):
+    """Drop every cached plan once the monitor setup changed."""
+    global _monitors
+    signature = tuple(
+        (m["name"], m["width"], m["height"], m["x"], m["y"], m.get("scale"))
+        for m in monitors
+    )
+    if signature != _monitors:
+        if _monitors is not None:
+            layout_plan.cache_clear()
+        _monitors = signature
+
+
+def plan_cache_stats() -> dict:
+    info = layout_plan.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+    }
+
+
+class WindowTable:
+    """Geometry of a set of windows: handle, x, y, w, h, monitor, floating.
+
+    Rows hold the window handle (see handles.py), moves are addressed through
+    window_handles again; a window released meanwhile gets no move.
+    """
+
+    def __init__(self, rows: List[tuple]) -> None:
+        np = get_numpy()
+        self.rows = np.array(rows, dtype=WINDOW_DTYPE) if np is not None else rows
+
+    @classmethod
+    def from_clients(cls, clients: List[WindowRecord]) -> "WindowTable":
+        return cls(
+            [
+                (
+                    client.handle,
+                    client.x,
+                    client.y,
+                    client.w,
+                    client.h,
+                    client.monitor,
+                    client.floating,
+                )
+                for client in clients
+            ]
+        )
+
+    def __len__(self):
+        return len(self.rows)
+
+    def plan_moves(self, xs, ys, ws, hs) -> List[Move]:
+        """Moves that put every row at the target geometry, skipping floating
+        rows already there. Tiled rows are always moved, floating them changes
+        their geometry. Targets may be arrays/lists or a single value."""
+        np = get_numpy()
+        if np is not None:
+            rows = self.rows
+            count = len(rows)
+            xs, ys, ws, hs = (
+                np.broadcast_to(np.asarray(v), count) for v in (xs, ys, ws, hs)
+            )
+            changed = (
+                (rows["x"] != xs)
+                | (rows["y"] != ys)
+                | (rows["w"] != ws)
+                | (rows["h"] != hs)
+                | ~rows["floating"]
+            )
+            picked = zip(
+                rows["handle"][changed].tolist(),
+                xs[changed].tolist(),
+                ys[changed].tolist(),
+                ws[changed].tolist(),
+                hs[changed].tolist(),
+            )
+        else:
+            count = len(self.rows)
+            targets = [
+                v if isinstance(v, (list, tuple)) else [v] * count
+                for v in (xs, ys, ws, hs)
+            ]
+            picked = (
+                (row[0], x, y, w, h)
+                for row, x, y, w, h in zip(self.rows, *targets)
+                if not row[6] or tuple(row[1:5]) != (x, y, w, h)
+            )
+
+        moves = []
+        for handle, x, y, w, h in picked:
+            address = window_handles.address(handle)
+            if address is not None:
+                moves.append((address, x, y, w, h))
+        return moves
@@ -0,0 +1,203 @@
+from typing import Dict, Iterator, List, Optional, Set
+
+
+class PinGroup:
+    """Windows of one lock group in pin order, with a circular cursor on
+    the window the group last focused.
+
+    `positions` maps each address to its index, so membership and finding
+    where to step from are O(1); only removal reindexes the tail.
+    """
+
+    __slots__ = ("windows", "positions", "cursor")
+
+    def __init__(self) -> None:
+        self.windows: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.cursor = 0
+
+    def __len__(self):
+        return len(self.windows)
+
+    def __contains__(self, address: str):
+        return address in self.positions
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.windows)
+
+    def add(self, address: str) -> bool:
+        if address in self.positions:
+            return False
+        self.positions[address] = len(self.windows)
+        self.windows.append(address)
+        return True
+
+    def remove(self, address: str) -> bool:
+        """Drop a window, keeping the cursor on the window it pointed at."""
+        removed = self.positions.pop(address, None)
+        if removed is None:
+            return False
+        del self.windows[removed]
+        for i in range(removed, len(self.windows)):
+            self.positions[self.windows[i]] = i
+        if self.cursor > removed:
+            self.cursor -= 1
+        if self.cursor >= len(self.windows):
+            self.cursor = 0
+        return True
+
+    def step(self, steps: int = 1, current: Optional[str] = None) -> Optional[str]:
+        """Move the cursor `steps` windows on and return the window there.
+
+        Counting starts at `current` when it is in the group, so a window
+        focused outside hyprplane is stepped over, else at the cursor.
+        """
+        if not self.windows:
+            return None
+        start = self.positions.get(current, self.cursor)
+        self.cursor = (start + steps) % len(self.windows)
+        return self.windows[self.cursor]
+
+
+class PinGroupStore:
+    """The lock groups of one WindowController.
+
+    Groups keep their creation order with an index map, so switching to
+    the next group and cycling inside one never scan. Closed windows are
+    pruned through `memberships` (address -> group names).
+    """
+
+    def __init__(self) -> None:
+        self.groups: Dict[str, PinGroup] = {}
+        self.order: List[str] = []
+        self.order_index: Dict[str, int] = {}
+        self.current: Optional[str] = None
+        self.class_lookup: Dict[str, str] = {}
+        self.orders: List[str] = []
+        self.memberships: Dict[str, Set[str]] = {}
+
+    def __contains__(self, name: str):
+        return name in self.groups
+
+    def get(self, name: Optional[str]) -> Optional[PinGroup]:
+        return self.groups.get(name)
+
+    def current_group(self) -> Optional[PinGroup]:
+        return self.groups.get(self.current)
+
+    def create(self, name: str) -> bool:
+        """Add an empty group and make it current."""
+        if name in self.groups:
+            return False
+        self.groups[name] = PinGroup()
+        self.order_index[name] = len(self.order)
+        self.order.append(name)
+        self.current = name
+        return True
+
+    def delete(self, name: str) -> bool:
+        group = self.groups.pop(name, None)
+        if group is None:
+            return False
+        for address in group:
+            self._unlink(address, name)
+        removed = self.order_index.pop(name)
+        del self.order[removed]
+        for i in range(removed, len(self.order)):
+            self.order_index[self.order[i]] = i
+        if self.current == name:
+            self.current = None
+        return True
+
+    def clear(self, name: str) -> bool:
+        group = self.groups.get(name)
+        if group is None:
+            return False
+        for address in group:
+            self._unlink(address, name)
+        self.groups[name] = PinGroup()
+        return True
+
+    def switch(self, name: str) -> bool:
+        if name not in self.groups:
+            return False
+        self.current = name
+        return True
+
+    def next_group(self, steps: int = 1) -> Optional[str]:
+        if not self.order:
+            return None
+        # a current group that is gone counts as the one before the first
+        index = self.order_index.get(self.current, -1)
+        self.current = self.order[(index + steps) % len(self.order)]
+        return self.current
+
+    def add(self, name: str, address: str) -> bool:
+        group = self.groups.get(name)
+        if group is None or not group.add(address):
+            return False
+        self.memberships.setdefault(address, set()).add(name)
+        return True
+
+    def remove(self, name: str, address: str) -> bool:
+        group = self.groups.get(name)
+        if group is None or not group.remove(address):
+            return False
+        self._unlink(address, name)
+        return True
+
+    def step(self, steps: int = 1, current: Optional[str] = None) -> Optional[str]:
+        """Next window to focus in the current group, None if there is no
+        other window to go to."""
+        group = self.current_group()
+        if group is None:
+            return None
+        target = group.step(steps, current)
+        return None if target == current else target
+
+    def prune(self, address: str):
+        """Forget a closed window in the class lookup and every group."""
+        for name in [n for n, a in self.class_lookup.items() if a == address]:
+            del self.class_lookup[name]
+        if address in self.orders:
+            self.orders[:] = [a for a in self.orders if a != address]
+        for name in self.memberships.pop(address, ()):
+            self.groups[name].remove(address)
+
+    def _unlink(self, address: str, name: str):
+        names = self.memberships.get(address)
+        if names is not None:
+            names.discard(name)
+            if not names:
+                del self.memberships[address]
+
+    def to_table(self) -> Dict:
+        """The JSON table the journal and the handoff snapshot carry."""
+        return {
+            "classLookup": dict(self.class_lookup),
+            "currentGroup": self.current,
+            "orders": list(self.orders),
+            "groupStates": {
+                name: {"index": group.cursor} for name, group in self.groups.items()
+            },
+            "groups": {name: list(group) for name, group in self.groups.items()},
+            "groupOrders": list(self.order),
+        }
+
+    def load(self, table: Dict):
+        """Replace the store with a table written by to_table."""
+        self.__init__()
+        groups, states = table.get("groups", {}), table.get("groupStates", {})
+        names = [name for name in table.get("groupOrders", []) if name in groups]
+        names += [name for name in groups if name not in names]
+        for name in names:
+            self.create(name)
+            for address in groups[name]:
+                self.add(name, address)
+            group = self.groups[name]
+            cursor = states.get(name, {}).get("index", 0)
+            group.cursor = cursor if cursor < len(group) else 0
+        current = table.get("currentGroup")
+        self.current = current if current in self.groups else None
+        self.class_lookup.update(table.get("classLookup", {}))
+        self.orders.extend(table.get("orders", []))
@@ -0,0 +1,192 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, List, Optional, Tuple
+
+DIRECTIONS = ("left", "right", "up", "down")
+# windows closer than this along the axis still count as being on that side,
+# tiled layouts leave a gap and floating windows overlap a little
+EDGE_TOLERANCE = 50
+
+Rect = Tuple[int, int, int, int]
+
+
+class WorkspaceIndex:
+    """Window rectangles of one workspace kept in four sorted edge lists.
+
+    A directional query bisects into the edge list facing that direction and
+    walks outwards until it meets a window overlapping on the other axis, so
+    the nearest neighbour is found without looking at every pair of windows.
+    """
+
+    def __init__(self) -> None:
+        self.rects: Dict[str, Rect] = {}
+        self.lefts: List[Tuple[int, str]] = []
+        self.rights: List[Tuple[int, str]] = []
+        self.tops: List[Tuple[int, str]] = []
+        self.bottoms: List[Tuple[int, str]] = []
+
+    def __len__(self):
+        return len(self.rects)
+
+    def _edges(self, address: str, rect: Rect):
+        x, y, w, h = rect
+        return (
+            (self.lefts, (x, address)),
+            (self.rights, (x + w, address)),
+            (self.tops, (y, address)),
+            (self.bottoms, (y + h, address)),
+        )
+
+    def update(self, address: str, x: int, y: int, w: int, h: int):
+        if address in self.rects:
+            self.remove(address)
+        rect = (x, y, w, h)
+        self.rects[address] = rect
+        for edges, entry in self._edges(address, rect):
+            insort(edges, entry)
+
+    def remove(self, address: str):
+        rect = self.rects.pop(address, None)
+        if rect is None:
+            return
+        for edges, entry in self._edges(address, rect):
+            i = bisect_left(edges, entry)
+            if i < len(edges) and edges[i] == entry:
+                del edges[i]
+
+    def nearest(
+        self, address: str, direction: str, maxGap: Optional[int] = None
+    ) -> Optional[str]:
+        rect = self.rects.get(address)
+        if rect is None:
+            return None
+
+        x, y, w, h = rect
+        # edge list to walk, the coordinate distances are measured from,
+        # walking direction and whether overlap is checked on the y axis
+        if direction == "right":
+            edges, origin, step, horizontal = self.lefts, x + w, 1, True
+        elif direction == "left":
+            edges, origin, step, horizontal = self.rights, x, -1, True
+        elif direction == "down":
+            edges, origin, step, horizontal = self.tops, y + h, 1, False
+        elif direction == "up":
+            edges, origin, step, horizontal = self.bottoms, y, -1, False
+        else:
+            raise ValueError(f"Unknown direction {direction}")
+
+        if step == 1:
+            start = bisect_left(edges, (origin - EDGE_TOLERANCE,))
+        else:
+            start = bisect_right(edges, (origin + EDGE_TOLERANCE + 1,)) - 1
+
+        i = start
+        while 0 <= i < len(edges):
+            edge, other = edges[i]
+            if maxGap is not None and (edge - origin) * step > maxGap:
+                return None
+            i += step
+            if other == address:
+                continue
+
+            ox, oy, ow, oh = self.rects[other]
+            if horizontal and y < oy + oh and y + h > oy:
+                return other
+            if not horizontal and x < ox + ow and x + w > ox:
+                return other
+        return None
+
+
+class SpatialIndex:
+    """Per-workspace WorkspaceIndex plus the address -> workspace mapping.
+
+    Geometry is updated incrementally from the moves hyprplane dispatches
+    itself. Callers mark a workspace dirty when hyprland may have reflowed
+    it on its own (tiling after an open/close, moves between workspaces) so
+    the next query rebuilds it from one clients fetch.
+    """
+
+    def __init__(self) -> None:
+        self.workspaces: Dict[int, WorkspaceIndex] = {}
+        self.windowWorkspace: Dict[str, int] = {}
+        self.dirty: set = set()
+        self.lock = threading.Lock()
+
+    def needsRebuild(self, workspace: int) -> bool:
+        return workspace not in self.workspaces or workspace in self.dirty
+
+    def rebuild(self, clients: List[Dict]):
+        with self.lock:
+            rebuilt: Dict[int, WorkspaceIndex] = {}
+            self.windowWorkspace = {}
+            for client in clients:
+                workspace = client.workspace
+                index = rebuilt.get(workspace)
+                if index is None:
+                    index = rebuilt[workspace] = WorkspaceIndex()
+                index.update(client.address, client.x, client.y, client.w, client.h)
+                self.windowWorkspace[client.address] = workspace
+            self.workspaces = rebuilt
+            self.dirty.clear()
+
+    def assign(self, address: str, workspace: int):
+        """Record which workspace a window lives on before its geometry is known."""
+        with self.lock:
+            previous = self.windowWorkspace.get(address)
+            if previous is not None and previous != workspace:
+                self.workspaces[previous].remove(address)
+            self.windowWorkspace[address] = workspace
+            self.workspaces.setdefault(workspace, WorkspaceIndex())
+
+    def update(self, address: str, x: int, y: int, w: int, h: int):
+        with self.lock:
+            workspace = self.windowWorkspace.get(address)
+            if workspace is None:
+                return
+            self.workspaces[workspace].update(address, x, y, w, h)
+
+    def remove(self, address: str) -> Optional[int]:
+        with self.lock:
+            workspace = self.windowWorkspace.pop(address, None)
+            if workspace is not None:
+                self.workspaces[workspace].remove(address)
+            return workspace
+
+    def dropWorkspace(self, workspace: int):
+        with self.lock:
+            index = self.workspaces.pop(workspace, None)
+            if index is not None:
+                for address in index.rects:
+                    self.windowWorkspace.pop(address, None)
+            self.dirty.discard(workspace)
+
+    def markDirty(self, workspace: Optional[int] = None):
+        with self.lock:
+            if workspace is None:
+                self.dirty.update(self.workspaces)
+            else:
+                self.dirty.add(workspace)
+
+    def nearest(
+        self, address: str, direction: str, maxGap: Optional[int] = None
+    ) -> Optional[str]:
+        with self.lock:
+            workspace = self.windowWorkspace.get(address)
+            if workspace is None:
+                return None
+            return self.workspaces[workspace].nearest(address, direction, maxGap)
+
+    def neighbors(self, workspace: int, maxGap: int) -> Dict[str, Dict]:
+        with self.lock:
+            index = self.workspaces.get(workspace)
+            if index is None:
+                return {}
+            return {
+                address: {
+                    "left": index.nearest(address, "left", maxGap),
+                    "right": index.nearest(address, "right", maxGap),
+                    "top": index.nearest(address, "up", maxGap),
+                    "bottom": index.nearest(address, "down", maxGap),
+                }
+                for address in index.rects
+            }
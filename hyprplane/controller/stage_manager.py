@@ -1,22 +1,38 @@
 import asyncio
+import itertools
 import json
+import logging
 import queue
 import random
 import threading
+import time
 from collections import deque
-from concurrent.futures import Executor, ThreadPoolExecutor
 from enum import Enum
 from queue import Empty, Queue
 from subprocess import Popen
 from threading import Thread
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
+from hyprplane.controller.handles import WindowRecord, window_handles
 from hyprplane.controller.layout import LayoutController
+from hyprplane.controller.layout_core import (
+    SlotAllocator,
+    SlotRecord,
+    WindowTable,
+    layout_plan,
+    position_moves,
+    stage_geometry,
+)
 from hyprplane.controller.window import WindowController
 from hyprplane.drawer import printWindowLayout
-from hyprplane.event import HyprlandEventHandler
+from hyprplane.event import HyprEvent, HyprlandEventHandler
 
-from ..utils import hyprctl_cmd
+from ..journal import getJournal
+from ..metrics import metrics
+from ..tracing import traced, tracer
+from ..utils import approx_size, hyprctl_cmd, hyprctl_session
+
+log = logging.getLogger(__name__)
 
 
 class LayoutMode(Enum):
@@ -24,16 +40,80 @@ class LayoutMode(Enum):
     STAGE_MANAGER = 2
 
 
+# windows per stage group
+GROUP_SIZE = 10
+# mini windows off the visible page wait here, one per stage workspace
+PARKED_WORKSPACE = "special:hyprplane-stage-{}"
+MONITOR_EVENTS = ("monitoradded", "monitoraddedv2", "monitorremoved", "configreloaded")
+WORKSPACE_MOVE_EVENTS = ("moveworkspace", "moveworkspacev2")
+# seconds without monitor events before the relayout runs
+MONITOR_SETTLE_TIME = 0.25
+# relayouts wait while a workspace is fullscreen or the screen is shared
+SUSPEND_EVENTS = ("fullscreen", "screencast")
+DESTROY_EVENTS = ("destroyworkspace", "destroyworkspacev2")
+
+
+def page_step(page: str) -> Optional[int]:
+    """Pages a stage-page argument moves by, None for an absolute page."""
+    if page == "next":
+        return 1
+    if page == "prev":
+        return -1
+    if page[:1] in ("+", "-") and page[1:].isdigit():
+        return int(page)
+    return None
+
+
 class WindowGroup:
-    def __init__(self, mainWindow: Dict, sideWindows: List[Dict]):
-        self.main_window = mainWindow
-        self.side_windows = sideWindows
+    """Main window followed by its side windows, kept in one deque."""
+
+    __slots__ = ("windows",)
+
+    def __init__(self, mainWindow: WindowRecord, sideWindows: List[WindowRecord]):
+        self.windows = deque([mainWindow, *sideWindows])
+
+    def __len__(self):
+        return len(self.windows)
+
+    def __iter__(self):
+        return iter(self.windows)
+
+    @property
+    def main_window(self) -> WindowRecord:
+        return self.windows[0]
+
+    @property
+    def side_windows(self) -> List[WindowRecord]:
+        return list(itertools.islice(self.windows, 1, None))
+
+    def index(self, address: str) -> int:
+        handle = window_handles.get(address)
+        for i, window in enumerate(self.windows):
+            if window.handle == handle:
+                return i
+        return -1
+
+    def add(self, window: WindowRecord):
+        self.windows.append(window)
+
+    def remove(self, address: str) -> Optional[WindowRecord]:
+        i = self.index(address)
+        if i < 0:
+            return None
+        window = self.windows[i]
+        del self.windows[i]
+        return window
+
+    def rotate(self, steps: int = 1):
+        """Bring the side window `steps` places down to the front."""
+        self.windows.rotate(-steps)
 
 
 class StageController(LayoutController):
     def __init__(self, windCont: WindowController) -> None:
         super().__init__(windCont)
         self.hyprland_event = HyprlandEventHandler()
+        self.focus_history = self.hyprland_event.focus
         self.current_mode: Dict[int, LayoutMode] = {}
         self.current_workspace_id: Optional[int] = None
         # convert all window groups into a dictionary that directly disected
@@ -43,16 +123,30 @@ class StageController(LayoutController):
         self.window_open_queue = deque(maxlen=5)  # Store last 5 window open events
         self.event = threading.Event()
         self.prevPos: Dict[int, List] = {}
+        # mini window slots per stage workspace, prevPos shares their lists
+        self.slot_allocators: Dict[int, SlotAllocator] = {}
         self.active_group_indice = Dict[int, int]
         self.is_processing = False
         self._executor_running = True
         self.last_win_open_ts = 0
         self.task_queue = Queue(maxsize=50)
+        self.relayout_pending: set = set()
+        self.relayout_everything = False
+        self.relayout_task: Optional[asyncio.Future] = None
+        self.fullscreen_workspaces: set = set()
+        self.screencasting = False
+        # stage workspaces whose layout went stale while suspended
+        self.suspended_pending: set = set()
     
     def stop(self):
         self.hyprland_event.stop()
         self._executor_running = False
 
+    def resume(self):
+        """Restart event handling after stop()."""
+        self._executor_running = True
+        self.hyprland_event.start()
+        threading.Thread(target=self._run_executor_loop).start()
 
     async def start(self):
         # threading.Thread(target=self._run_executor_loop).run()
@@ -68,21 +162,34 @@ class StageController(LayoutController):
         self.loop.run_until_complete(self.event_handler())
 
     async def event_handler(self):
-        print("EVVVV",self._executor_running)
+        log.debug("executor running %s", self._executor_running)
         while self.loop.is_running and self._executor_running:
             try:
                 # Use get_nowait() for non-blocking operation
                 event = self.hyprland_event.msg_queue.get_nowait()
-                print("EVENT",event)
+                log.debug("EVENT %s", event)
             except queue.Empty:
                 # If queue is empty, wait a bit before trying again
                 await asyncio.sleep(0.1)
                 continue
 
-            et, ed = event.split(">>")
-            print("ET -> ",et)
+            et, ed = event.name, event.data
+            log.debug("ET -> %s", et)
+            self.track_geometry_event(event)
             if et == "openwindow" or et == "closewindow":
-                await self.handle_window_change(et, ed)
+                await self.apply_window_event(event)
+                if et == "closewindow":
+                    self.evict_window(f"0x{ed}")
+                self.journal_stages()
+            elif et == "movewindowv2":
+                await self.handle_window_move(event)
+                self.journal_stages()
+            elif et in MONITOR_EVENTS or et in WORKSPACE_MOVE_EVENTS:
+                self.handle_monitor_event(event)
+            elif et in SUSPEND_EVENTS:
+                await self.handle_suspend_event(event)
+            elif et in DESTROY_EVENTS:
+                await self.handle_destroy_event(event)
 
             # if et == "closewindow":
             #     self.debounce_time = 0.001
@@ -95,168 +202,241 @@ class StageController(LayoutController):
             #     print("ET", et)
             #     await self.execute_queued_task(ed)
 
+    def track_geometry_event(self, event: HyprEvent):
+        """Keep the spatial index in line with changes hyprland made itself.
+
+        Stage workspaces are laid out by us, so their geometry arrives through
+        move_and_resize_window; anything else may have been retiled.
+        """
+        fields = event.data.split(",")
+        address = f"0x{fields[0]}"
+        workspace = None
+
+        if event.name == "closewindow":
+            workspace = self.spatial.remove(address)
+        elif event.name == "openwindow" and len(fields) > 1 and fields[1].isdigit():
+            workspace = int(fields[1])
+            self.spatial.assign(address, workspace)
+        elif (
+            event.name == "movewindowv2"
+            and len(fields) > 1
+            and fields[1].lstrip("-").isdigit()
+        ):
+            workspace = int(fields[1])
+            self.spatial.assign(address, workspace)
+        elif event.name == "changefloatingmode":
+            workspace = self.spatial.windowWorkspace.get(address)
+        elif event.name == "openwindow":
+            # named/special workspace, we can't tell which id it is
+            self.spatial.markDirty()
+            return
+        else:
+            return
+
+        if (
+            workspace is not None
+            and self.current_mode.get(workspace) != LayoutMode.STAGE_MANAGER
+        ):
+            self.spatial.markDirty(workspace)
+
+    async def apply_window_event(self, event: HyprEvent):
+        """Handle an open/close event and record how long the user waited.
+
+        event.queue_wait is the time the event sat in msg_queue and
+        event.apply.<name> runs from the socket read until the batched
+        dispatches of the relayout are acknowledged by hyprland.
+        """
+        dequeued_at = time.perf_counter()
+        metrics.observe("event.queue_wait", (dequeued_at - event.received_at) * 1000)
+
+        error = True
+        try:
+            with tracer.span(f"event.{event.name}", "event"):
+                async with hyprctl_session():
+                    await self.handle_window_change(event.name, event.data)
+            error = False
+        finally:
+            metrics.observe(
+                f"event.apply.{event.name}",
+                (time.perf_counter() - event.received_at) * 1000,
+                error,
+            )
+
+    @traced("stage.handle_window_change")
     async def handle_window_change(self, event_type, addrs):
         # print("handling window change", event_type)
         # print("system workspace", self.current_workspace_id)
         # print("system ", self.prevPos)
 
-        if self.current_workspace_id is None:
-            return
-        
-        prev_pos = self.prevPos[self.current_workspace_id]
-
-        if len(prev_pos) < 1 : 
-            return [], prev_pos 
-
-        last_pos = prev_pos[-1]
-        awt = await self.get_active_window()
+        fields = addrs.split(",")
+        address = f"0x{fields[0]}"
+        if event_type == "openwindow":
+            workspace = self.current_workspace_id
+            if len(fields) > 1 and fields[1].isdigit():
+                workspace = int(fields[1])
+        else:
+            workspace = self.stage_workspace_of(address)
 
-        if awt is None:
+        allocator = self.slot_allocators.get(workspace)
+        if allocator is None:
             return
 
-        temp_addrs = awt["address"]
-
-        # print("last pos", last_pos,
-        #       addrs,event_type,self.current_mode[self.current_workspace_id])
-        print("Input window spacec",event_type)
-        new_position = None
+        if self.is_suspended(workspace):
+            # regrouped and laid out once fullscreen/screencast ends
+            self.suspended_pending.add(workspace)
+            return
 
-        await self.load_win_groups()
+        log.debug("Input window space %s", event_type)
 
         if event_type == "openwindow":
-            new_position = await self.next_window_position(prev_pos, awt, None)
-            await hyprctl_cmd(f"dispatch setfloating address:{temp_addrs}")
+            self.add_to_groups(
+                workspace,
+                WindowRecord(
+                    address,
+                    workspace,
+                    fields[2] if len(fields) > 2 else "",
+                    ",".join(fields[3:]),
+                ),
+            )
+            new_position = allocator.allocate(address)
+            await hyprctl_cmd(f"dispatch setfloating address:{address}")
             await self.move_and_resize_window(
-                temp_addrs,
-                new_position["x"],
-                new_position["y"],
-                new_position["w"],
-                new_position["h"],
+                address,
+                new_position.x,
+                new_position.y,
+                new_position.w,
+                new_position.h,
             )
+            if not allocator.visible(new_position):
+                await self.park_windows(workspace, [new_position])
 
-            self.prevPos[self.current_workspace_id].append(new_position)
             self.props["clients"].revoke()
 
             await hyprctl_cmd("dispatch alterzorder bottom")
 
         else:
-            # self.set_workspace_mode(self.current_workspace_id,LayoutMode.STAGE_MANAGER)
-            # await self.enter_stage_mode()
-            new_positions, updated_prev_pos = await self.determine_negative_positions(temp_addrs, prev_pos)
+            groups = self.get_win_groups(workspace)
+            active = groups[self.active_group_index] if groups else None
+            wasMain = active is not None and active.main_window.address == address
+            self.remove_from_groups(workspace, address)
+
+            if allocator.free(address):
+                await self.apply_compaction(workspace, allocator)
+            elif wasMain and active:
+                # the next window of the group takes over the main slot
+                newMain = active.main_window.address
+                record = allocator.record(newMain)
+                if record is not None and not allocator.visible(record):
+                    await self.unpark_windows(workspace, [record], move=False)
+                allocator.free(newMain)
+                await self.apply_compaction(workspace, allocator)
+                await self.apply_plan([(newMain, *allocator.geometry.main)])
+
+        self.set_workspace_mode(workspace, LayoutMode.STAGE_MANAGER)
+
+    async def handle_window_move(self, event: HyprEvent):
+        """A window moved between workspaces leaves the stage it was on and
+        joins the stage it lands on. Our own parking moves are ignored."""
+        fields = event.data.split(",")
+        if len(fields) < 3 or not fields[1].lstrip("-").isdigit():
+            return
+        address, target, name = f"0x{fields[0]}", int(fields[1]), fields[2]
+        source = self.stage_workspace_of(address)
+        if source == target or name.startswith(PARKED_WORKSPACE.format("")):
+            return
 
-            print("New positions:", new_positions)
-            print("Updated previous positions:", updated_prev_pos)
-            
-            for position in new_positions:
-                await self.move_and_resize_window(
-                    position["address"],  # Use the correct address for each window
-                    position["x"],
-                    position["y"],
-                    position["w"],
-                    position["h"]
+        async with hyprctl_session():
+            if source is not None:
+                await self.handle_window_change("closewindow", fields[0])
+            if target in self.slot_allocators:
+                await self.handle_window_change("openwindow", f"{fields[0]},{target}")
+
+    async def apply_compaction(self, workspace: int, allocator: SlotAllocator):
+        """Close the holes of freed slots. Windows pulled onto the visible
+        page from a later one are unparked, in the same batch."""
+        moved, entering, leaving = allocator.compact()
+        log.debug("New positions: %s", moved)
+        async with hyprctl_session():
+            await self.apply_plan(position_moves(moved))
+            await self.park_windows(workspace, leaving)
+            await self.unpark_windows(workspace, entering)
+
+    async def park_windows(self, workspace: int, records: List[SlotRecord]):
+        parked = PARKED_WORKSPACE.format(workspace)
+        async with hyprctl_session():
+            for record in records:
+                await hyprctl_cmd(
+                    f"dispatch movetoworkspacesilent {parked},"
+                    f"address:{record.address}"
                 )
-            
-            if updated_prev_pos and self.current_workspace_id:
-                self.savePrevPosition(self.current_workspace_id,updated_prev_pos)
 
-                print("next window", new_positions)
+    async def unpark_windows(
+        self,
+        workspace: int,
+        records: List[SlotRecord | WindowRecord],
+        move: bool = True,
+    ):
+        async with hyprctl_session():
+            for record in records:
+                await hyprctl_cmd(
+                    f"dispatch movetoworkspacesilent {workspace},"
+                    f"address:{record.address}"
+                )
+            if move:
+                await self.apply_plan(position_moves(records))
+
+    async def page_stage(self, page: str):
+        """Show another page of the mini stack: next, prev or a page number.
+
+        Only the windows of the page being left and the page being shown are
+        dispatched, however many windows the stage holds.
+        """
+        workspace = self.current_workspace_id
+        allocator = self.slot_allocators.get(workspace)
+        if allocator is None:
+            return
 
+        step = page_step(page)
+        if step is not None:
+            target = allocator.page + step
+        elif page.isdigit():
+            target = int(page) - 1
+        else:
+            print("Usage: stage-page next|prev|+N|-N|<page>")
+            return
 
-        self.set_workspace_mode(self.current_workspace_id, LayoutMode.STAGE_MANAGER)
+        entering, leaving = allocator.set_page(target)
+        async with hyprctl_session():
+            await self.park_windows(workspace, leaving)
+            await self.unpark_windows(workspace, entering)
+
+    def stage_workspace_of(self, address: str) -> Optional[int]:
+        for workspace, allocator in self.slot_allocators.items():
+            if address in allocator:
+                return workspace
+        # main windows hold no mini slot
+        for workspace, groups in self.window_groups.items():
+            if any(group.index(address) >= 0 for group in groups):
+                return workspace
+        return None
 
     async def bring_main_to_back(self):
         await hyprctl_cmd("dispatch alterzorder bottom")
 
     async def verify_window_state(self):
-        actual_windows = await self.get_workspace_clients()  
-        # Implement this method to get all current windows
-        for workspace_id, positions in self.prevPos.items():
-            self.prevPos[workspace_id] = [pos for pos in positions if pos['address'] in actual_windows]
-
-        print(f"Verified window state: {self.prevPos}")
-
-    async def determine_negative_positions(self, window_address_to_delete: str, prev_positions: list[dict]) -> tuple[list[dict], list[dict]]:
-        print(f"Recalculating positions after deleting window: {window_address_to_delete}")
-        print(f"Previous positions: {prev_positions}")
-        
-        screen_width, screen_height, offsetX, offsetY, monitorName = await self.getScreenSize()
-        
-        # Window dimensions and gaps
-        miniWidth = int(screen_width * 0.18)
-        miniHeight = int(screen_height * 0.24)
-        miniX = offsetX
-        miniY = offsetY
-        miniVerticalGap = 30
-        miniHorizontalGap = 30
-        max_window_per_col = (screen_height - miniY) // (miniHeight + miniVerticalGap)
-        # max_cols = (screen_width - miniX) // (miniWidth + miniHorizontalGap)
-
-        # max_window_per_col = 3
-        max_cols = (screen_width - miniX) // (miniWidth + miniHorizontalGap)
-
-        # Create a grid to represent window positions
-        grid = [[None for _ in range(max_window_per_col)] for _ in range(max_cols)]
-        print("Grid rom",grid,max_window_per_col,max_cols)
-        # Function to get grid position
-        def get_grid_position(x, y):
-            col = (x - miniX) // (miniWidth + miniHorizontalGap)
-            row = (y - miniY) // (miniHeight + miniVerticalGap)
-            return min(col, max_cols - 1), min(row, max_window_per_col - 1)
-
-        for window in prev_positions:
-            if window['address'] != window_address_to_delete:
-                col, row = get_grid_position(window['x'], window['y'])
-                grid[col][row] = window
-
-        updated_positions = []
-        windows_to_move = []
-
-        # Reposition windows
-        for col in range(max_cols):
-            next_empty_row = 0
-            for row in range(max_window_per_col):
-                if grid[col][row] is not None:
-                    window = grid[col][row]
-                    new_x = miniX + col * (miniWidth + miniHorizontalGap)
-                    new_y = miniY + next_empty_row * (miniHeight + miniVerticalGap)
-                    
-                    if window['x'] != new_x or window['y'] != new_y:
-                        new_position = {
-                            'address': window['address'],
-                            'x': new_x,
-                            'y': new_y,
-                            'w': miniWidth,
-                            'h': miniHeight,
-                            'monitor': window['monitor']
-                        }
-                        windows_to_move.append(new_position)
-                        window.update(new_position)
-                    
-                    updated_positions.append(window)
-                    next_empty_row += 1
-
-        # Check for any windows that weren't in the grid (e.g., if they were outside the valid area)
-        for window in prev_positions:
-            if window['address'] != window_address_to_delete and window not in updated_positions:
-                col, row = get_grid_position(window['x'], window['y'])
-                new_x = miniX + col * (miniWidth + miniHorizontalGap)
-                new_y = miniY + row * (miniHeight + miniVerticalGap)
-                
-                new_position = {
-                    'address': window['address'],
-                    'x': new_x,
-                    'y': new_y,
-                    'w': miniWidth,
-                    'h': miniHeight,
-                    'monitor': window['monitor']
-                }
-                windows_to_move.append(new_position)
-                updated_positions.append(new_position)
+        actual_windows = {
+            client.address for client in await self.get_workspace_clients()
+        }
+        allocator = self.slot_allocators.get(self.current_workspace_id)
+        if allocator is None:
+            return
 
-        print(f"Windows to move: {windows_to_move}")
-        print(f"Updated positions: {updated_positions}")
-        return windows_to_move, updated_positions
+        for pos in list(allocator.positions):
+            if pos.address not in actual_windows:
+                allocator.free(pos.address)
+        await self.apply_compaction(self.current_workspace_id, allocator)
 
+        log.debug("Verified window state: %s", self.prevPos)
 
     async def handle_open_event(self):
 
@@ -276,15 +456,15 @@ class StageController(LayoutController):
 
             currWid = aWindow["workspace"]["id"]
 
-            print("OPEN", aWindow is None, currWid)
-            print("INITIAL", initialWorkspace, currWid)
+            log.debug("OPEN %s %s", aWindow is None, currWid)
+            log.debug("INITIAL %s %s", initialWorkspace, currWid)
 
             if initialWorkspace != currWid:
                 # detected work space change
                 # therefore we queue the task
-                print("EMP", initialWorkspace)
+                log.debug("EMP %s", initialWorkspace)
 
-                prefer_monitor = prev_pos[0]["monitor"]
+                prefer_monitor = prev_pos[0].monitor
                 func = self.enter_stage_mode(initialWorkspace, prefer_monitor)
                 self.task_queue.put(asyncio.create_task(func))
 
@@ -300,7 +480,7 @@ class StageController(LayoutController):
                 return
 
             if len(prev_pos) != initialPosCount:
-                print("SUCCESS")
+                log.debug("SUCCESS")
                 return  # Success
 
             if attempt < self.max_retries - 1:
@@ -330,8 +510,7 @@ class StageController(LayoutController):
         self.current_workspace_id = wid
         res = self.current_mode.get(wid)
 
-        print("CURR", wid, res)
-        print("M", res)
+        log.debug("CURR %s %s", wid, res)
         if res is None:
             await self.set_current_workspace_mode(default_mode)
         else:
@@ -341,7 +520,7 @@ class StageController(LayoutController):
 
     async def toggle_layout_mode(self):
         currMode = await self.get_current_workspace_mode()
-        print("MODE", self.current_mode)
+        log.debug("MODE %s", self.current_mode)
 
         if currMode == LayoutMode.TILED:
             # Popen(["hyprpm", "enable", "hyprbars"])
@@ -369,20 +548,21 @@ class StageController(LayoutController):
 
         self.window_groups[self.current_workspace_id] = groups
 
+    @traced("stage.load_win_groups")
     async def load_win_groups(self, wid: int | None = None):
         clients = await self.get_workspace_clients(wid)
-        print("CLIENTS",len(clients))
+        log.debug("CLIENTS %d", len(clients))
         if not clients:
             return
 
         renewed_group = self.create_window_group(clients)
-        print("WWWID --> ", wid,renewed_group)
+        log.debug("WWWID --> %s %s", wid, renewed_group)
         self.set_curr_window_groups(renewed_group)
 
     async def enter_stage_mode(
         self, wid: int | None = None, monitorHint: str | None = None
     ):
-        print("widdddd -> ", wid)
+        log.debug("workspace -> %s", wid)
 
         if wid is not None:
             self.current_workspace_id = wid
@@ -411,7 +591,7 @@ class StageController(LayoutController):
         self.event.clear()
 
     async def execute_queued_task(self, eventData):
-        print("EX", eventData,self.set_workspace_mode)
+        log.debug("EX %s", eventData)
 
         try:
             while True:
@@ -419,7 +599,7 @@ class StageController(LayoutController):
                 if func is None:
                     break
 
-                print("ITMM", func)
+                log.debug("ITMM %s", func)
                 await func
 
         except Empty as e:
@@ -433,193 +613,374 @@ class StageController(LayoutController):
         # self.hyprlandEvent.subscribe("workspace", self.executeInBetweenTask)
         # await self.hyprlandEvent.read_events()
 
-    def create_window_group(self, clients: List[Dict]) -> List[WindowGroup]:
+    def create_window_group(self, clients: List[WindowRecord]) -> List[WindowGroup]:
         groups = []
-        miniWindowChunks = 10
-
-        # Create groups of up to 3 windows
-        for i in range(0, len(clients), miniWindowChunks):
-            group_clients = clients[i : i + miniWindowChunks]
+        for i in range(0, len(clients), GROUP_SIZE):
+            group_clients = clients[i : i + GROUP_SIZE]
             groups.append(WindowGroup(group_clients[0], group_clients[1:]))
 
         return groups
 
+    def add_to_groups(self, workspace: int, window: WindowRecord):
+        groups = self.window_groups.setdefault(workspace, [])
+        if groups and len(groups[-1]) < GROUP_SIZE:
+            groups[-1].add(window)
+        else:
+            groups.append(WindowGroup(window, []))
+
+    def remove_from_groups(self, workspace: int, address: str) -> Optional[int]:
+        """Drop a window from its group, returns the index of that group."""
+        groups = self.window_groups.get(workspace, [])
+        for i, group in enumerate(groups):
+            if group.remove(address) is None:
+                continue
+            if not group:
+                del groups[i]
+                if self.active_group_index >= i and self.active_group_index > 0:
+                    self.active_group_index -= 1
+            return i
+        return None
+
+    def journal_stages(self):
+        """Append the stage workspaces that changed since the last call."""
+        journal = getJournal()
+        for wid, mode in self.current_mode.items():
+            groups = self.window_groups.get(wid)
+            if mode == LayoutMode.STAGE_MANAGER and groups:
+                record = {
+                    "type": "stage",
+                    "workspace": wid,
+                    "groups": [[w.address for w in group] for group in groups],
+                }
+            else:
+                record = {"type": "unstage", "workspace": wid}
+            journal.append(record, key=f"stage:{wid}")
+
+    @traced("stage.restore")
+    async def restore_stages(
+        self, stages: Dict[str, Dict], clients: List[WindowRecord]
+    ):
+        """Re-enter stage mode on journaled workspaces and lay them out in one
+        batch. Windows opened while the daemon was down join the last group."""
+        byAddress = {client.address: client for client in clients}
+        restored = []
+        for workspace, stage in stages.items():
+            wid = int(workspace)
+            groups = [
+                WindowGroup(byAddress[group[0]], [byAddress[a] for a in group[1:]])
+                for group in stage["groups"]
+            ]
+            self.window_groups[wid] = groups
+            known = {w.handle for group in groups for w in group}
+            for window in byAddress.values():
+                if window.workspace == wid and window.handle not in known:
+                    self.add_to_groups(wid, window)
+            self.set_workspace_mode(wid, LayoutMode.STAGE_MANAGER)
+            restored.append(wid)
+
+        if restored:
+            await self.relayout_all(restored)
+
     async def exit_stage_mode(self):
         await self.set_current_workspace_mode(LayoutMode.TILED)
         if self.current_workspace_id is None:
             return
 
-        print("WWW", self.window_groups)
+        log.debug("WWW %s", self.window_groups)
+        allocator = self.slot_allocators.get(self.current_workspace_id)
+        if allocator is not None:
+            await self.unpark_windows(
+                self.current_workspace_id,
+                [p for p in allocator.positions if not allocator.visible(p)],
+                move=False,
+            )
+
         for group in self.window_groups[self.current_workspace_id]:
-            for window in [group.main_window] + group.side_windows:
+            for window in group:
                 await hyprctl_cmd(
-                    f"dispatch settiled address:{window['address']}", True
+                    f"dispatch settiled address:{window.address}", True
                 )
 
         self.window_groups[self.current_workspace_id] = []
+        self.slot_allocators.pop(self.current_workspace_id, None)
+        self.prevPos.pop(self.current_workspace_id, None)
 
     def savePrevPosition(self, workspaceId: int, pos):
         self.prevPos[workspaceId] = pos
 
-    async def next_window_position(self, prevPos, newWindow, screen_info):
-        """
-        Calculate the position for the next window based on existing window positions.
-
-        :param prevPos: List of dictionaries containing previous window positions
-        :param newWindow: Dictionary containing new window information
-        :param screen_info: Dictionary containing screen dimensions and offsets
-        :return: Dictionary with x, y, w, h, and monitor for the new window
-        """
-
-        screen_width, screen_height, offsetX, offsetY, monitorName = (
-            await self.getScreenSize()
-        )
-
-        # Window dimensions
-        miniWidth = int(screen_width * 0.18)
-        miniHeight = int(screen_height * 0.24)
-        miniX = offsetX + 0  # 20px padding from left edge
-        miniY = offsetY + 0  # 20px padding from top edge
-        miniVerticalGap = 30  # Gap between minified windows
-        miniHorizontalGap = 30  # Gap between columns when overflow occurs
-        
-
-        max_window_per_col = (screen_height - miniY) // (miniHeight + miniVerticalGap)
-        print("EPOCHI",newWindow)
-        if not prevPos:
-            # If there are no previous windows, place the new window at the start
-            return {
-                "x": miniX,
-                "y": miniY,
-                "w": miniWidth,
-                "h": miniHeight,
-                "monitor": monitorName,
-                "address":newWindow["address"]
-            }
-
-        # Find the last window position
-        last_window = prevPos[-1]
-        last_column = (last_window["x"] - miniX) // (miniWidth + miniHorizontalGap)
-        last_row = (last_window["y"] - miniY) // (miniHeight + miniVerticalGap)
-
-        # Calculate the next position
-        if last_row + 1 < max_window_per_col:
-            # There's space in the current column
-            new_x = last_window["x"]
-            new_y = miniY + (last_row + 1) * (miniHeight + miniVerticalGap)
-        else:
-            # Move to the next column
-            new_x = miniX + (last_column + 1) * (miniWidth + miniHorizontalGap)
-            new_y = miniY
-
-        return {
-            "x": new_x,
-            "y": new_y,
-            "w": miniWidth,
-            "h": miniHeight,
-            "monitor": monitorName,
-            "address":newWindow["address"]
-        }
-
+    @traced("stage.apply_layout")
     async def apply_stage_manager_layout(
         self,
         workspace_id: int | None = None,
         monitorHint: str | None = None,
         debounce_time: int | None = None,
+        focus: bool = True,
     ):
+        """Lay out one stage workspace, the current one unless given.
+
+        Shared state is only read, never swapped, so layouts of several
+        workspaces may run concurrently (see relayout_all).
+        """
         if not self.window_groups:
             return
 
-        prevId = self.current_workspace_id
-
-        if workspace_id is not None:
-            self.current_workspace_id = workspace_id
-
         # await self.loadWindowGroup()
-        screen_width, screen_height, offset_x, offset_y, monitor_name = (
-            await self.getScreenSize(monitorHint)
-        )
+        clients = await self.get_workspace_clients(workspace_id)
+        currId = workspace_id if workspace_id is not None else self.current_workspace_id
+        if currId is None:
+            return
 
-        # Main window dimensions (larger and positioned to the right)
-        main_width = int(screen_width * 0.8)
-        main_height = int(screen_height * 0.9)
-        mainX = (
-            offset_x + (screen_width - main_width) - 20
-        )  # 20px padding from right edge
-        mainY = offset_y + (screen_height - main_height) // 2
-        # Minified window dimensions (smaller and to the left)
-        miniWidth = int(screen_width * 0.18)
-        miniHeight = int(screen_height * 0.24)
-        miniX = offset_x + 0  # 20px padding from left edge
-        miniY = offset_y + 0  # 20px padding from top edge
-        miniVerticalGap = 30  # Gap between minified windows
-        miniHorizontalGap = 30  # Gap between columns when overflow occurs
+        screen = await self.getScreenSize(monitorHint, currId)
+        if screen is None:
+            return
 
-        clients = await self.get_workspace_clients(workspace_id)
+        monitor_name = screen[4]
         await self.toggle_floating_workspace(clients)
 
-        # Position the active group's main window
-        current_work_group = self.get_win_groups(workspace_id)
+        current_work_group = self.get_win_groups(currId)
+        if not current_work_group:
+            return
         activeGroup = current_work_group[self.active_group_index]
-
-        await self.move_and_resize_window(
-            activeGroup.main_window["address"], mainX, mainY, main_width, main_height
-        )
-
-        print(
-            "MAIN WIN",
-            activeGroup.main_window["address"],
-            mainX,
-            mainY,
-            main_width,
-            main_height,
-        )
-
-        # await self.focusWindow(activeGroup.mainWindow["address"])
-        await hyprctl_cmd(
-            f"dispatch alterzorder top address:{activeGroup.main_window['address']}"
-        )
-
-        await self.focus_window(activeGroup.main_window["address"])
-        # Position minified windows for all groups in a vertical stack
         mini_windows = []
         for i, group in enumerate(current_work_group):
             if i != self.active_group_index:
                 mini_windows.append(group.main_window)
             mini_windows.extend(group.side_windows)
 
-        max_window_per_col = (screen_height - miniY) // (miniHeight + miniVerticalGap)
-        currId = workspace_id or self.current_workspace_id
+        mainSlot, *miniSlots = layout_plan(
+            "stage", tuple(screen[:4]), len(mini_windows)
+        )
 
-        if currId is None:
+        # Position the active group's main window
+        fresh = {client.address: client for client in clients}
+        mainAddress = activeGroup.main_window.address
+        if mainAddress not in fresh:
+            # cycled in from a parked page
+            await self.unpark_windows(currId, [activeGroup.main_window], move=False)
+        await self.move_and_resize_window(mainAddress, *mainSlot)
+        log.debug("MAIN WIN %s %s", mainAddress, mainSlot)
+
+        # await self.focusWindow(activeGroup.mainWindow["address"])
+        await hyprctl_cmd(f"dispatch alterzorder top address:{mainAddress}")
+
+        if focus:
+            await self.focus_window(mainAddress)
+
+        # Position minified windows for all groups in a vertical stack,
+        # same column by column order as the planned slots
+        previous = self.slot_allocators.get(currId)
+        allocator = SlotAllocator(stage_geometry(screen), monitor_name)
+        for window in mini_windows:
+            allocator.allocate(window.address)
+        if previous is not None:
+            allocator.page = min(previous.page, allocator.page_count - 1)
+        self.slot_allocators[currId] = allocator
+        self.savePrevPosition(currId, allocator.positions)
+
+        # only the visible page gets geometry. The group dicts may be stale,
+        # so diff against what we just fetched; windows missing from it are
+        # parked
+        shown, slots, returning, hidden = [], [], [], []
+        for window, slot in zip(mini_windows, miniSlots):
+            record = allocator.records[window.handle]
+            client = fresh.get(window.address)
+            if not allocator.visible(record):
+                if client is not None:
+                    hidden.append(record)
+            elif client is None:
+                returning.append(record)
+            else:
+                shown.append(client)
+                slots.append(slot)
+
+        plan = WindowTable.from_clients(shown).plan_moves(*zip(*slots)) if slots else []
+        await self.apply_plan(plan)
+        await self.park_windows(currId, hidden)
+        await self.unpark_windows(currId, returning)
+
+    @traced("stage.relayout_all")
+    async def relayout_all(self, workspaces: Optional[Iterable[int]] = None):
+        """Relayout every stage and floating workspace in one batch, or only
+        the given ones.
+
+        Each workspace resolves its own monitor, so workspaces hidden behind
+        another one on their monitor still get that monitor's geometry. The
+        layouts are planned concurrently against one shared snapshot of the
+        monitors, workspaces and clients and flushed as a single batch.
+        """
+        wanted = None if workspaces is None else set(workspaces)
+        suspended = {
+            wid
+            for wid in itertools.chain(self.current_mode, self.floating_workspaces)
+            if self.is_suspended(wid) and (wanted is None or wid in wanted)
+        }
+        self.suspended_pending.update(suspended)
+        if wanted is None:
+            wanted = set(self.current_mode) | self.floating_workspaces
+        wanted -= suspended
+
+        stages = [
+            wid
+            for wid, mode in self.current_mode.items()
+            if mode == LayoutMode.STAGE_MANAGER
+            and self.window_groups.get(wid)
+            and (wanted is None or wid in wanted)
+        ]
+        floating = [
+            wid
+            for wid in self.floating_workspaces
+            if wid not in stages and (wanted is None or wid in wanted)
+        ]
+        if not stages and not floating:
             return
 
-        self.savePrevPosition(currId, [])
-        
-        for i, window in enumerate(mini_windows):
-            column = i // max_window_per_col
-            row = i % max_window_per_col
-
-            xPosition = miniX + column * (miniWidth + miniHorizontalGap)
-            yPosition = miniY + row * (miniHeight + miniVerticalGap)
-            # await asyncio.sleep(0.01)
-            self.prevPos[currId].append(
-                {
-                    "x": xPosition,
-                    "y": yPosition,
-                    "w": miniWidth,
-                    "h": miniHeight,
-                    "monitor": monitor_name,
-                    "address": window["address"]
-                }
+        async with hyprctl_session():
+            monitors = {
+                wid: await self.getWorkspaceMonitor(wid) for wid in stages
+            }
+            await asyncio.gather(
+                *(
+                    self.apply_stage_manager_layout(wid, monitors[wid], focus=False)
+                    for wid in stages
+                ),
+                *(self.relayout_floating(wid) for wid in floating),
             )
 
-            await self.move_and_resize_window(
-                window["address"], xPosition, yPosition, miniWidth, miniHeight
+    async def relayout_floating(self, workspace: int):
+        clients = await self.get_workspace_clients(workspace)
+        await self.applyFloatingLayout(
+            [client for client in clients if client.floating], workspace
+        )
+
+    def schedule_relayout(self, workspaces: Optional[Iterable[int]] = None):
+        """Relayout once the monitor events of a burst stopped coming.
+
+        Docking fires monitoradded, a moveworkspace per workspace and
+        configreloaded within a few hundred ms; they all end up in one
+        relayout_all and so in one batch.
+        """
+        if workspaces is None:
+            self.relayout_everything = True
+        else:
+            self.relayout_pending.update(workspaces)
+
+        if self.relayout_task is None or self.relayout_task.done():
+            self.relayout_task = asyncio.ensure_future(self._settled_relayout())
+
+    async def _settled_relayout(self):
+        while self.relayout_everything or self.relayout_pending:
+            await asyncio.sleep(MONITOR_SETTLE_TIME)
+            workspaces = None if self.relayout_everything else self.relayout_pending
+            self.relayout_everything = False
+            self.relayout_pending = set()
+            self.spatial.markDirty()
+            try:
+                await self.relayout_all(workspaces)
+            except Exception as e:
+                print("Relayout after monitor change failed:", e)
+
+    def is_suspended(self, workspace: Optional[int]) -> bool:
+        return self.screencasting or workspace in self.fullscreen_workspaces
+
+    async def handle_suspend_event(self, event: HyprEvent):
+        """Track fullscreen (per workspace) and screencast (global) state.
+
+        fullscreen>>1|0 refers to the active workspace, screencast>>STATE,OWNER
+        to the whole session.
+        """
+        if event.name == "fullscreen":
+            awt = await self.get_active_window()
+            if awt is None:
+                return
+            workspace = awt["workspace"]["id"]
+            if event.data.strip() == "1":
+                self.fullscreen_workspaces.add(workspace)
+            else:
+                self.fullscreen_workspaces.discard(workspace)
+        else:
+            self.screencasting = event.data.split(",")[0] == "1"
+
+        await self.resume_layouts()
+
+    @traced("stage.resume_layouts")
+    async def resume_layouts(self):
+        """Apply the layouts held back while suspended, in one batch."""
+        ready = {wid for wid in self.suspended_pending if not self.is_suspended(wid)}
+        if not ready:
+            return
+        self.suspended_pending -= ready
+
+        async with hyprctl_session():
+            for wid in ready:
+                if self.current_mode.get(wid) == LayoutMode.STAGE_MANAGER:
+                    clients = await self.get_workspace_clients(wid)
+                    self.window_groups[wid] = self.create_window_group(clients)
+            await self.relayout_all(ready)
+
+    async def handle_destroy_event(self, event: HyprEvent):
+        # destroyworkspacev2 carries ID,NAME, the v1 event only the name
+        workspace = event.data.split(",")[0]
+        if not workspace.lstrip("-").isdigit():
+            return
+        workspace = int(workspace)
+        allocator = self.slot_allocators.get(workspace)
+        if allocator is not None:
+            # nothing else brings parked windows back once the allocator
+            # is gone, hyprland recreates the workspace for them
+            await self.unpark_windows(
+                workspace,
+                [p for p in allocator.positions if not allocator.visible(p)],
+                move=False,
             )
-        if workspace_id is not None:
-            self.current_workspace_id = prevId
-        # Raise the active window to the top
+        self.evict_workspace(workspace)
+
+    def evict_workspace(self, workspace: int):
+        super().evict_workspace(workspace)
+        if self.current_mode.pop(workspace, None) == LayoutMode.STAGE_MANAGER:
+            journal = getJournal()
+            journal.append({"type": "unstage", "workspace": workspace})
+            journal.forget(f"stage:{workspace}")
+        self.window_groups.pop(workspace, None)
+        self.slot_allocators.pop(workspace, None)
+        self.prevPos.pop(workspace, None)
+        self.fullscreen_workspaces.discard(workspace)
+        self.suspended_pending.discard(workspace)
+        self.relayout_pending.discard(workspace)
+
+    def memory_stats(self) -> Dict[str, Dict]:
+        """Entries and approximate bytes of every long lived structure."""
+        pins = self.window_control.pins
+        structures = {
+            "layout_history": self.layout_history,
+            "prevPos": self.prevPos,
+            "window_groups": self.window_groups,
+            "current_mode": self.current_mode,
+            "slot_allocators": self.slot_allocators,
+            "floating_workspaces": self.floating_workspaces,
+            "pin_groups": pins.groups,
+            "pin_class_lookup": pins.class_lookup,
+            "event_windows": self.hyprland_event.state.windows,
+            "focus_rings": self.focus_history.workspaces,
+            "window_handles": window_handles.handles,
+        }
+        stats = {
+            name: {"entries": len(value), "bytes": approx_size(value)}
+            for name, value in structures.items()
+        }
+        stats["spatial"] = {
+            "entries": len(self.spatial.windowWorkspace),
+            "bytes": approx_size(self.spatial),
+        }
+        return stats
+
+    def handle_monitor_event(self, event: HyprEvent):
+        if event.name in WORKSPACE_MOVE_EVENTS:
+            # moveworkspacev2 is ID,NAME,MONITOR, moveworkspace NAME,MONITOR
+            first = event.data.split(",")[0]
+            if first.isdigit():
+                self.schedule_relayout([int(first)])
+                return
+        self.schedule_relayout()
 
     async def cycle_main_window(self):
         if self.current_workspace_id is None:
@@ -636,22 +997,18 @@ class StageController(LayoutController):
         if not workspace_groups:
             return
 
-        active_group = workspace_groups[self.active_group_index]
-        all_windows = [active_group.main_window] + active_group.side_windows
-        newMain = all_windows.pop(0)
-        all_windows.append(newMain)
-        newActive = WindowGroup(all_windows[0], all_windows[1:])
-        self.window_groups[self.current_workspace_id][
-            self.active_group_index
-        ] = newActive
+        newActive = workspace_groups[self.active_group_index]
+        newActive.rotate()
 
         # workspace_groups
-        print("ALL MAIN,", newActive.main_window)
+        log.debug("ALL MAIN %s", newActive.main_window)
 
-        await self.focus_window(newActive.main_window["address"])
+        await self.focus_window(newActive.main_window.address)
         await self.apply_stage_manager_layout()
 
-    async def get_workspace_clients(self, specifiedId: int | None = None) -> List[Dict]:
+    async def get_workspace_clients(
+        self, specifiedId: int | None = None
+    ) -> List[WindowRecord]:
         activeWorkspace = specifiedId
             
         if specifiedId is None:
@@ -675,5 +1032,5 @@ class StageController(LayoutController):
             return []
 
         return [
-            client for client in clients if client["workspace"]["id"] == activeWorkspace
+            client for client in clients if client.workspace == activeWorkspace
         ]
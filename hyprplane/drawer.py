@@ -47,29 +47,24 @@ def adjustGridPosition(grid, renderPosition, maxWidth):
 async def printWindowLayout(
     layoutController, workspaceId, renderPosition="center", mode="filled"
 ):
-    neighbors = await layoutController.findNeighbors(workspaceId)
-
     if (
-        not layoutController.layoutHistory
-        or workspaceId not in layoutController.layoutHistory
+        not layoutController.layout_history
+        or workspaceId not in layoutController.layout_history
     ):
         print("No clients in the workspace.")
         return
 
     windowCoords = {
-        client["address"]: {
-            "coords": client["at"] + client["size"],
-            "floating": client.get("floating", False),
-            "focusHistoryId": client.get("focusHistoryId", float("inf")),
+        window.address: {
+            "coords": [window.x, window.y, window.w, window.h],
+            "floating": window.floating,
+            # -1 is a window hyprland never focused, drawn below the rest
+            "focusHistoryId": (
+                window.focus_history if window.focus_history >= 0 else float("inf")
+            ),
         }
-        for client in layoutController.layoutHistory.get(workspaceId, [])
+        for window in layoutController.layout_history[workspaceId]
     }
-    for client in layoutController.layoutHistory[workspaceId]:
-        windowCoords[client["address"]] = {
-            "coords": client["at"] + client["size"],
-            "floating": client.get("floating", False),
-            "focusHistoryId": client.get("focusHistoryId", float("inf")),
-        }
 
     if not windowCoords:
         print("No clients in the workspace.")
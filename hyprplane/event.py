@@ -1,12 +1,20 @@
 import asyncio
 import json
 import socket
+import time
 from enum import Enum
 from queue import Queue
 from threading import Thread
-from typing import Callable, Dict, List
+from typing import Callable, Dict, List, NamedTuple, Optional
 
+from hyprplane.controller.focus import FocusHistory
+from hyprplane.controller.handles import WindowRecord
 from hyprplane.ipc import getEventStreamPath
+from hyprplane.utils import hyprctl_cmd, hyprctl_session
+
+# reconnect delays double from the base up to the max while socket2 is down
+RECONNECT_BASE = 0.05
+RECONNECT_MAX = 5.0
 
 
 class WindowEvent(Enum):
@@ -53,14 +61,111 @@ class WindowEvent(Enum):
         return self.value
 
 
+class HyprEvent(NamedTuple):
+    name: str
+    data: str
+    # time.perf_counter() when the line was read from socket2
+    received_at: float
+    # made up by resync for a change that happened while disconnected
+    synthetic: bool = False
+
+    @classmethod
+    def parse(cls, line: str, received_at: float) -> "HyprEvent":
+        name, _, data = line.partition(">>")
+        return cls(name, data, received_at)
+
+
+class EventState(NamedTuple):
+    """What the event stream told us last: window address (without 0x) to
+    workspace id, monitor name to id and the active window address. Windows
+    opened on a named workspace map to None, their id is not in the event."""
+
+    windows: Dict[str, Optional[int]]
+    monitors: Dict[str, int]
+    active: Optional[str]
+
+
+def snapshot_state(
+    clients: List[WindowRecord], monitors: List[Dict], active
+) -> EventState:
+    return EventState(
+        {c.address[2:]: c.workspace for c in clients},
+        {m["name"]: m["id"] for m in monitors},
+        active["address"][2:] if active else None,
+    )
+
+
+def diff_state(
+    known: EventState,
+    clients: List[WindowRecord],
+    monitors: List[Dict],
+    active,
+    received_at: float,
+) -> List[HyprEvent]:
+    """Synthetic events that turn `known` into the live state.
+
+    Closes come first so a stage frees its slots before windows are added.
+    """
+    live = snapshot_state(clients, monitors, active)
+    events = []
+
+    def emit(name, data):
+        events.append(HyprEvent(name, data, received_at, True))
+
+    for address in known.windows.keys() - live.windows.keys():
+        emit("closewindow", address)
+    for client in clients:
+        address = client.address[2:]
+        if known.windows.get(address) not in (None, client.workspace):
+            emit(
+                "movewindowv2",
+                f"{address},{client.workspace},{client.workspace_name}",
+            )
+    for client in clients:
+        address = client.address[2:]
+        if address not in known.windows:
+            emit(
+                "openwindow",
+                f"{address},{client.workspace_name},"
+                f"{client.window_class},{client.title}",
+            )
+
+    for name in known.monitors.keys() - live.monitors.keys():
+        emit("monitorremoved", name)
+    for monitor in monitors:
+        if monitor["name"] not in known.monitors:
+            description = monitor.get("description", "")
+            emit("monitoraddedv2", f"{monitor['id']},{monitor['name']},{description}")
+
+    if live.active is not None and live.active != known.active:
+        emit("activewindowv2", live.active)
+    return events
+
+
+def split_lines(pending: bytes, data: bytes) -> tuple[list[str], bytes]:
+    """Complete lines of pending + data and the partial line left over.
+
+    Lines are decoded only after splitting, so a recv that cuts a line, or
+    a multi-byte character, in half never yields a truncated event.
+    """
+    *lines, rest = (pending + data).split(b"\n")
+    return [line.decode(errors="replace") for line in lines if line], rest
+
+
 # primitive based on https://wiki.hyprland.org/IPC/
 class HyprlandEventHandler:
     def __init__(self):
         self.subscribers: Dict[str, list[Callable]] = {}
-        self.event_stream_path = getEventStreamPath()
         self.loop = None
         self.msg_queue = Queue()
         self.running = False
+        # kept current from the stream, diffed against hyprland on reconnect
+        self.state = EventState({}, {}, None)
+        self.focus = FocusHistory()
+
+    @property
+    def event_stream_path(self):
+        return getEventStreamPath()
 
     def start(self):
         """Start the event handler in a new thread."""
@@ -76,39 +181,106 @@ class HyprlandEventHandler:
         asyncio.set_event_loop(self.loop)
         self.loop.run_until_complete(self.read_events())
 
-    async def connect_to_socket(self):
-        while True:
+    async def connect_to_socket(self) -> Optional[socket.socket]:
+        """Connect to socket2 without blocking the loop, backing off
+        exponentially while hyprland is not there. None once stopped."""
+        loop = asyncio.get_running_loop()
+        delay = RECONNECT_BASE
+        while self.running:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.setblocking(False)
             try:
-                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-                sock.connect(self.event_stream_path)
+                await loop.sock_connect(sock, self.event_stream_path)
                 return sock
-            except (FileNotFoundError, ConnectionRefusedError):
-                print(
-                    f"Socket not found at {self.event_stream_path}. Retrying in 5 seconds..."
-                )
-                await asyncio.sleep(5)
+            except OSError as e:
+                sock.close()
+                print(f"Cannot connect to {self.event_stream_path} ({e}), "
+                      f"retrying in {delay:.2f}s")
+                await self.wait_to_reconnect(delay)
+                delay = min(delay * 2, RECONNECT_MAX)
+        return None
+
+    async def wait_to_reconnect(self, delay: float):
+        await asyncio.sleep(delay)
+
+    async def fetch_state(self):
+        async with hyprctl_session():
+            return await asyncio.gather(
+                hyprctl_cmd("clients", True),
+                hyprctl_cmd("monitors", True),
+                hyprctl_cmd("activewindow", True),
+            )
+
+    async def resync(self, emit=True):
+        """Query hyprland and queue synthetic events for everything that
+        changed since the stream was lost, so controllers catch up in one
+        pass. The first sync only seeds the known state."""
+        try:
+            clients, monitors, active = await self.fetch_state()
+        except Exception as e:
+            print(f"Resync failed: {e}")
+            return
+        clients, monitors = clients or [], monitors or []
+        if emit:
+            for event in diff_state(
+                self.state, clients, monitors, active, time.perf_counter()
+            ):
+                self.msg_queue.put_nowait(event)
+        self.state = snapshot_state(clients, monitors, active)
+        self.focus.seed(clients)
+
+    def track_event(self, event: HyprEvent):
+        self.focus.track_event(event)
+        fields = event.data.split(",")
+        windows, monitors = self.state.windows, self.state.monitors
+        if event.name == "openwindow" and len(fields) > 1:
+            windows[fields[0]] = int(fields[1]) if fields[1].isdigit() else None
+        elif event.name == "movewindowv2" and len(fields) > 1:
+            workspace = fields[1]
+            windows[fields[0]] = (
+                int(workspace) if workspace.lstrip("-").isdigit() else None
+            )
+        elif event.name == "closewindow":
+            windows.pop(fields[0], None)
+        elif event.name == "monitoraddedv2" and len(fields) > 1:
+            if fields[0].isdigit():
+                monitors[fields[1]] = int(fields[0])
+        elif event.name == "monitorremoved":
+            monitors.pop(fields[0], None)
+        elif event.name == "activewindowv2":
+            self.state = self.state._replace(active=fields[0] or None)
 
     async def read_events(self):
+        loop = asyncio.get_running_loop()
         sock = await self.connect_to_socket()
-        sock.setblocking(False)
-        while self.running and self.loop is not None:
+        await self.resync(emit=False)
+        # bytes after the last newline, the start of a line cut by recv
+        pending = b""
+        while self.running and sock is not None:
             try:
-                data = await self.loop.sock_recv(sock, 4096)
+                data = await loop.sock_recv(sock, 4096)
                 if not data:
                     print("Connection closed. Reconnecting...")
                     sock.close()
+                    pending = b""
                     sock = await self.connect_to_socket()
+                    await self.resync()
                     continue
 
-                events = data.decode().strip().split("\n")
+                received_at = time.perf_counter()
+                lines, pending = split_lines(pending, data)
 
-                for event in events:
+                for line in lines:
+                    event = HyprEvent.parse(line, received_at)
+                    self.track_event(event)
                     self.msg_queue.put_nowait(event)
 
             except Exception as e:
                 print(f"Error reading from socket: {e}")
                 sock.close()
+                pending = b""
                 sock = await self.connect_to_socket()
+                await self.resync()
 
     async def process_event(self, event_string: str):
         try:
@@ -173,6 +345,7 @@ async def main():
     event_handler.subscribe("closewindow", window_close_handler)
 
     # Start reading events
+    event_handler.running = True
     await event_handler.read_events()
 
 
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import os
+import socket
+import struct
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+from hyprplane.constants import HANDOFF_PATH
+
+# payload length sent along with the listening socket fd
+HEADER = struct.Struct("!I")
+# how long in-flight commands get to finish before the state is snapshotted
+DRAIN_TIMEOUT = 2.0
+# a successor waits this long for the snapshot, past the drain of the old daemon
+HANDOFF_TIMEOUT = DRAIN_TIMEOUT + 1.0
+ACK = b"ok"
+
+
+class Handoff(NamedTuple):
+    """A listening control socket and state received from the running daemon."""
+
+    sock: socket.socket
+    snapshot: dict
+    conn: socket.socket
+
+    def ack(self):
+        """Tell the old daemon the control socket is being served, it exits."""
+        try:
+            self.conn.sendall(ACK)
+        finally:
+            self.conn.close()
+
+
+def bindControlSocket(path: str) -> socket.socket:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(128)
+    return sock
+
+
+def recvExactly(conn: socket.socket, size: int, data: bytes = b"") -> bytes:
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("handoff closed before the snapshot arrived")
+        data += chunk
+    return data
+
+
+def requestHandoff(
+    path: str = HANDOFF_PATH, timeout: float = HANDOFF_TIMEOUT
+) -> Optional[Handoff]:
+    """Take the control socket over from a running daemon.
+
+    Blocks until the old daemon drained its commands and sent the socket, or
+    returns None when no daemon listens on `path` or the handoff failed.
+    """
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.settimeout(timeout)
+    try:
+        conn.connect(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        conn.close()
+        return None
+
+    fds = []
+    try:
+        header, fds, _, _ = socket.recv_fds(conn, HEADER.size, 1)
+        if not fds:
+            raise ConnectionError("handoff carried no socket")
+        (size,) = HEADER.unpack(recvExactly(conn, HEADER.size, header))
+        snapshot = json.loads(recvExactly(conn, size))
+        sock = socket.socket(fileno=fds.pop())
+    except (OSError, ValueError) as e:
+        print(f"Handoff failed: {e}")
+        for fd in fds:
+            os.close(fd)
+        conn.close()
+        return None
+    return Handoff(sock, snapshot, conn)
+
+
+async def drainRequests(tasks: set, timeout: float = DRAIN_TIMEOUT):
+    """Wait for the commands that were already accepted to finish."""
+    pending = {task for task in tasks if task is not asyncio.current_task()}
+    if pending:
+        await asyncio.wait(pending, timeout=timeout)
+
+
+async def serveHandoff(
+    listenSock: socket.socket,
+    prepare: Callable[[], Awaitable[dict]],
+    resume: Callable[[socket.socket], Awaitable[None]],
+    path: str = HANDOFF_PATH,
+):
+    """Hand the control socket to the next daemon that connects to `path`.
+
+    `prepare` stops accepting commands, drains the running ones and returns
+    the state snapshot. Connections made meanwhile wait in the kernel backlog
+    of the shared listening socket, so none are refused. If the successor
+    never acknowledges, `resume` gets the socket back to serve it again.
+    Returns once a successor took over.
+    """
+    loop = asyncio.get_running_loop()
+    # the server closes its own socket object on close(), this copy is sent
+    listenSock = listenSock.dup()
+    server = bindControlSocket(path)
+    server.setblocking(False)
+    try:
+        while True:
+            conn, _ = await loop.sock_accept(server)
+            try:
+                snapshot = await prepare()
+                payload = json.dumps(snapshot, separators=(",", ":")).encode()
+                socket.send_fds(
+                    conn, [HEADER.pack(len(payload))], [listenSock.fileno()]
+                )
+                await loop.sock_sendall(conn, payload)
+                ack = await asyncio.wait_for(
+                    loop.sock_recv(conn, len(ACK)), HANDOFF_TIMEOUT
+                )
+                if ack == ACK:
+                    return
+                print("Successor did not take over, resuming")
+            except (OSError, asyncio.TimeoutError) as e:
+                print(f"Handoff failed, resuming: {e}")
+            finally:
+                conn.close()
+            await resume(listenSock.dup())
+    finally:
+        server.close()
+        listenSock.close()
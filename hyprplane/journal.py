@@ -0,0 +1,246 @@
+import atexit
+import copy
+import json
+import os
+import threading
+import time
+from typing import Iterable, Optional
+
+# records are fsynced together at most this often
+FSYNC_INTERVAL = 1.0
+# the journal is rewritten as a single snapshot after this many records
+COMPACT_EVERY = 512
+
+
+def defaultJournalPath() -> str:
+    stateDir = os.environ.get("XDG_STATE_HOME") or os.path.expanduser(
+        "~/.local/state"
+    )
+    return os.path.join(stateDir, "hyprplane", "state.jsonl")
+
+
+def emptyState() -> dict:
+    return {"pins": None, "stages": {}}
+
+
+def applyRecord(state: dict, record: dict):
+    kind = record.get("type")
+    if kind == "snapshot":
+        state["pins"] = record.get("pins")
+        state["stages"] = dict(record.get("stages", {}))
+    elif kind == "pins":
+        state["pins"] = record["table"]
+    elif kind == "stage":
+        state["stages"][str(record["workspace"])] = {"groups": record["groups"]}
+    elif kind == "unstage":
+        state["stages"].pop(str(record["workspace"]), None)
+
+
+def reconcile(state: dict, liveAddresses: Iterable[str]) -> dict:
+    """Drop every window that no longer exists from a replayed state."""
+    live = set(liveAddresses)
+    state = copy.deepcopy(state)
+
+    pins = state.get("pins")
+    if pins:
+        pins["classLookup"] = {
+            name: address
+            for name, address in pins.get("classLookup", {}).items()
+            if address in live
+        }
+        pins["orders"] = [a for a in pins.get("orders", []) if a in live]
+        for name, windows in pins.get("groups", {}).items():
+            windows[:] = [a for a in windows if a in live]
+            groupState = pins.get("groupStates", {}).get(name)
+            if groupState and groupState.get("index", 0) >= len(windows):
+                groupState["index"] = 0
+
+    stages = {}
+    for workspace, stage in state.get("stages", {}).items():
+        groups = [
+            [a for a in group if a in live] for group in stage.get("groups", [])
+        ]
+        groups = [group for group in groups if group]
+        if groups:
+            stages[workspace] = {"groups": groups}
+    state["stages"] = stages
+    return state
+
+
+class StateJournal:
+    """Append-only JSON-lines journal of the daemon state.
+
+    Every record describes a piece of state in full (the pin table, one stage
+    workspace), so replaying the file in order yields the latest state and a
+    torn last line after a crash only loses that one update. Writes are
+    fsynced in batches of at most `fsyncInterval` seconds and the file is
+    compacted into one snapshot record every `compactEvery` records.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        fsyncInterval=FSYNC_INTERVAL,
+        compactEvery=COMPACT_EVERY,
+    ) -> None:
+        self.path = path or defaultJournalPath()
+        self.fsyncInterval = fsyncInterval
+        self.compactEvery = compactEvery
+        self.state = emptyState()
+        self.records = 0
+        self.file = None
+        self.lock = threading.RLock()
+        self.lastSync = 0.0
+        self.syncTimer: threading.Timer | None = None
+        # records appended while a compaction writes its snapshot
+        self.compacting: list[str] | None = None
+        # last serialized record per key, unchanged state is not rewritten
+        self.written: dict[str, str] = {}
+
+    def load(self) -> dict:
+        self.state = emptyState()
+        self.records = 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # torn write from a crash, nothing valid follows it
+                        break
+                    applyRecord(self.state, record)
+                    self.records += 1
+        except FileNotFoundError:
+            pass
+        return self.state
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = open(self.path, "a", encoding="utf-8")
+        # nothing to sync yet, the first batch waits a full interval
+        self.lastSync = time.monotonic()
+
+    def append(self, record: dict, key: Optional[str] = None):
+        """Journal a record; with a key, records equal to the last one under
+        that key are skipped. Does nothing until the journal is opened."""
+        if self.file is None:
+            return
+
+        line = json.dumps(record, separators=(",", ":"))
+        with self.lock:
+            if key is not None:
+                if self.written.get(key) == line:
+                    return
+                self.written[key] = line
+
+            self.file.write(line + "\n")
+            if self.compacting is not None:
+                self.compacting.append(line)
+            # applied from the line so the state never aliases live objects
+            applyRecord(self.state, json.loads(line))
+            self.records += 1
+            self.scheduleSync()
+
+    def forget(self, key: str):
+        """Drop the dedupe entry of a key that will not be written again."""
+        with self.lock:
+            self.written.pop(key, None)
+
+    def scheduleSync(self):
+        """fsync, or compact once compactEvery records piled up, on the
+        timer thread at most once per fsyncInterval. Never inline, so a
+        command or event never waits for the disk."""
+        if self.syncTimer is not None:
+            return
+        delay = max(0.0, self.fsyncInterval - (time.monotonic() - self.lastSync))
+        self.syncTimer = threading.Timer(delay, self.flushPending)
+        self.syncTimer.daemon = True
+        self.syncTimer.start()
+
+    def flushPending(self):
+        with self.lock:
+            self.syncTimer = None
+            compact = self.records >= self.compactEvery
+        if compact:
+            self.compact()
+        else:
+            self.sync()
+
+    def sync(self):
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.flush()
+            # fsync a dup outside the lock, appends carry on meanwhile
+            fd = os.dup(self.file.fileno())
+            self.lastSync = time.monotonic()
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def compact(self):
+        """Replace the journal with one snapshot of the current state.
+
+        The snapshot is written and fsynced without holding the lock;
+        records appended meanwhile are carried over before the swap.
+        """
+        with self.lock:
+            if self.file is None or self.compacting is not None:
+                return
+            snapshot = {"type": "snapshot", **self.state}
+            line = json.dumps(snapshot, separators=(",", ":"))
+            self.compacting = []
+
+        tmpPath = f"{self.path}.tmp"
+        try:
+            with open(tmpPath, "w", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError:
+            with self.lock:
+                self.compacting = None
+            raise
+
+        with self.lock:
+            carried, self.compacting = self.compacting, None
+            if self.file is None:
+                # closed meanwhile, the journal it wrote is complete
+                os.unlink(tmpPath)
+                return
+            with open(tmpPath, "a", encoding="utf-8") as f:
+                f.writelines(f"{line}\n" for line in carried)
+            self.file.close()
+            os.replace(tmpPath, self.path)
+            self.file = open(self.path, "a", encoding="utf-8")
+            self.records = 1 + len(carried)
+            self.lastSync = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            if self.syncTimer is not None:
+                self.syncTimer.cancel()
+                self.syncTimer = None
+            if self.file is None:
+                return
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.file = None
+
+
+_journal: StateJournal | None = None
+
+
+def getJournal() -> StateJournal:
+    global _journal
+    if _journal is None:
+        _journal = StateJournal(os.environ.get("HYPRPLANE_STATE"))
+        atexit.register(_journal.close)
+    return _journal
+
+
+def setJournal(journal: StateJournal):
+    global _journal
+    _journal = journal
@@ -1,4 +1,11 @@
-import dbus
+import os
+import threading
+import time
+from queue import Empty, SimpleQueue
+
+# notifications posted within this many seconds of the last one sent are
+# merged into a single update of the same bubble
+COALESCE_WINDOW = 1.0
 
 
 class Notification:
@@ -21,38 +28,163 @@ class Notification:
         self.timeout = timeout
         self.app_name = app_name
         self.kwargs = kwargs
+        self.count = 1
 
     def __call__(self):
         self.send_notification()
 
+    @property
+    def key(self):
+        # notifications sharing a key replace each other's bubble
+        return self.app_name
+
     def send_notification(self):
+        getNotificationService().post(self)
+
+
+class DbusBackend:
+    """org.freedesktop.Notifications over one long lived session bus."""
+
+    def __init__(self) -> None:
+        self.interface = None
+
+    def connect(self):
+        import dbus
+
         bus = dbus.SessionBus()
         notify_service = bus.get_object(
             "org.freedesktop.Notifications", "/org/freedesktop/Notifications"
         )
-        notify_interface = dbus.Interface(
+        self.interface = dbus.Interface(
             notify_service, "org.freedesktop.Notifications"
         )
 
-        app_name = self.app_name
-        replaces_id = 0
-        app_icon = ""
-        summary = self.summary
-        body = self.message
-        actions = dbus.Array([], signature="s")
-        hints = dbus.Dictionary(self.kwargs, signature="sv")
-        expire_timeout = self.timeout
-
-        notify_interface.Notify(
-            app_name,
-            replaces_id,
-            app_icon,
-            summary,
-            body,
-            actions,
-            hints,
-            expire_timeout,
-        )
+    def notify(self, notif: Notification, replaces_id: int) -> int:
+        import dbus
+
+        if self.interface is None:
+            self.connect()
+
+        try:
+            return int(
+                self.interface.Notify(
+                    notif.app_name,
+                    replaces_id,
+                    "",
+                    notif.summary,
+                    notif.message,
+                    dbus.Array([], signature="s"),
+                    dbus.Dictionary(notif.kwargs, signature="sv"),
+                    notif.timeout,
+                )
+            )
+        except dbus.DBusException:
+            # the bus or notification daemon went away, reconnect next time
+            self.interface = None
+            raise
+
+
+class NullBackend:
+    """Backend that only records what would have been shown, for tests."""
+
+    def __init__(self) -> None:
+        self.sent: list[tuple[int, Notification]] = []
+        self.lastId = 0
+
+    def notify(self, notif: Notification, replaces_id: int) -> int:
+        if not replaces_id:
+            self.lastId += 1
+            replaces_id = self.lastId
+        self.sent.append((replaces_id, notif))
+        return replaces_id
+
+
+class NotificationService:
+    """Sends notifications from a worker thread so callers never block.
+
+    The first notification of a burst is shown immediately; everything
+    posted during the next `coalesceWindow` seconds is folded into one
+    trailing update per key, which replaces the bubble through replaces_id.
+    """
+
+    def __init__(self, backend=None, coalesceWindow=COALESCE_WINDOW) -> None:
+        self.backend = backend or DbusBackend()
+        self.coalesceWindow = coalesceWindow
+        self.queue: SimpleQueue = SimpleQueue()
+        self.replaceIds: dict[str, int] = {}
+        self.worker: threading.Thread | None = None
+        self.lock = threading.Lock()
+
+    def post(self, notif: Notification):
+        with self.lock:
+            if self.worker is None:
+                self.worker = threading.Thread(
+                    target=self._run, name="notification", daemon=True
+                )
+                self.worker.start()
+        self.queue.put(notif)
+
+    def stop(self):
+        with self.lock:
+            if self.worker is None:
+                return
+            worker, self.worker = self.worker, None
+        self.queue.put(None)
+        worker.join()
+
+    def _send(self, notif: Notification):
+        if notif.count > 1:
+            notif.summary = f"{notif.summary} (x{notif.count})"
+        try:
+            self.replaceIds[notif.key] = self.backend.notify(
+                notif, self.replaceIds.get(notif.key, 0)
+            )
+        except Exception as e:
+            print(f"Failed to send notification: {e}")
+
+    def _run(self):
+        while True:
+            notif = self.queue.get()
+            if notif is None:
+                return
+            self._send(notif)
+
+            trailing: dict[str, Notification] = {}
+            deadline = time.monotonic() + self.coalesceWindow
+            stopping = False
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    nextNotif = self.queue.get(timeout=remaining)
+                except Empty:
+                    break
+                if nextNotif is None:
+                    stopping = True
+                    break
+                previous = trailing.get(nextNotif.key)
+                if previous is not None:
+                    nextNotif.count += previous.count
+                trailing[nextNotif.key] = nextNotif
+
+            for pending in trailing.values():
+                self._send(pending)
+            if stopping:
+                return
+
+
+_service: NotificationService | None = None
+
+
+def getNotificationService() -> NotificationService:
+    global _service
+    if _service is None:
+        disabled = os.environ.get("HYPRPLANE_NOTIFY") == "none"
+        _service = NotificationService(NullBackend() if disabled else None)
+    return _service
+
+
+def setNotificationService(service: NotificationService):
+    global _service
+    _service = service
 
 
 def notification(summary, message="", timeout=2000, app_name="notify-send", **kwargs):
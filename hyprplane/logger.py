@@ -1,25 +1,98 @@
+import atexit
 import logging
 import logging.config
+import logging.handlers
 import os
+import queue
+import sys
+import threading
+import time
 from datetime import datetime
 
-import structlog
-
-# from pydantic import BaseModel
-from rich.json import JSON
-from rich.text import Text
+# structlog and rich are imported where they are used so that importing this
+# module (and the daemon) does not pay for them before the first log call
 
 # from src.configs.settings import getSettings
 
 # settings = getSettings()
 logPath = "./logs/tests"
+# logger that owns the real (slow) handlers, fed by the queue listener thread
+SINK_LOGGER = "hyprplane.sink"
+LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warn": logging.WARNING,
+    "error": logging.ERROR,
+}
+
+
+class PassThroughQueueHandler(logging.handlers.QueueHandler):
+    # the structlog formatters on the sink handlers need the original event
+    # dict, so the record is queued untouched instead of pre-formatted
+    def prepare(self, record):
+        return record
+
+
+class BatchingMemoryHandler(logging.handlers.MemoryHandler):
+    """MemoryHandler that also flushes once `flushInterval` seconds passed,
+    checked on each record and by a timer thread so an idle daemon still
+    gets its buffered records to the file."""
+
+    def __init__(
+        self, capacity, flushLevel=logging.ERROR, target=None, flushInterval=1.0
+    ):
+        super().__init__(capacity, flushLevel, target)
+        self.flushInterval = flushInterval
+        self.lastFlush = time.monotonic()
+        self.closed = threading.Event()
+        threading.Thread(target=self.flushPeriodically, daemon=True).start()
+
+    def shouldFlush(self, record):
+        return (
+            super().shouldFlush(record)
+            or time.monotonic() - self.lastFlush >= self.flushInterval
+        )
+
+    def flushPeriodically(self):
+        while not self.closed.wait(self.flushInterval):
+            if self.buffer and time.monotonic() - self.lastFlush >= self.flushInterval:
+                self.flush()
+
+    def flush(self):
+        self.lastFlush = time.monotonic()
+        super().flush()
+
+    def close(self):
+        self.closed.set()
+        super().close()
+
 
+class OverridedBoundLogger:
+    def __init__(self, logname, level=logging.NOTSET):
+        import structlog
 
-class OverridedBoundLogger(structlog.BoundLogger):
-    def __init__(self, logname):
         self.logger = structlog.get_logger(logname)
+        self.level = level
+        self.sampleCounters: dict[tuple, int] = {}
+
+    def isEnabledFor(self, level):
+        return LEVELS.get(level, logging.NOTSET) >= self.level
+
+    def sampled(self, rate):
+        # keep one call out of every 1/rate from the same call site, the site
+        # being whoever called debug()/info()/... on this logger
+        if rate >= 1:
+            return True
+        caller = sys._getframe(3)
+        site = (caller.f_code.co_filename, caller.f_lineno)
+        count = self.sampleCounters.get(site, 0)
+        self.sampleCounters[site] = count + 1
+        return count % max(1, round(1 / rate)) == 0
+
+    def log(self, level, *args, sample=1.0, **kwargs):
+        if not self.isEnabledFor(level) or not self.sampled(sample):
+            return
 
-    def log(self, level, *args, **kwargs):
         message = " ".join(map(str, args))
         if level == "debug":
             self.logger.debug(message, **kwargs)
@@ -59,6 +132,9 @@ class SystemLogger(OverridedBoundLogger):
     logHandlers: list[str]
 
     def __init__(self, logName: str, logDir: str, logLevel=logging.NOTSET):
+        import structlog
+
+        self.logQueue = queue.SimpleQueue()
         self.foreignLogChain = [
             structlog.processors.add_log_level,
             structlog.processors.TimeStamper(fmt="%Y-%m-%d %H:%M:%S", utc=False),
@@ -79,6 +155,7 @@ class SystemLogger(OverridedBoundLogger):
             structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
         ]
         self.logDir = logDir
+        self.logLevel = logLevel
         self.loadLogDictCfg()
 
         structlog.configure(
@@ -88,8 +165,24 @@ class SystemLogger(OverridedBoundLogger):
             logger_factory=structlog.stdlib.LoggerFactory(),
         )
 
+        sinkHandlers = logging.getLogger(SINK_LOGGER).handlers
+        self.listener = logging.handlers.QueueListener(
+            self.logQueue, *sinkHandlers, respect_handler_level=True
+        )
+        self.listener.start()
+        self.listenerRunning = True
+        atexit.register(self.stopListener)
+
         # self.rootLogger = structlog.get_logger(logName)
-        self.rootLogger = super().__init__(logName)
+        self.rootLogger = super().__init__(logName, logLevel)
+
+    def stopListener(self):
+        if not self.listenerRunning:
+            return
+        self.listenerRunning = False
+        self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.flush()
 
     def timeBasedLogFile(self):
         loggedTime = datetime.now().today()
@@ -104,6 +197,9 @@ class SystemLogger(OverridedBoundLogger):
 
     # this can only be called at the end of the format processors
     def structLogToRichTextProcessor(self, logger, method_name, event_dict: dict):
+        from rich.json import JSON
+        from rich.text import Text
+
         strFormat = "[bold blue][[ {} ]] [green] {}".format(
             event_dict["timestamp"], event_dict["event"]
         )
@@ -160,10 +256,19 @@ class SystemLogger(OverridedBoundLogger):
             "formatters": self.getFormatterConfig(),
             "handlers": self.configureHandlers(),
             "loggers": {
+                # everything logged in the process only pays for a queue put,
+                # formatting and I/O happen on the QueueListener thread
+                # gated here too, so stdlib log.debug() calls below the
+                # HYPRPLANE_LOG_LEVEL are dropped before they are queued
                 "": {
+                    "handlers": ["queue"],
+                    "level": self.logLevel,
+                    "propagate": True,
+                },
+                SINK_LOGGER: {
                     "handlers": ["file", "default"],
                     "level": logging.NOTSET,
-                    "propagate": True,
+                    "propagate": False,
                 },
             },
         }
@@ -171,6 +276,8 @@ class SystemLogger(OverridedBoundLogger):
         logging.config.dictConfig(logDict)
 
     def getFormatterConfig(self):
+        import structlog
+
         formatters = {
             # "rich": {"format": "%(name)s - %(message)s"},
             "standard": {
@@ -202,7 +309,17 @@ class SystemLogger(OverridedBoundLogger):
 
     def configureHandlers(self):
         logHandlers = {
+            "queue": {
+                "()": PassThroughQueueHandler,
+                "queue": self.logQueue,
+            },
             "file": {
+                "level": "DEBUG",
+                "class": "hyprplane.logger.BatchingMemoryHandler",
+                "capacity": 64,
+                "target": "file_writer",
+            },
+            "file_writer": {
                 "level": "DEBUG",
                 "class": "logging.handlers.RotatingFileHandler",
                 "filename": self.timeBasedLogFile(),
@@ -222,5 +339,27 @@ class SystemLogger(OverridedBoundLogger):
         return logHandlers
 
     @classmethod
-    def getLogger(cls, log_name, log_dir, level=logging.NOTSET):
+    def getLazyLogger(cls, log_name, log_dir, level=None):
+        return LazyLogger(lambda: cls.getLogger(log_name, log_dir, level))
+
+    @classmethod
+    def getLogger(cls, log_name, log_dir, level=None):
+        if level is None:
+            envLevel = os.environ.get("HYPRPLANE_LOG_LEVEL", "NOTSET").upper()
+            level = logging.getLevelName(envLevel)
+            if not isinstance(level, int):
+                level = logging.NOTSET
         return cls(log_name, log_dir, level)
+
+
+class LazyLogger:
+    """Stands in for a SystemLogger and builds it on the first log call."""
+
+    def __init__(self, factory) -> None:
+        self.factory = factory
+        self.logger = None
+
+    def __getattr__(self, name):
+        if self.logger is None:
+            self.logger = self.factory()
+        return getattr(self.logger, name)
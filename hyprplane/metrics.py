@@ -0,0 +1,113 @@
+import asyncio
+import time
+from bisect import bisect_left
+from functools import wraps
+
+# upper bounds in milliseconds, anything slower lands in the overflow bucket
+BUCKETS_MS = (0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram, cheap enough to update on every call."""
+
+    __slots__ = ("counts", "count", "errors", "total", "max")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, elapsed_ms: float, error: bool = False):
+        self.counts[bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+        self.count += 1
+        self.total += elapsed_ms
+        if elapsed_ms > self.max:
+            self.max = elapsed_ms
+        if error:
+            self.errors += 1
+
+    def percentile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                if i == len(BUCKETS_MS):
+                    return self.max
+                return min(BUCKETS_MS[i], self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "error_rate": self.errors / self.count if self.count else 0.0,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+        }
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self.histograms: dict[str, Histogram] = {}
+
+    def observe(self, name: str, elapsed_ms: float, error: bool = False):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(elapsed_ms, error)
+
+    def snapshot(self) -> dict:
+        return {
+            name: histogram.summary()
+            for name, histogram in sorted(self.histograms.items())
+        }
+
+    def reset(self):
+        self.histograms.clear()
+
+
+metrics = Metrics()
+
+
+def timed(name: str):
+    """Record the wall time of a sync or async callable into `metrics`."""
+
+    def decorate(func):
+        if asyncio.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                error = True
+                try:
+                    result = await func(*args, **kwargs)
+                    error = False
+                    return result
+                finally:
+                    metrics.observe(name, (time.perf_counter() - start) * 1000, error)
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            error = True
+            try:
+                result = func(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                metrics.observe(name, (time.perf_counter() - start) * 1000, error)
+
+        return wrapper
+
+    return decorate
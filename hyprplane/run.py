@@ -13,7 +13,8 @@ async def get_server_actions():
         writer.write(b"get_actions")
         await writer.drain()
 
-        data = await asyncio.wait_for(reader.read(1024), timeout=TIMEOUT)
+        # the daemon closes the connection after its reply, read all of it
+        data = await asyncio.wait_for(reader.read(), timeout=TIMEOUT)
         print("DAATA", data)
         writer.close()
         await writer.wait_closed()
@@ -35,6 +36,15 @@ async def get_server_actions():
         return {}
 
 
+def get_local_actions():
+    # same registry the daemon serves, used when the daemon is not running
+    try:
+        from hyprplane.commander import describeCommands
+    except ImportError:
+        return {}
+    return describeCommands()
+
+
 def get_key_input():
     while True:
         key = input("Enter the key for the keybind (e.g., d, l, g):").strip().lower()
@@ -66,7 +76,7 @@ def generate_keybind(key, action, args):
 
 
 async def main():
-    actions = await get_server_actions()
+    actions = await get_server_actions() or get_local_actions()
     if not actions:
         print("No actions available. Exiting.")
         return
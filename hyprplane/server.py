@@ -1,83 +1,281 @@
 import asyncio
+import sys
 import threading
-from concurrent.futures.thread import ThreadPoolExecutor
+import time
 
-from hyprplane.commander import CommandResolver
+from hyprplane.commander import CommandResolver, splitCommand
 from hyprplane.constants import SOCKET_PATH
+from hyprplane.controller.handles import WindowRecord
 from hyprplane.controller.layout import LayoutController
 from hyprplane.controller.stage_manager import StageController
-from hyprplane.controller.window import WindowController, WindowStack, timeIt
+from hyprplane.controller.focus import FocusHistory
+from hyprplane.controller.window import WindowController
+from hyprplane.handoff import (
+    bindControlSocket,
+    drainRequests,
+    requestHandoff,
+    serveHandoff,
+)
+from hyprplane.journal import getJournal, reconcile
 from hyprplane.libnotify import notification
 from hyprplane.logger import SystemLogger
+from hyprplane.metrics import metrics
+from hyprplane.tracing import tracer
+from hyprplane.utils import hyprctl_cmd, hyprctl_session
 
-sysLogger = SystemLogger.getLogger(".ipc-log.json", ".")
+sysLogger = SystemLogger.getLazyLogger(".ipc-log.json", ".")
+
+
+resolver = CommandResolver()
+# names of coalescing commands currently running
+inFlight: set[str] = set()
+# args of the one run owed to a coalescing command pressed while it ran
+trailingRuns: dict[str, list] = {}
+# control connections being served, drained before a handoff
+activeRequests: set[asyncio.Task] = set()
 
 
-@timeIt
 async def resolveCommand(
     controller: WindowController,
-    windStack: WindowStack,
+    focus: FocusHistory,
     layoutController: LayoutController,
     cmd_info: tuple,
+    persist: bool = True,
 ):
+    """Run a command; with `persist` the journal is written after commands
+    that change pin or stage state. Pipeline steps persist once at the end."""
     command, args = cmd_info
 
-    resolver = CommandResolver()
-    strategy = resolver.getStrategy(command)
-    controlMode = getattr(strategy, "controlMode", "window")
-    sysLogger.debug("strat", strategy, controlMode)
-    if strategy:
-        if controlMode == "layout":
-            result = await strategy.execute(layoutController, windStack, args)
-            sysLogger.debug(f"LayoutController ControlMode Detected {controlMode}")
-            if result:
-                return result
-        else:
-            result = await strategy.execute(controller, windStack, args)
-            if result:
-                return result
-    else:
+    spec = resolver.getSpec(command)
+    if spec is None:
         sysLogger.debug(f"Unknown command: {command}")
+        return
 
+    if spec.coalesce:
+        if command in inFlight:
+            # repeats while it runs fold into one trailing run, so the
+            # presses still end on the state the user asked for
+            folded = resolver.getStrategy(command).fold(
+                trailingRuns.get(command), args
+            )
+            if folded is None:
+                trailingRuns.pop(command, None)
+            else:
+                trailingRuns[command] = folded
+            sysLogger.debug(f"Folded a repeat of: {command}")
+            return
+        inFlight.add(command)
+    try:
+        result = await runCommand(spec, controller, focus, layoutController, args)
+        while command in trailingRuns:
+            await runCommand(
+                spec, controller, focus, layoutController, trailingRuns.pop(command)
+            )
+        if persist and spec.mutates:
+            persistState(controller, layoutController)
+        return result
+    finally:
+        inFlight.discard(command)
+        trailingRuns.pop(command, None)
 
-def buildController(windowstack, windCont, layoutController):
-    sysLogger.debug("Building controller...")
 
-    async def control(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
-        data = await reader.read(1024)
-        msg = data.decode().strip()
-        sysLogger.debug(f"Received message: {msg}")
-        command_parts = msg.split(maxsplit=1)
-        command = command_parts[0]
-        args = command_parts[1:] if len(command_parts) > 1 else []
-        result = await resolveCommand(
-            windCont, windowstack, layoutController, (command, args)
+async def runCommand(spec, controller, focus, layoutController, args):
+    start = time.perf_counter()
+    error = True
+    try:
+        with tracer.span(f"command.{spec.name}", "command"):
+            result = await runStrategy(
+                spec, controller, focus, layoutController, args
+            )
+        error = False
+        return result
+    finally:
+        metrics.observe(
+            f"command.{spec.name}", (time.perf_counter() - start) * 1000, error
         )
 
+
+async def runStrategy(spec, controller, focus, layoutController, args):
+    strategy = resolver.getStrategy(spec.name)
+    controlMode = spec.controlMode
+    sysLogger.debug("strat", strategy, controlMode, sample=0.1)
+
+    if controlMode == "pipeline":
+        mutated = False
+
+        async def runStep(stepCommand, stepArgs):
+            nonlocal mutated
+            stepSpec = resolver.getSpec(stepCommand)
+            mutated = mutated or (stepSpec is not None and stepSpec.mutates)
+            return await resolveCommand(
+                controller,
+                focus,
+                layoutController,
+                (stepCommand, stepArgs),
+                persist=False,
+            )
+
+        result = await strategy.execute(runStep, focus, args)
+        if mutated:
+            persistState(controller, layoutController)
+        return result
+    elif controlMode == "layout":
+        result = await strategy.execute(layoutController, focus, args)
+        sysLogger.debug(
+            "LayoutController ControlMode Detected", controlMode, sample=0.1
+        )
         if result:
-            writer.write(result)
-            await writer.drain()
+            return result
+    else:
+        result = await strategy.execute(controller, focus, args)
+        if result:
+            return result
+
+
+def persistState(controller: WindowController, layoutController: StageController):
+    getJournal().append(
+        {"type": "pins", "table": controller.pins.to_table()}, key="pins"
+    )
+    layoutController.journal_stages()
+
+
+def snapshotState(controller: WindowController, layoutController: StageController):
+    """State handed to a successor daemon. The journal is closed so the
+    successor owns the file from here on."""
+    persistState(controller, layoutController)
+    journal = getJournal()
+    journal.close()
+    return {
+        **journal.state,
+        "floating": sorted(layoutController.floating_workspaces),
+        "isFloating": layoutController.is_floating,
+        "layoutHistory": {
+            workspace: [window.as_client() for window in windows]
+            for workspace, windows in layoutController.layout_history.items()
+        },
+    }
+
+
+def restoreFloating(layoutController: StageController, snapshot: dict):
+    layoutController.floating_workspaces.update(snapshot.get("floating", []))
+    layoutController.is_floating = snapshot.get("isFloating", False)
+    for workspace, history in snapshot.get("layoutHistory", {}).items():
+        layoutController.layout_history[int(workspace)] = [
+            WindowRecord.from_client(client) for client in history
+        ]
+
+
+async def restoreState(
+    controller: WindowController,
+    layoutController: StageController,
+    snapshot: dict | None = None,
+):
+    """Replay the state journal, or the snapshot handed over by the previous
+    daemon, and reconcile it against the live clients.
+
+    The time from reading the journal until the restored layouts are flushed
+    is recorded as startup.restore.
+    """
+    start = time.perf_counter()
+    journal = getJournal()
+    if snapshot is None:
+        state = journal.load()
+    else:
+        state = {"pins": snapshot.get("pins"), "stages": snapshot.get("stages", {})}
+        restoreFloating(layoutController, snapshot)
+    journal.open()
+    try:
+        async with hyprctl_session():
+            clients = await hyprctl_cmd("clients", True) or []
+            state = reconcile(state, (client.address for client in clients))
+            if state["pins"]:
+                controller.pins.load(state["pins"])
+            await layoutController.restore_stages(state["stages"], clients)
+    except Exception as e:
+        sysLogger.error(f"Failed to restore state: {e}")
+    journal.state = state
+    await asyncio.to_thread(journal.compact)
+    elapsed = (time.perf_counter() - start) * 1000
+    metrics.observe("startup.restore", elapsed)
+    sysLogger.info(f"Restored state in {elapsed:.1f}ms")
+
+
+def buildController(focus, windCont, layoutController):
+    sysLogger.debug("Building controller...")
+
+    async def control(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        activeRequests.add(task)
+        try:
+            data = await reader.read(1024)
+            msg = data.decode().strip()
+            sysLogger.debug(f"Received message: {msg}")
+            command, args = splitCommand(msg)
+            result = await resolveCommand(
+                windCont, focus, layoutController, (command, args)
+            )
+
+            if result:
+                writer.write(result)
+                await writer.drain()
+        finally:
+            # clients read the reply until EOF
+            writer.close()
+            activeRequests.discard(task)
 
     return control
 
 
+async def startServer(control, sock):
+    # from 3.13 close() unlinks SOCKET_PATH, which belongs to the successor then
+    options = {"cleanup_socket": False} if sys.version_info >= (3, 13) else {}
+    return await asyncio.start_unix_server(control, sock=sock, **options)
+
+
 async def startController():
     sysLogger.debug("starting controller...")
-    windowstack = WindowStack()
     windCont = WindowController()
     mainLoopEvent = threading.Event()
     layoutCont = StageController(windCont)
 
+    # a running daemon keeps serving until this one is ready, commands sent
+    # meanwhile queue in the backlog of the shared listening socket
+    start = time.perf_counter()
+    handoff = await asyncio.to_thread(requestHandoff)
+    if handoff is None:
+        listenSock = bindControlSocket(SOCKET_PATH)
+        await restoreState(windCont, layoutCont)
+    else:
+        listenSock = handoff.sock
+        await restoreState(windCont, layoutCont, handoff.snapshot)
+
     # this one is dodo
     await layoutCont.start()
-    cont = buildController(windowstack, windCont, layoutCont)
+    cont = buildController(layoutCont.focus_history, windCont, layoutCont)
 
-    server = await asyncio.start_unix_server(cont, SOCKET_PATH)
+    server = await startServer(cont, listenSock)
     threading.Thread(target=layoutCont._run_executor_loop).start()
+    if handoff is not None:
+        handoff.ack()
+        elapsed = (time.perf_counter() - start) * 1000
+        metrics.observe("startup.handoff", elapsed)
+        sysLogger.info(f"Took over the control socket in {elapsed:.1f}ms")
+
+    async def prepare():
+        server.close()
+        await drainRequests(activeRequests)
+        layoutCont.stop()
+        return snapshotState(windCont, layoutCont)
+
+    async def resume(sock):
+        nonlocal server
+        getJournal().open()
+        layoutCont.resume()
+        server = await startServer(cont, sock)
 
-    async with server:
-        sysLogger.debug("server stacking", server)
-        await server.serve_forever()
+    sysLogger.debug("server stacking", server)
+    await serveHandoff(listenSock, prepare, resume)
+    sysLogger.info("Handed the control socket over, exiting")
 
 
 def main():
@@ -0,0 +1,136 @@
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from functools import wraps
+
+# keeps a forgotten `trace start` from growing without bound
+MAX_TRACE_EVENTS = 200_000
+
+_current_span: ContextVar[int | None] = ContextVar("trace_span", default=None)
+_disabled = nullcontext()
+
+
+def default_trace_path():
+    return f"/tmp/hyprplane-trace-{os.getpid()}.json"
+
+
+class Span:
+    __slots__ = ("tracer", "name", "cat", "args", "id", "parent", "start", "token")
+
+    def __init__(self, tracer: "Tracer", name: str, cat: str, args: dict) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self.id = next(self.tracer.ids)
+        self.token = _current_span.set(self.id)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        _current_span.reset(self.token)
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.record(self, end)
+        return False
+
+
+class Tracer:
+    """Span recorder exporting the Chrome trace-event format.
+
+    Spans opened while another span is current (including across `await`,
+    through contextvars) are linked to it with the `parent` arg. While
+    disabled, `span()` returns a shared no-op context manager.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.path = default_trace_path()
+        self.events: list[dict] = []
+        self.ids = itertools.count(1)
+        self.dropped = 0
+
+    def start(self, path: str | None = None):
+        self.events = []
+        self.dropped = 0
+        self.path = path or default_trace_path()
+        self.enabled = True
+
+    def detach(self) -> dict:
+        """Stop recording and hand over the trace recorded so far."""
+        self.enabled = False
+        events, self.events = self.events, []
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped": self.dropped},
+        }
+
+    def write(self, trace: dict, path: str) -> str:
+        with open(path, "w") as f:
+            json.dump(trace, f)
+        return path
+
+    def stop(self) -> str:
+        return self.write(self.detach(), self.path)
+
+    async def stop_async(self) -> str:
+        """stop() with the file written on a worker thread, off the loop."""
+        return await asyncio.to_thread(self.write, self.detach(), self.path)
+
+    def span(self, name: str, cat: str = "hyprplane", **args):
+        if not self.enabled:
+            return _disabled
+        return Span(self, name, cat, args)
+
+    def record(self, span: Span, end: int):
+        # spans still open when tracing stopped
+        if not self.enabled:
+            return
+        if len(self.events) >= MAX_TRACE_EVENTS:
+            self.dropped += 1
+            return
+
+        span.args["id"] = span.id
+        if span.parent is not None:
+            span.args["parent"] = span.parent
+        self.events.append(
+            {
+                "name": span.name,
+                "cat": span.cat,
+                "ph": "X",
+                "ts": span.start / 1000,
+                "dur": (end - span.start) / 1000,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": span.args,
+            }
+        )
+
+
+tracer = Tracer()
+
+
+def traced(name: str, cat: str = "layout"):
+    """Wrap a coroutine function in a span while tracing is enabled."""
+
+    def decorate(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return await func(*args, **kwargs)
+            with tracer.span(name, cat):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
@@ -1,24 +1,31 @@
 import asyncio
 import itertools
 import json
+import sys
 import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 
+from .decoder import DECODERS
 from .ipc import getEventStreamPath, getHyprCtrlPath
+from .metrics import metrics
+from .tracing import tracer
 
-# EVENTS = f"{IPC_FOLDER}/.socket2.sock"
-EVENTS_STREAM = getEventStreamPath()
-HYPRCTL = getHyprCtrlPath()
+# socket paths are resolved on first connection, see ipc.py
 MAX_EVENTS_RETRY = 10
+# queries that are answered once per session and shared by every caller in it
+SNAPSHOT_QUERIES = ("activewindow", "clients", "monitors", "workspaces")
 
 
 async def getEventStream() -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
     """Return a new event socket connection."""
-    return await asyncio.open_unix_connection(EVENTS_STREAM)
+    return await asyncio.open_unix_connection(getEventStreamPath())
 
 
 async def getHyprCtlHandle() -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
     """Return a new event socket connection."""
-    return await asyncio.open_unix_connection(HYPRCTL)
+    return await asyncio.open_unix_connection(getHyprCtrlPath())
 
 
 async def getEventStreamRetry(
@@ -39,23 +46,149 @@ async def getEventStreamRetry(
             await asyncio.sleep(1)
 
 
-# Function to execute hyprctl command and return the output as JSON
+class HyprctlSession:
+    """Dispatches queued during a session plus the query snapshot it shares."""
+
+    def __init__(self) -> None:
+        self.dispatches: list[str] = []
+        self.snapshot: dict = {}
+
+
+_session: ContextVar[HyprctlSession | None] = ContextVar(
+    "hyprctl_session", default=None
+)
+
+
+@asynccontextmanager
+async def hyprctl_session():
+    """Batch every dispatch issued inside the block into one flush at the end.
+
+    Snapshot queries (see SNAPSHOT_QUERIES) are fetched at most once inside the
+    block, so several actions see the same active window and client list.
+    Nested sessions join the outermost one.
+    """
+    current = _session.get()
+    if current is not None:
+        yield current
+        return
+
+    session = HyprctlSession()
+    token = _session.set(session)
+    try:
+        yield session
+    finally:
+        _session.reset(token)
+        await hyprctl_batch(session.dispatches)
+
+
+def approx_size(obj, seen: set | None = None) -> int:
+    """sys.getsizeof of obj plus everything reachable from it, each object
+    counted once. Good enough to watch a structure grow, not exact."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += approx_size(key, seen) + approx_size(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        for item in obj:
+            size += approx_size(item, seen)
+    elif hasattr(obj, "__dict__"):
+        size += approx_size(vars(obj), seen)
+    elif hasattr(obj, "__slots__"):
+        for slot in obj.__slots__:
+            if hasattr(obj, slot):
+                size += approx_size(getattr(obj, slot), seen)
+    return size
+
+
+def metric_name(command: str) -> str:
+    # "dispatch movewindowpixel exact ..." -> "hyprctl.dispatch:movewindowpixel"
+    parts = command.split(maxsplit=2)
+    if parts[0] == "dispatch" and len(parts) > 1:
+        return f"hyprctl.dispatch:{parts[1]}"
+    return f"hyprctl.{parts[0]}"
+
+
+async def hyprctl_batch(commands: list[str]):
+    """Send several commands to hyprland over a single socket round trip."""
+    if not commands:
+        return
+    if len(commands) == 1:
+        return await _hyprctl_request(commands[0])
+
+    with tracer.span("hyprctl.batch", "hyprctl", commands=len(commands)):
+        return await _send_batch(commands)
+
+
+async def _send_batch(commands: list[str]):
+    start = time.perf_counter()
+    error = False
+    try:
+        reader, writer = await getHyprCtlHandle()
+        writer.write(f"[[BATCH]]{';'.join(commands)}".encode())
+        await writer.drain()
+        data = await reader.read()
+        writer.close()
+        return data.decode().strip()
+    except Exception as e:
+        error = True
+        print(f"Error running batch of {len(commands)} commands: {e}")
+        return None
+    finally:
+        metrics.observe("hyprctl.batch", (time.perf_counter() - start) * 1000, error)
+
+
 async def hyprctl_cmd(command, getOutput=False):
+    session = _session.get()
+    if session is None:
+        return await _hyprctl_request(command, getOutput)
+
+    if command.startswith("dispatch"):
+        session.dispatches.append(command)
+        return
+
+    if getOutput and command in SNAPSHOT_QUERIES:
+        if command not in session.snapshot:
+            # concurrent callers in the session share the one request
+            session.snapshot[command] = asyncio.ensure_future(
+                _hyprctl_request(command, getOutput)
+            )
+        return await session.snapshot[command]
+
+    return await _hyprctl_request(command, getOutput)
+
+
+async def _hyprctl_request(command, getOutput=False):
+    with tracer.span(metric_name(command), "hyprctl"):
+        return await _send_request(command, getOutput)
+
+
+# Function to execute hyprctl command and return the output as JSON
+async def _send_request(command, getOutput=False):
     start = time.perf_counter()
     output = None
-    reader, writer = await getHyprCtlHandle()
+    error = False
 
     try:
+        reader, writer = await getHyprCtlHandle()
         cmd = f"-j/{command}"
         # print("CMD", cmd)
         # result = subprocess.run(cmd, capture_output=True, text=True)
         writer.write(cmd.encode())
         await writer.drain()
         data = await reader.read()
+        writer.close()
+        decoder = DECODERS.get(command)
+        if getOutput and decoder is not None:
+            return decoder(data)
+
         output = data.decode().strip()
         # print("raw", output)
-
-        writer.close()
         if output == "ok":
             return
         if not output:
@@ -65,12 +198,19 @@ async def hyprctl_cmd(command, getOutput=False):
             return json.loads(output)
 
     except FileNotFoundError as e:
+        error = True
         print(f"File socket not found.Is hyprland running?")
         return None
     except json.JSONDecodeError as e:
+        error = True
         print(f"Error decoding JSON: {e} { command } {output}")
         print(f"Raw output: {output}")
         return None
     except Exception as e:
+        error = True
         print(f"Error running command: {e}")
         return None
+    finally:
+        metrics.observe(
+            metric_name(command), (time.perf_counter() - start) * 1000, error
+        )
@@ -7,7 +7,7 @@ import unittest
 
 from hyprplane.commander import EnterStage
 from hyprplane.controller.stage_manager import StageController
-from hyprplane.controller.window import WindowController, WindowStack
+from hyprplane.controller.window import WindowController
 from hyprplane.utils import hyprctl_cmd
 
 TEST_SAMPLE_WINDOS = 4
@@ -136,14 +136,14 @@ class TestLayoutGrid(AioTestCase):
 
         stage_strategy = EnterStage()
 
-        wind_stack = WindowStack()
-
-        await stage_strategy.execute(self.stage_controller, wind_stack, [""])
+        await stage_strategy.execute(
+            self.stage_controller, self.stage_controller.focus_history, [""]
+        )
 
         await asyncio.sleep(1)
         sampled_group = self.stage_controller.window_groups[self.testing_workspace][0]
 
-        addr = sampled_group.side_windows[1]["address"]
+        addr = sampled_group.side_windows[1].address
         await hyprctl_cmd(f"dispatch closewindow address:{addr}")
 
         # Ensure we wait enough time for the operations to complete
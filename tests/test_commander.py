@@ -0,0 +1,226 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from importlib.util import find_spec
+
+from hyprplane.commander import (
+    COMMAND_REGISTRY,
+    CommandResolver,
+    CommandSpec,
+    CommandStrategy,
+    PageStage,
+    PipelineCommand,
+    ToggleStrategy,
+    _instances,
+    describeCommands,
+    splitCommand,
+)
+from hyprplane.controller.window import WindowController
+from hyprplane.journal import StateJournal, setJournal
+from hyprplane.libnotify import (
+    NotificationService,
+    NullBackend,
+    getNotificationService,
+    setNotificationService,
+)
+
+from hyprplane import run, server
+
+# the daemon logger is built on first use and needs both
+HAS_LOGGER_DEPS = all(find_spec(name) for name in ("structlog", "rich"))
+
+
+def setUpModule():
+    # keep the notifications of controller calls off the session bus
+    setNotificationService(NotificationService(NullBackend()))
+
+
+def tearDownModule():
+    getNotificationService().stop()
+    setNotificationService(None)
+
+
+class TestCommandRegistry(unittest.TestCase):
+    def test_strategies_are_created_once(self):
+        resolver = CommandResolver()
+        self.assertIs(resolver.getStrategy("estage"), resolver.getStrategy("estage"))
+        self.assertIsNone(resolver.getStrategy("does-not-exist"))
+
+    def test_metadata_comes_from_registry(self):
+        self.assertEqual(COMMAND_REGISTRY["estage"].controlMode, "layout")
+        self.assertEqual(COMMAND_REGISTRY["lockpin"].controlMode, "window")
+        self.assertEqual(set(describeCommands()), set(COMMAND_REGISTRY))
+
+    def test_split_command(self):
+        self.assertEqual(splitCommand("toggle-lock backward"), ("toggle-lock", ["backward"]))
+        self.assertEqual(splitCommand("lockpin"), ("lockpin", []))
+
+
+class TestPipeline(unittest.TestCase):
+    def test_runs_steps_in_order_and_skips_unknown(self):
+        steps = []
+
+        async def runStep(command, args):
+            steps.append((command, args))
+
+        async def run():
+            # no dispatch is issued by runStep so the batch flush is a no-op
+            return await PipelineCommand().execute(
+                runStep, None, ["generate-lock work, lockpin, bogus, pipeline lockpin"]
+            )
+
+        result = json.loads(asyncio.run(run()))
+        self.assertEqual(steps, [("generate-lock", ["work"]), ("lockpin", [])])
+        self.assertEqual(result["skipped"], ["bogus", "pipeline"])
+
+
+class TestPageFolding(unittest.TestCase):
+    def fold(self, *presses):
+        queued = None
+        for page in presses:
+            queued = PageStage().fold(queued, [page])
+        return queued
+
+    def test_relative_steps_add_up(self):
+        self.assertEqual(self.fold("next"), ["next"])
+        self.assertEqual(self.fold("next", "next", "next"), ["+3"])
+        self.assertEqual(self.fold("prev", "prev"), ["-2"])
+        self.assertEqual(self.fold("next", "prev", "prev"), ["prev"])
+        self.assertIsNone(self.fold("next", "prev"))
+
+    def test_absolute_page_resets_the_steps(self):
+        self.assertEqual(self.fold("next", "next", "4"), ["4"])
+        self.assertEqual(self.fold("4", "next", "next"), ["6"])
+        self.assertEqual(self.fold("1", "prev"), ["1"])
+
+
+class SlowCommand(CommandStrategy):
+    """Records its runs, the first one waits until `gate` is set."""
+
+    runs = []
+    gate = None
+
+    async def execute(self, controller, focus, args):
+        self.runs.append(args)
+        if len(self.runs) == 1:
+            await self.gate.wait()
+
+
+class SlowToggle(ToggleStrategy, SlowCommand):
+    pass
+
+
+class StageStub:
+    def journal_stages(self):
+        pass
+
+
+@unittest.skipUnless(HAS_LOGGER_DEPS, "structlog/rich not installed")
+class TestCoalescing(unittest.TestCase):
+    def setUp(self):
+        # the daemon log file is created in the working directory
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        SlowCommand.runs = []
+        for name, strategy in (("slow", SlowCommand), ("slow-toggle", SlowToggle)):
+            COMMAND_REGISTRY[name] = CommandSpec(
+                name, strategy, "test", coalesce=True
+            )
+
+    def tearDown(self):
+        for name in ("slow", "slow-toggle"):
+            del COMMAND_REGISTRY[name]
+            _instances.pop(name, None)
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def press(self, command, *presses):
+        """Run the first press and send the others while it is running."""
+        controller = WindowController()
+
+        async def resolve(arg):
+            await server.resolveCommand(
+                controller, None, StageStub(), (command, [arg])
+            )
+
+        async def run():
+            SlowCommand.gate = asyncio.Event()
+            first = asyncio.ensure_future(resolve(presses[0]))
+            await asyncio.sleep(0)
+            for arg in presses[1:]:
+                await resolve(arg)
+            SlowCommand.gate.set()
+            await first
+
+        asyncio.run(run())
+        self.assertEqual(server.inFlight, set())
+        self.assertEqual(server.trailingRuns, {})
+        return SlowCommand.runs
+
+    def test_repeats_fold_into_one_run_with_the_latest_args(self):
+        self.assertEqual(self.press("slow", "1", "2", "3"), [["1"], ["3"]])
+
+    def test_folded_toggles_keep_the_press_parity(self):
+        # three toggles end toggled, like one
+        self.assertEqual(self.press("slow-toggle", "1", "2", "3"), [["1"]])
+        SlowCommand.runs = []
+        self.assertEqual(self.press("slow-toggle", *"1234"), [["1"], ["4"]])
+
+    def test_only_mutating_commands_write_the_journal(self):
+        journal = StateJournal(os.path.join(self.tmp.name, "state.jsonl"))
+        journal.open()
+        setJournal(journal)
+        controller = WindowController()
+
+        async def run(command):
+            await server.resolveCommand(controller, None, StageStub(), (command, []))
+
+        try:
+            SlowCommand.gate = asyncio.Event()
+            SlowCommand.gate.set()
+            asyncio.run(run("slow"))
+            self.assertEqual(journal.records, 0)
+            COMMAND_REGISTRY["slow"] = CommandSpec(
+                "slow", SlowCommand, "test", mutates=True
+            )
+            asyncio.run(run("slow"))
+            self.assertEqual(journal.records, 1)
+        finally:
+            journal.close()
+            setJournal(None)
+
+
+@unittest.skipUnless(HAS_LOGGER_DEPS, "structlog/rich not installed")
+class TestControlSocket(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.socketPath = run.SOCKET_PATH
+        run.SOCKET_PATH = os.path.join(self.tmp.name, "control.sock")
+
+    def tearDown(self):
+        run.SOCKET_PATH = self.socketPath
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_actions_longer_than_one_read_arrive_whole(self):
+        control = server.buildController(None, WindowController(), StageStub())
+        COMMAND_REGISTRY["long"] = CommandSpec("long", SlowCommand, "x" * 2048)
+
+        async def run_client():
+            listener = await asyncio.start_unix_server(control, run.SOCKET_PATH)
+            async with listener:
+                return await run.get_server_actions()
+
+        try:
+            self.assertEqual(asyncio.run(run_client()), describeCommands())
+        finally:
+            del COMMAND_REGISTRY["long"]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import json
+import unittest
+
+from hyprplane import decoder
+from hyprplane.controller.handles import WindowRecord
+from hyprplane.utils import approx_size
+
+
+def reply(count):
+    clients = []
+    for i in range(count):
+        clients.append(
+            {
+                "address": f"0x{i:x}",
+                "mapped": True,
+                "hidden": False,
+                "at": [120, 80],
+                "size": [1280, 720],
+                "workspace": {"id": i % 9 + 1, "name": str(i % 9 + 1)},
+                "floating": False,
+                "monitor": 0,
+                "class": "firefox",
+                "title": "A long browser tab title — with unicode ✓ " * 3,
+                "initialClass": "firefox",
+                "initialTitle": "Mozilla Firefox",
+                "pid": 4242 + i,
+                "xwayland": False,
+                "pinned": False,
+                "fullscreen": 0,
+                "grouped": [],
+                "tags": [],
+                "swallowing": "0x0",
+                "focusHistoryID": i,
+            }
+        )
+    return json.dumps(clients, indent=4).encode()
+
+
+class TestDecodeClients(unittest.TestCase):
+    def test_records_keep_only_the_declared_fields(self):
+        data = b'\n[{"address": "0x5a", "at": [1, 2], "size": [3, 4], '
+        data += b'"workspace": {"id": -98, "name": "special:scratch"}, '
+        data += b'"class": "kitty", "title": "shell", "floating": true, '
+        data += b'"monitor": 1, "focusHistoryID": 0, "pid": 4242}]\n'
+        (record,) = decoder.decode_clients(data)
+        self.assertEqual((record.x, record.y, record.w, record.h), (1, 2, 3, 4))
+        self.assertEqual(record.workspace, -98)
+        self.assertEqual(record.workspace_name, "special:scratch")
+        self.assertTrue(record.floating)
+        self.assertEqual(record.focus_history, 0)
+        self.assertNotIn("pid", record.as_client())
+
+    def test_stdlib_fallback_parses_bytes(self):
+        data = reply(3)
+        previous = decoder._loads
+        decoder._loads = json.loads
+        try:
+            records = decoder.decode_clients(data)
+        finally:
+            decoder._loads = previous
+        self.assertEqual([r.address for r in records], ["0x0", "0x1", "0x2"])
+
+    def test_large_reply_matches_projecting_full_clients(self):
+        data = reply(300)
+        clients = json.loads(data.decode().strip())
+        records = decoder.decode_clients(data)
+        self.assertEqual(
+            [r.as_client() for r in records],
+            [WindowRecord.from_client(c).as_client() for c in clients],
+        )
+        # the decoded list holds under half the memory of the client dicts
+        self.assertLess(approx_size(records) * 2, approx_size(clients))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,207 @@
+import asyncio
+import os
+import socket
+import tempfile
+import unittest
+
+from hyprplane.controller.handles import WindowRecord
+from hyprplane.event import (
+    RECONNECT_MAX,
+    EventState,
+    HyprEvent,
+    HyprlandEventHandler,
+    diff_state,
+    snapshot_state,
+    split_lines,
+)
+
+
+def client(address, workspace, name=""):
+    return WindowRecord(
+        f"0x{address}", workspace, "kitty", "shell", workspace_name=name
+    )
+
+
+def monitor(name, id=0):
+    return {"name": name, "id": id, "description": "desc"}
+
+
+class TestResyncDiff(unittest.TestCase):
+    def test_diff_emits_close_move_open_in_order(self):
+        known = EventState({"a": 1, "b": 1, "c": 2}, {"DP-1": 0}, "a")
+        clients = [client("b", 2), client("c", 2), client("d", 3)]
+        monitors = [monitor("DP-1"), monitor("HDMI-A-1", 1)]
+
+        events = diff_state(known, clients, monitors, {"address": "0xd"}, 0.0)
+
+        self.assertEqual(
+            [(e.name, e.data) for e in events],
+            [
+                ("closewindow", "a"),
+                ("movewindowv2", "b,2,2"),
+                ("openwindow", "d,3,kitty,shell"),
+                ("monitoraddedv2", "1,HDMI-A-1,desc"),
+                ("activewindowv2", "d"),
+            ],
+        )
+        self.assertTrue(all(e.synthetic for e in events))
+
+    def test_nothing_missed_means_no_events(self):
+        clients, monitors = [client("a", 1)], [monitor("DP-1")]
+        active = {"address": "0xa"}
+        known = snapshot_state(clients, monitors, active)
+        self.assertEqual(diff_state(known, clients, monitors, active, 0.0), [])
+
+    def test_stream_keeps_the_known_state_current(self):
+        handler = HyprlandEventHandler()
+        for line in (
+            "openwindow>>a,1,kitty,shell",
+            "openwindow>>b,special:scratch,kitty,shell",
+            "movewindowv2>>a,3,3",
+            "monitorremoved>>DP-1",
+            "activewindowv2>>a",
+        ):
+            handler.track_event(HyprEvent.parse(line, 0.0))
+        self.assertEqual(handler.state.windows, {"a": 3, "b": None})
+        self.assertEqual(handler.state.active, "a")
+
+        # no id was known for b, so it is not reported as moved
+        clients = [client("a", 3), client("b", -98, "special:scratch")]
+        self.assertEqual(diff_state(handler.state, clients, [], None, 0.0), [])
+
+
+class TestSplitLines(unittest.TestCase):
+    def test_line_cut_by_recv_is_carried_over(self):
+        handler = HyprlandEventHandler()
+        handler.state.windows.update({"55": 1, "55d0": 1})
+        pending = b""
+        for chunk in (b"openwindow>>a,1,kitty,shell\ncl", b"osewindow>>55", b"d0\n"):
+            lines, pending = split_lines(pending, chunk)
+            for line in lines:
+                handler.track_event(HyprEvent.parse(line, 0.0))
+        self.assertEqual(handler.state.windows, {"55": 1, "a": 1})
+        self.assertEqual(pending, b"")
+
+    def test_decodes_after_splitting(self):
+        data = "openwindow>>a,1,kitty,caf\u00e9\n".encode()
+        lines, pending = split_lines(b"", data[:-3])
+        self.assertEqual((lines, pending), ([], data[:-3]))
+        lines, pending = split_lines(pending, data[-3:])
+        self.assertEqual(lines, ["openwindow>>a,1,kitty,caf\u00e9"])
+
+    def test_truncated_move_does_not_raise(self):
+        handler = HyprlandEventHandler()
+        handler.track_event(HyprEvent.parse("movewindowv2>>a,", 0.0))
+        self.assertEqual(handler.state.windows, {"a": None})
+
+
+class StreamHandler(HyprlandEventHandler):
+    """Reads socket2 at `path`. Backoff delays are recorded rather than
+    slept, `on_wait` runs before each retry; every resync answers with the
+    next of `states`."""
+
+    def __init__(self, path, states=(), on_wait=None):
+        super().__init__()
+        self.path = path
+        self.states = list(states)
+        self.on_wait = on_wait
+        self.delays = []
+
+    @property
+    def event_stream_path(self):
+        return self.path
+
+    async def wait_to_reconnect(self, delay):
+        self.delays.append(delay)
+        if self.on_wait is not None:
+            await self.on_wait(len(self.delays))
+
+    async def fetch_state(self):
+        return self.states.pop(0)
+
+
+def drain(queue):
+    events = []
+    while not queue.empty():
+        event = queue.get_nowait()
+        events.append((event.name, event.data, event.synthetic))
+    return events
+
+
+class TestReconnect(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, ".socket2.sock")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_backoff_doubles_up_to_the_max(self):
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        async def appear(attempt):
+            if attempt == 9:
+                server.bind(self.path)
+                server.listen()
+
+        handler = StreamHandler(self.path, on_wait=appear)
+        handler.running = True
+
+        async def run():
+            sock = await handler.connect_to_socket()
+            sock.close()
+
+        asyncio.run(run())
+        server.close()
+        # nine failed attempts, the tenth connects
+        self.assertEqual(
+            handler.delays,
+            [0.05, 0.1, 0.2, 0.4, 0.8, 1.6, 3.2, RECONNECT_MAX, RECONNECT_MAX],
+        )
+
+    def test_lost_stream_reconnects_and_resyncs(self):
+        before = ([client("a", 1)], [monitor("DP-1")], {"address": "0xa"})
+        # a closed and d opened while the stream was down
+        after = ([client("c", 1), client("d", 2)], [monitor("DP-1")], None)
+        servers = []
+
+        async def serve(reader, writer):
+            writer.write(b"openwindow>>c,1,kitty,shell\n")
+            await writer.drain()
+            writer.close()
+            # hyprland is gone until the second retry
+            servers[0].close()
+
+        async def come_back(attempt):
+            if attempt == 2:
+                os.unlink(self.path)
+                servers.append(await asyncio.start_unix_server(hold, self.path))
+
+        async def hold(reader, writer):
+            handler.running = False
+            writer.close()
+
+        handler = StreamHandler(self.path, [before, after], come_back)
+        handler.running = True
+
+        async def run():
+            servers.append(await asyncio.start_unix_server(serve, self.path))
+            await handler.read_events()
+            for server in servers:
+                server.close()
+
+        asyncio.run(run())
+        self.assertEqual(handler.delays, [0.05, 0.1])
+        self.assertEqual(
+            drain(handler.msg_queue),
+            [
+                ("openwindow", "c,1,kitty,shell", False),
+                ("closewindow", "a", True),
+                ("openwindow", "d,2,kitty,shell", True),
+            ],
+        )
+        self.assertEqual(handler.state.windows, {"c": 1, "d": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
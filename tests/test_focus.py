@@ -0,0 +1,109 @@
+import asyncio
+import unittest
+
+from hyprplane.commander import ToggleCommand
+from hyprplane.controller.focus import FocusHistory, FocusRing
+from hyprplane.controller.handles import WindowRecord
+from hyprplane.event import HyprEvent
+
+
+def feed(history, *lines):
+    for line in lines:
+        history.track_event(HyprEvent.parse(line, 0.0))
+
+
+class TestFocusRing(unittest.TestCase):
+    def test_push_dedups_and_drops_the_oldest(self):
+        ring = FocusRing(capacity=3)
+        for address in ("a", "b", "c", "a", "d"):
+            ring.push(address)
+        self.assertEqual(list(ring), ["d", "a", "c"])
+        self.assertEqual(ring.nth(1), "a")
+        self.assertIsNone(ring.nth(3))
+
+
+class TestFocusHistory(unittest.TestCase):
+    def setUp(self):
+        self.history = FocusHistory()
+        feed(
+            self.history,
+            "openwindow>>a,1,kitty,shell",
+            "openwindow>>b,1,firefox,docs",
+            "openwindow>>c,2,kitty,logs",
+            "activewindow>>kitty,shell",
+            "activewindowv2>>a",
+            "activewindowv2>>b",
+            "activewindowv2>>c",
+        )
+
+    def test_rings_follow_activewindowv2(self):
+        self.assertEqual(self.history.active(), "0xc")
+        self.assertEqual(self.history.nth(1), "0xb")
+        self.assertEqual(self.history.nth(0, workspace="1"), "0xb")
+        self.assertEqual(self.history.most_recent_of("kitty"), "0xc")
+        self.assertEqual(self.history.most_recent_of("kitty", skip=1), "0xa")
+        self.assertEqual(self.history.most_recent_of("kitty", workspace="1"), "0xa")
+
+    def test_move_close_and_destroy_prune_the_rings(self):
+        feed(self.history, "movewindowv2>>a,2,2")
+        self.assertEqual(self.history.nth(0, workspace="2"), "0xa")
+        self.assertEqual(self.history.nth(1, workspace="1"), None)
+
+        feed(self.history, "closewindow>>c", "destroyworkspacev2>>1,1")
+        self.assertIsNone(self.history.window_class("0xc"))
+        self.assertEqual(self.history.active(), "0xb")
+        self.assertNotIn("1", self.history.workspaces)
+
+    def test_seed_uses_hyprland_focus_order(self):
+        history = FocusHistory()
+        history.seed(
+            [
+                WindowRecord("0xa", 1, "kitty", focus_history=2, workspace_name="1"),
+                WindowRecord("0xb", 1, "kitty", focus_history=0, workspace_name="1"),
+                WindowRecord("0xc", 2, "mpv", focus_history=1, workspace_name="2"),
+                WindowRecord("0xd", 2, "mpv", workspace_name="2"),
+            ]
+        )
+        self.assertEqual(list(history.recent), ["0xb", "0xc", "0xa"])
+        self.assertEqual(list(history.workspaces["1"]), ["0xb", "0xa"])
+        # never focused, still found by class
+        self.assertEqual(history.most_recent_of("mpv", skip=1), "0xd")
+
+
+class QuerylessController:
+    def __init__(self):
+        self.focused = []
+
+    async def getWindowAddress(self, className):
+        raise AssertionError("toggle queried hyprland")
+
+    async def get_active_window(self):
+        raise AssertionError("toggle queried hyprland")
+
+    async def focus_window(self, address):
+        self.focused.append(address)
+
+
+class TestToggle(unittest.TestCase):
+    def test_toggle_needs_no_queries(self):
+        history = FocusHistory()
+        feed(
+            history,
+            "openwindow>>a,1,kitty,shell",
+            "openwindow>>b,1,firefox,docs",
+            "activewindowv2>>a",
+        )
+        controller = QuerylessController()
+
+        async def toggle():
+            await ToggleCommand().execute(controller, history, ["firefox"])
+
+        asyncio.run(toggle())
+        asyncio.run(toggle())
+        asyncio.run(toggle())
+        self.assertEqual(controller.focused, ["0xb", "0xa", "0xb"])
+        self.assertEqual(history.active(), "0xb")
+
+
+if __name__ == "__main__":
+    unittest.main()
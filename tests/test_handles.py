@@ -0,0 +1,71 @@
+import unittest
+
+from hyprplane.controller.handles import WindowRecord, WindowRegistry
+from hyprplane.utils import approx_size
+
+
+def client(address):
+    return {
+        "address": address,
+        "mapped": True,
+        "hidden": False,
+        "at": [120, 80],
+        "size": [1280, 720],
+        "workspace": {"id": 2, "name": "2"},
+        "floating": True,
+        "monitor": 0,
+        "class": "kitty",
+        "title": "shell",
+        "initialClass": "kitty",
+        "initialTitle": "kitty",
+        "pid": 4242,
+        "xwayland": False,
+        "pinned": False,
+        "fullscreen": 0,
+        "grouped": [],
+        "tags": [],
+        "swallowing": "0x0",
+        "focusHistoryID": 3,
+    }
+
+
+class TestWindowRegistry(unittest.TestCase):
+    def test_handles_are_stable_and_never_reused(self):
+        registry = WindowRegistry()
+        first = registry.intern("0xa")
+        self.assertEqual(registry.intern("0xa"), first)
+        registry.release("0xa")
+        self.assertNotIn("0xa", registry)
+        self.assertIsNone(registry.get("0xa"))
+        self.assertNotEqual(registry.intern("0xb"), first)
+        self.assertNotEqual(registry.intern("0xa"), first)
+
+    def test_handles_map_back_to_their_address(self):
+        registry = WindowRegistry()
+        handle = registry.intern("0xa")
+        self.assertEqual(registry.address(handle), "0xa")
+        registry.release("0xa")
+        self.assertIsNone(registry.address(handle))
+
+
+class TestWindowRecord(unittest.TestCase):
+    def test_round_trips_through_a_client_dict(self):
+        record = WindowRecord.from_client(client("0x55d0"))
+        self.assertEqual(
+            (record.x, record.y, record.w, record.h), (120, 80, 1280, 720)
+        )
+        self.assertEqual(record.workspace, 2)
+        self.assertEqual(WindowRecord.from_client(record.as_client()), record)
+
+    def test_record_is_smaller_than_the_client_it_replaces(self):
+        clients = [client(f"0x{i:x}") for i in range(100)]
+        records = [WindowRecord.from_client(c) for c in clients]
+        # the address strings are shared either way
+        shared = {id(c["address"]) for c in clients}
+        self.assertLess(
+            approx_size(records, set(shared)), approx_size(clients, set(shared)) / 3
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from hyprplane.handoff import (
+    bindControlSocket,
+    drainRequests,
+    requestHandoff,
+    serveHandoff,
+)
+
+
+def replyWith(name, tasks, delay=0.0):
+    async def control(reader, writer):
+        task = asyncio.current_task()
+        tasks.add(task)
+        try:
+            await reader.read(64)
+            await asyncio.sleep(delay)
+            writer.write(name)
+            await writer.drain()
+            writer.close()
+        finally:
+            tasks.discard(task)
+
+    return control
+
+
+class TestHandoff(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.socketPath = os.path.join(self.tmp.name, "control.sock")
+        self.handoffPath = os.path.join(self.tmp.name, "control.sock.handoff")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    async def send(self, msg=b"ping"):
+        reader, writer = await asyncio.open_unix_connection(self.socketPath)
+        writer.write(msg)
+        await writer.drain()
+        reply = await reader.read(64)
+        writer.close()
+        return reply
+
+    def test_no_daemon_to_take_over_from(self):
+        self.assertIsNone(requestHandoff(self.handoffPath, timeout=0.1))
+
+    def test_restart_drops_no_commands(self):
+        async def run():
+            oldTasks, newTasks = set(), set()
+            listenSock = bindControlSocket(self.socketPath)
+            old = await asyncio.start_unix_server(
+                replyWith(b"old", oldTasks, delay=0.05), sock=listenSock
+            )
+
+            async def prepare():
+                old.close()
+                await drainRequests(oldTasks)
+                return {"pins": None, "stages": {"1": {"groups": [["0x1"]]}}}
+
+            async def resume(sock):
+                self.fail("handoff should succeed")
+
+            oldDaemon = asyncio.create_task(
+                serveHandoff(listenSock, prepare, resume, self.handoffPath)
+            )
+            await asyncio.sleep(0.01)
+
+            replies, failures = [], 0
+            done = asyncio.Event()
+
+            async def hammer():
+                nonlocal failures
+                while not done.is_set():
+                    try:
+                        replies.append(await self.send())
+                    except OSError:
+                        failures += 1
+
+            clients = [asyncio.create_task(hammer()) for _ in range(4)]
+            await asyncio.sleep(0.1)
+
+            handoff = await asyncio.to_thread(
+                requestHandoff, self.handoffPath, 1.0
+            )
+            self.assertIsNotNone(handoff)
+            new = await asyncio.start_unix_server(
+                replyWith(b"new", newTasks), sock=handoff.sock
+            )
+            handoff.ack()
+            await asyncio.wait_for(oldDaemon, 1.0)
+
+            await asyncio.sleep(0.1)
+            done.set()
+            await asyncio.gather(*clients)
+            new.close()
+            return handoff.snapshot, replies, failures
+
+        snapshot, replies, failures = asyncio.run(run())
+        self.assertEqual(failures, 0)
+        self.assertIn(b"old", replies)
+        self.assertEqual(replies[-1], b"new")
+        # every command accepted by the old daemon was answered before it left
+        self.assertNotIn(b"", replies)
+        self.assertEqual(snapshot["stages"], {"1": {"groups": [["0x1"]]}})
+
+
+if __name__ == "__main__":
+    unittest.main()
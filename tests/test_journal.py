@@ -0,0 +1,238 @@
+import asyncio
+import json
+import os
+import re
+import tempfile
+import time
+import threading
+import unittest
+from importlib.util import find_spec
+from unittest import mock
+
+from hyprplane import utils
+from hyprplane.controller.handles import WindowRecord
+from hyprplane.controller.stage_manager import LayoutMode, StageController
+from hyprplane.controller.window import WindowController
+from hyprplane.journal import StateJournal, getJournal, reconcile, setJournal
+from hyprplane.metrics import metrics
+
+# restoring through the daemon needs its logger and the clients cache
+HAS_DAEMON_DEPS = all(
+    find_spec(name) for name in ("structlog", "rich", "cachetools")
+)
+
+
+def pins(*addresses):
+    return {
+        "classLookup": {f"class{a}": a for a in addresses},
+        "currentGroup": "lock1",
+        "orders": list(addresses),
+        "groupStates": {"lock1": {"index": len(addresses) - 1}},
+        "groups": {"lock1": list(addresses)},
+        "groupOrders": ["lock1"],
+        "_gcount": 0,
+        "_count": 0,
+    }
+
+
+def stage(workspace, *groups):
+    groups = [list(group) for group in groups]
+    return {"type": "stage", "workspace": workspace, "groups": groups}
+
+
+class TestStateJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "state.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def journal(self, **kwargs):
+        journal = StateJournal(self.path, **kwargs)
+        journal.load()
+        journal.open()
+        return journal
+
+    def test_replay_yields_latest_state(self):
+        journal = self.journal()
+        journal.append({"type": "pins", "table": pins("0x1")}, key="pins")
+        journal.append(stage(1, ["0x1", "0x2"]), key="stage:1")
+        journal.append(stage(2, ["0x3"]), key="stage:2")
+        journal.append({"type": "unstage", "workspace": 2}, key="stage:2")
+        journal.close()
+
+        state = StateJournal(self.path).load()
+        self.assertEqual(state["pins"], pins("0x1"))
+        self.assertEqual(state["stages"], {"1": {"groups": [["0x1", "0x2"]]}})
+
+    def test_unchanged_records_are_not_rewritten(self):
+        journal = self.journal()
+        for _ in range(3):
+            journal.append(stage(1, ["0x1"]), key="stage:1")
+        journal.close()
+        with open(self.path) as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+    def test_torn_last_line_is_ignored(self):
+        journal = self.journal()
+        journal.append(stage(1, ["0x1"]))
+        journal.close()
+        with open(self.path, "a") as f:
+            f.write('{"type":"stage","workspace":1,"gro')
+
+        state = StateJournal(self.path).load()
+        self.assertEqual(state["stages"], {"1": {"groups": [["0x1"]]}})
+
+    def test_appends_never_fsync_inline(self):
+        journal = self.journal(fsyncInterval=0, compactEvery=10)
+        caller = threading.get_ident()
+        synced_in = []
+        with mock.patch(
+            "hyprplane.journal.os.fsync",
+            side_effect=lambda fd: synced_in.append(threading.get_ident()),
+        ):
+            for i in range(25):
+                journal.append(stage(i % 3, [f"0x{i}"]))
+            deadline = time.monotonic() + 2
+            while not synced_in and time.monotonic() < deadline:
+                time.sleep(0.01)
+        journal.close()
+        self.assertTrue(synced_in)
+        self.assertNotIn(caller, synced_in)
+
+    def test_compaction_keeps_one_snapshot(self):
+        journal = self.journal(fsyncInterval=60, compactEvery=10)
+        for i in range(25):
+            journal.append(stage(i % 3, [f"0x{i}"]))
+        # what the timer thread runs once fsyncInterval passed
+        journal.flushPending()
+        journal.append(stage(3, ["0x99"]))
+        journal.close()
+
+        with open(self.path) as f:
+            lines = f.readlines()
+        self.assertLess(len(lines), 10)
+        self.assertEqual(json.loads(lines[0])["type"], "snapshot")
+        state = StateJournal(self.path).load()
+        self.assertEqual(state["stages"]["0"], {"groups": [["0x24"]]})
+
+    def test_reconcile_drops_dead_windows(self):
+        state = {
+            "pins": pins("0x1", "0x2"),
+            "stages": {
+                "1": {"groups": [["0x1", "0x2"], ["0x3"]]},
+                "2": {"groups": [["0x4"]]},
+            },
+        }
+        live = reconcile(state, ["0x1", "0x3"])
+        self.assertEqual(live["pins"]["groups"]["lock1"], ["0x1"])
+        self.assertEqual(live["pins"]["classLookup"], {"class0x1": "0x1"})
+        self.assertEqual(live["pins"]["groupStates"]["lock1"]["index"], 0)
+        self.assertEqual(live["stages"], {"1": {"groups": [["0x1"], ["0x3"]]}})
+        # the replayed state itself is left alone
+        self.assertEqual(state["pins"]["orders"], ["0x1", "0x2"])
+
+
+class FakeHyprland:
+    """Answers the queries of a restart from a fixed set of windows on one
+    monitor and keeps the dispatch batches instead of sending them."""
+
+    def __init__(self, clients, workspaces) -> None:
+        self.clients = clients
+        self.monitors = [
+            {
+                "name": "DP-1",
+                "width": 1920,
+                "height": 1080,
+                "x": 0,
+                "y": 0,
+                "scale": 1,
+                "activeWorkspace": {"id": 1},
+            }
+        ]
+        self.workspaces = [{"id": w, "monitor": "DP-1"} for w in workspaces]
+        self.batches = []
+
+    async def request(self, command, getOutput=False):
+        if command == "clients":
+            return list(self.clients)
+        if command == "monitors":
+            return self.monitors
+        if command == "workspaces":
+            return self.workspaces
+        if command.startswith("dispatch"):
+            self.batches.append([command])
+        return None
+
+    async def batch(self, commands):
+        if commands:
+            self.batches.append(list(commands))
+
+
+@unittest.skipUnless(HAS_DAEMON_DEPS, "structlog/rich/cachetools not installed")
+class TestRestart(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "state.jsonl")
+        # the daemon log file is created in the working directory
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        setJournal(None)
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_restart_with_100_windows(self):
+        from hyprplane import server
+
+        addresses = [f"0x{i:x}" for i in range(100)]
+        journal = StateJournal(self.path)
+        journal.open()
+        journal.append({"type": "pins", "table": pins(*addresses[:20])}, key="pins")
+        for step in range(400):
+            workspace = step % 10
+            windows = addresses[workspace * 10 : workspace * 10 + 10]
+            journal.append(
+                stage(workspace + 1, windows[: step % 10 + 1], windows[-1:])
+            )
+        journal.close()
+
+        # workspace 10 was closed while the daemon was down
+        clients = [
+            WindowRecord(address, i // 10 + 1, x=i, y=i, w=100, h=100)
+            for i, address in enumerate(addresses[:90])
+        ]
+        hyprland = FakeHyprland(clients, range(1, 10))
+        controller = WindowController()
+        stages = StageController(controller)
+        setJournal(StateJournal(self.path))
+        metrics.reset()
+        with mock.patch.object(
+            utils, "_hyprctl_request", hyprland.request
+        ), mock.patch.object(utils, "hyprctl_batch", hyprland.batch):
+            asyncio.run(server.restoreState(controller, stages))
+        getJournal().close()
+
+        self.assertEqual(controller.pins.get("lock1").windows, addresses[:20])
+        self.assertEqual(set(stages.window_groups), set(range(1, 10)))
+        for workspace in range(1, 10):
+            self.assertEqual(stages.current_mode[workspace], LayoutMode.STAGE_MANAGER)
+            restored = [w.address for g in stages.window_groups[workspace] for w in g]
+            windows = addresses[(workspace - 1) * 10 : workspace * 10]
+            self.assertEqual(sorted(restored), sorted(windows))
+            # the journaled groups come first, the rest joins the last group
+            journaled = windows[:workspace] + windows[-1:]
+            self.assertEqual(restored[: len(journaled)], journaled)
+
+        # every live window was laid out or parked, in one batch
+        self.assertEqual(len(hyprland.batches), 1)
+        dispatches = ";".join(hyprland.batches[0])
+        dispatched = set(re.findall(r"address:(0x[0-9a-f]+)", dispatches))
+        self.assertEqual(dispatched, set(addresses[:90]))
+        self.assertEqual(metrics.snapshot()["startup.restore"]["count"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,229 @@
+import unittest
+
+from hyprplane.controller import layout_core
+from hyprplane.controller.handles import WindowRecord, window_handles
+from hyprplane.controller.layout_core import (
+    SlotAllocator,
+    WindowTable,
+    float_slots,
+    layout_plan,
+    note_monitors,
+    plan_cache_stats,
+    stage_geometry,
+    stage_slots,
+)
+
+SCREEN = (1920, 1080, 0, 0, "DP-1")
+# second monitor below the first one
+LOWER_SCREEN = (1920, 1080, 0, 1080, "DP-2")
+
+
+def tolist(values):
+    return values if isinstance(values, list) else values.tolist()
+
+
+def client(address, x, y, w, h, floating=True):
+    return WindowRecord(address, x=x, y=y, w=w, h=h, floating=floating, monitor=0)
+
+
+class LayoutCoreTests:
+    def test_slots_fill_columns(self):
+        g = stage_geometry(SCREEN)
+        xs, ys = stage_slots(g, g.per_col + 1)
+        xs, ys = tolist(xs), tolist(ys)
+        self.assertEqual(xs[: g.per_col], [0] * g.per_col)
+        self.assertEqual(ys[: g.per_col], [i * g.step_y for i in range(g.per_col)])
+        self.assertEqual((xs[-1], ys[-1]), (1 % g.page_cols * g.step_x, 0))
+
+    def test_pages_reuse_the_visible_columns(self):
+        g = stage_geometry(SCREEN)
+        page = g.per_col * g.page_cols
+        xs, ys = stage_slots(g, 2 * page)
+        self.assertEqual(tolist(xs)[page:], tolist(xs)[:page])
+        self.assertEqual(tolist(ys)[page:], tolist(ys)[:page])
+
+    def test_offset_monitor_keeps_slot_count(self):
+        self.assertEqual(
+            stage_geometry(SCREEN).per_col, stage_geometry(LOWER_SCREEN).per_col
+        )
+
+    def test_plan_skips_windows_in_place(self):
+        g = stage_geometry(SCREEN)
+        table = WindowTable.from_clients(
+            [
+                client("0xa", 0, 0, g.mini_w, g.mini_h),
+                client("0xb", 5, 5, 10, 10),
+                client("0xc", 0, 2 * g.step_y, g.mini_w, g.mini_h, floating=False),
+            ]
+        )
+        xs, ys = stage_slots(g, 3)
+        plan = table.plan_moves(xs, ys, g.mini_w, g.mini_h)
+        self.assertEqual(
+            plan,
+            [
+                ("0xb", 0, g.step_y, g.mini_w, g.mini_h),
+                ("0xc", 0, 2 * g.step_y, g.mini_w, g.mini_h),
+            ],
+        )
+
+    def test_plan_addresses_moves_through_the_handles(self):
+        table = WindowTable.from_clients(
+            [client("0x55d0a", 5, 5, 10, 10), client("0x55d0b", 5, 5, 10, 10)]
+        )
+        window_handles.release("0x55d0b")
+        self.assertEqual(
+            table.plan_moves(0, 0, 10, 10), [("0x55d0a", 0, 0, 10, 10)]
+        )
+
+    def test_float_slots_are_reproducible(self):
+        for count in (1, 2, 3, 4, 5, 40):
+            slots = float_slots(SCREEN, count, seed=7)
+            self.assertEqual(len(slots), count)
+            self.assertEqual(slots, float_slots(SCREEN, count, seed=7))
+
+
+class TestLayoutCoreFallback(LayoutCoreTests, unittest.TestCase):
+    def setUp(self):
+        self.saved = layout_core._numpy
+        layout_core._numpy = False
+
+    def tearDown(self):
+        layout_core._numpy = self.saved
+
+
+@unittest.skipIf(layout_core.get_numpy() is None, "numpy is not installed")
+class TestLayoutCoreNumpy(LayoutCoreTests, unittest.TestCase):
+    pass
+
+
+def monitor(width=1920, height=1080):
+    return {"name": "DP-1", "width": width, "height": height, "x": 0, "y": 0}
+
+
+class TestPlanCache(unittest.TestCase):
+    def setUp(self):
+        layout_plan.cache_clear()
+
+    def test_repeated_plans_hit_the_cache(self):
+        first = layout_plan("stage", SCREEN[:4], 6)
+        self.assertIs(layout_plan("stage", SCREEN[:4], 6), first)
+        self.assertEqual(len(first), 7)
+        self.assertEqual(
+            layout_plan("float", SCREEN[:4], 4, 1), tuple(float_slots(SCREEN, 4, 1))
+        )
+        stats = plan_cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+        self.assertAlmostEqual(stats["hit_rate"], 1 / 3)
+
+    def test_monitor_change_clears_plans(self):
+        note_monitors([monitor()])
+        layout_plan("stage", SCREEN[:4], 3)
+        note_monitors([monitor()])
+        self.assertEqual(plan_cache_stats()["size"], 1)
+        note_monitors([monitor(2560, 1440)])
+        self.assertEqual(plan_cache_stats()["size"], 0)
+
+
+class TestSlotAllocator(unittest.TestCase):
+    def setUp(self):
+        self.g = stage_geometry(SCREEN)
+        self.slots = SlotAllocator(self.g, "DP-1")
+        self.count = self.g.per_col + 2
+        for i in range(self.count):
+            self.slots.allocate(f"0x{i}")
+
+    def slot_of(self, address):
+        record = self.slots.record(address)
+        return (
+            (record.x - self.g.mini_x) // self.g.step_x,
+            (record.y - self.g.mini_y) // self.g.step_y,
+        )
+
+    def test_allocates_column_by_column(self):
+        self.assertEqual(self.slot_of("0x0"), (0, 0))
+        self.assertEqual(
+            self.slot_of(f"0x{self.g.per_col}"), (1 % self.g.page_cols, 0)
+        )
+        self.assertEqual(len(self.slots.positions), self.count)
+
+    def cell(self, address):
+        return self.slots.slots[window_handles.get(address)]
+
+    def test_compact_moves_only_windows_after_the_hole(self):
+        self.slots.free("0x1")
+        shown, entering, leaving = self.slots.compact()
+        self.assertEqual(self.cell("0x0"), (0, 0))
+        for i in range(2, self.count):
+            self.assertEqual(self.cell(f"0x{i}"), divmod(i - 1, self.g.per_col))
+        self.assertEqual(
+            [record.address for record in shown + entering],
+            [p.address for p in self.slots.positions[1:] if self.slots.visible(p)],
+        )
+        self.assertEqual(leaving, [])
+        self.assertNotIn("0x1", [p.address for p in self.slots.positions])
+
+    def test_freed_slot_is_reused_before_compacting(self):
+        self.slots.free("0x1")
+        self.slots.allocate("0xnew")
+        self.assertEqual(self.cell("0xnew"), (0, 1))
+        self.assertEqual(self.slots.compact(), ([], [], []))
+
+    def test_positions_are_shared_records(self):
+        positions = self.slots.positions
+        self.slots.free(f"0x{self.g.per_col}")
+        self.slots.compact()
+        self.assertIs(self.slots.positions, positions)
+        self.assertEqual(
+            self.slot_of(f"0x{self.g.per_col + 1}"), (1 % self.g.page_cols, 0)
+        )
+
+    def test_paging_touches_only_two_pages(self):
+        page_size = self.g.per_col * self.g.page_cols
+        for i in range(self.count, 3 * page_size):
+            self.slots.allocate(f"0x{i}")
+        self.assertEqual(self.slots.page_count, 3)
+        visible = [p for p in self.slots.positions if self.slots.visible(p)]
+        self.assertEqual(len(visible), page_size)
+
+        entering, leaving = self.slots.set_page(1)
+        self.assertEqual(len(entering), page_size)
+        self.assertEqual(leaving, visible)
+        self.assertEqual(self.slots.set_page(1), ([], []))
+        self.assertEqual(self.slots.set_page(9)[0][0].page, 2)
+
+    def test_compact_reports_only_visible_moves(self):
+        page_size = self.g.per_col * self.g.page_cols
+        for i in range(self.count, 2 * page_size):
+            self.slots.allocate(f"0x{i}")
+        self.slots.free(f"0x{page_size}")
+        self.assertEqual(self.slots.compact(), ([], [], []))
+        self.assertEqual(self.slots.record(f"0x{page_size + 1}").y, 0)
+
+    def test_parked_windows_fill_an_emptied_page(self):
+        page_size = self.g.per_col * self.g.page_cols
+        for i in range(self.count, 2 * page_size):
+            self.slots.allocate(f"0x{i}")
+        parked = self.slots.page_records(1)
+        for i in range(page_size):
+            self.slots.free(f"0x{i}")
+
+        self.assertEqual(self.slots.compact(), ([], parked, []))
+        self.assertEqual((self.slots.page, self.slots.page_count), (0, 1))
+        self.assertEqual(self.cell(f"0x{page_size}"), (0, 0))
+
+    def test_emptied_last_page_shows_the_one_before(self):
+        page_size = self.g.per_col * self.g.page_cols
+        for i in range(self.count, page_size + 1):
+            self.slots.allocate(f"0x{i}")
+        self.slots.set_page(1)
+        for record in self.slots.page_records(1):
+            self.slots.free(record.address)
+
+        shown, entering, leaving = self.slots.compact()
+        self.assertEqual(self.slots.page, 0)
+        self.assertEqual((shown, leaving), ([], []))
+        self.assertEqual(entering, self.slots.page_records(0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+from hyprplane.libnotify import Notification, NotificationService, NullBackend
+
+
+class TestNotificationService(unittest.TestCase):
+    def test_burst_is_coalesced_into_one_bubble(self):
+        backend = NullBackend()
+        service = NotificationService(backend, coalesceWindow=0.2)
+        for i in range(10):
+            service.post(Notification(f"Lock window {i}"))
+        service.stop()
+
+        # leading notification plus one trailing update of the same bubble
+        self.assertEqual(len(backend.sent), 2)
+        (firstId, first), (lastId, last) = backend.sent
+        self.assertEqual(firstId, lastId)
+        self.assertEqual(first.summary, "Lock window 0")
+        self.assertEqual(last.summary, "Lock window 9 (x9)")
+
+    def test_different_apps_get_their_own_bubble(self):
+        backend = NullBackend()
+        service = NotificationService(backend, coalesceWindow=0)
+        service.post(Notification("a", app_name="one"))
+        service.post(Notification("b", app_name="two"))
+        service.stop()
+
+        self.assertEqual(sorted(i for i, _ in backend.sent), [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
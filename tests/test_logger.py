@@ -0,0 +1,94 @@
+import logging
+import os
+import tempfile
+import time
+import unittest
+from importlib.util import find_spec
+from unittest import mock
+
+from hyprplane.logger import BatchingMemoryHandler, SystemLogger
+
+HAS_LOGGER_DEPS = all(find_spec(name) for name in ("structlog", "rich"))
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record.getMessage())
+
+
+def record(message, level=logging.DEBUG):
+    return logging.LogRecord("test", level, __file__, 0, message, None, None)
+
+
+class TestBatchingMemoryHandler(unittest.TestCase):
+    def setUp(self):
+        self.target = ListHandler()
+
+    def test_records_wait_for_capacity(self):
+        handler = BatchingMemoryHandler(3, target=self.target, flushInterval=60)
+        for i in range(2):
+            handler.handle(record(f"m{i}"))
+        self.assertEqual(self.target.records, [])
+        handler.handle(record("m2"))
+        self.assertEqual(self.target.records, ["m0", "m1", "m2"])
+        handler.close()
+
+    def test_errors_flush_right_away(self):
+        handler = BatchingMemoryHandler(64, target=self.target, flushInterval=60)
+        handler.handle(record("context"))
+        handler.handle(record("boom", logging.ERROR))
+        self.assertEqual(self.target.records, ["context", "boom"])
+        handler.close()
+
+    def test_idle_buffer_is_flushed_by_the_timer(self):
+        handler = BatchingMemoryHandler(64, target=self.target, flushInterval=0.05)
+        handler.handle(record("idle"))
+        deadline = time.monotonic() + 2
+        while not self.target.records and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.target.records, ["idle"])
+        handler.close()
+
+
+@unittest.skipUnless(HAS_LOGGER_DEPS, "structlog/rich not installed")
+class TestSystemLogger(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = logging.getLogger()
+        self.rootState = (root.level, list(root.handlers))
+
+    def tearDown(self):
+        self.logger.stopListener()
+        root = logging.getLogger()
+        root.setLevel(self.rootState[0])
+        root.handlers[:] = self.rootState[1]
+        self.tmp.cleanup()
+
+    def build(self, level):
+        with mock.patch.dict(os.environ, {"HYPRPLANE_LOG_LEVEL": level}):
+            self.logger = SystemLogger.getLogger("test", self.tmp.name)
+        return self.logger
+
+    def test_env_level_gates_stdlib_loggers(self):
+        self.build("info")
+        stdlib = logging.getLogger("hyprplane.controller.test")
+        self.assertFalse(stdlib.isEnabledFor(logging.DEBUG))
+        self.assertTrue(stdlib.isEnabledFor(logging.INFO))
+        self.assertFalse(self.logger.isEnabledFor("debug"))
+
+    def test_sample_keeps_one_call_in_n_per_site(self):
+        logger = self.build("debug")
+        kept = []
+        with mock.patch.object(logger.logger, "debug", side_effect=kept.append):
+            for i in range(10):
+                logger.debug(f"call {i}", sample=0.25)
+            logger.debug("other site", sample=0.25)
+        self.assertEqual(kept, ["call 0", "call 4", "call 8", "other site"])
+
+
+if __name__ == "__main__":
+    unittest.main()
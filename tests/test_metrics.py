@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+
+from hyprplane import utils
+from hyprplane.metrics import Histogram, Metrics, metrics, timed
+from hyprplane.utils import hyprctl_cmd, hyprctl_session
+
+
+class TestHistogram(unittest.TestCase):
+    def test_percentiles_use_bucket_bounds(self):
+        histogram = Histogram()
+        for elapsed in [0.8] * 90 + [40] * 9 + [7000]:
+            histogram.observe(elapsed)
+
+        summary = histogram.summary()
+        self.assertEqual(summary["count"], 100)
+        self.assertEqual(summary["p50"], 1)
+        self.assertEqual(summary["p90"], 1)
+        self.assertEqual(summary["p99"], 50)
+        self.assertEqual(summary["max"], 7000)
+
+    def test_error_rate_and_reset(self):
+        registry = Metrics()
+        registry.observe("command.lockpin", 3)
+        registry.observe("command.lockpin", 5, error=True)
+        self.assertEqual(registry.snapshot()["command.lockpin"]["error_rate"], 0.5)
+
+        registry.reset()
+        self.assertEqual(registry.snapshot(), {})
+
+
+class TestTimed(unittest.TestCase):
+    def test_async_functions_are_timed_until_completion(self):
+        @timed("test.sleep")
+        async def sleep():
+            await asyncio.sleep(0.02)
+
+        metrics.reset()
+        asyncio.run(sleep())
+        self.assertGreaterEqual(metrics.snapshot()["test.sleep"]["max"], 20)
+
+
+class TestBatchMetrics(unittest.TestCase):
+    def setUp(self):
+        self.connect = utils.getHyprCtlHandle
+
+        async def refused():
+            raise ConnectionRefusedError("no hyprland")
+
+        utils.getHyprCtlHandle = refused
+
+    def tearDown(self):
+        utils.getHyprCtlHandle = self.connect
+
+    def test_refused_socket_is_a_failed_batch(self):
+        async def run():
+            async with hyprctl_session():
+                await hyprctl_cmd("dispatch focuswindow address:0x1")
+                await hyprctl_cmd("dispatch focuswindow address:0x2")
+                raise KeyError("inside the session")
+
+        metrics.reset()
+        # the error of the block is not replaced by the one of the flush
+        with self.assertRaises(KeyError):
+            asyncio.run(run())
+        self.assertEqual(metrics.snapshot()["hyprctl.batch"]["error_rate"], 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
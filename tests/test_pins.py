@@ -0,0 +1,113 @@
+import asyncio
+import unittest
+
+from hyprplane.controller.pins import PinGroupStore
+from hyprplane.controller.window import WindowController
+from hyprplane.journal import reconcile
+from hyprplane.libnotify import (
+    NotificationService,
+    NullBackend,
+    getNotificationService,
+    setNotificationService,
+)
+
+
+def setUpModule():
+    # keep the notifications of controller calls off the session bus
+    setNotificationService(NotificationService(NullBackend()))
+
+
+def tearDownModule():
+    getNotificationService().stop()
+    setNotificationService(None)
+
+
+def store(*groups):
+    pins = PinGroupStore()
+    for name, addresses in groups:
+        pins.create(name)
+        for address in addresses:
+            pins.add(name, address)
+    return pins
+
+
+class TestPinGroupStore(unittest.TestCase):
+    def test_controllers_do_not_share_pins(self):
+        first, second = WindowController(), WindowController()
+        first.createGroup("work")
+        self.assertNotIn("work", second.pins)
+
+    def test_groups_cycle_in_creation_order(self):
+        pins = store(("a", []), ("b", []), ("c", []))
+        self.assertEqual(pins.current, "c")
+        self.assertEqual([pins.next_group() for _ in range(3)], ["a", "b", "c"])
+
+        pins.delete("b")
+        self.assertEqual(pins.order_index, {"a": 0, "c": 1})
+        self.assertEqual(pins.next_group(), "a")
+
+    def test_step_wraps_and_starts_at_the_focused_window(self):
+        pins = store(("work", ["0x1", "0x2", "0x3"]))
+        self.assertEqual([pins.step() for _ in range(4)], ["0x2", "0x3", "0x1", "0x2"])
+        self.assertEqual(pins.step(-1, current="0x1"), "0x3")
+        # a focused window outside the group steps from the cursor
+        self.assertEqual(pins.step(1, current="0xff"), "0x1")
+
+        single = store(("solo", ["0x1"]))
+        self.assertIsNone(single.step(1, current="0x1"))
+
+    def test_closed_windows_are_pruned_from_every_group(self):
+        pins = store(("a", ["0x1", "0x2"]), ("b", ["0x2", "0x3"]))
+        pins.class_lookup["kitty"] = "0x2"
+        pins.prune("0x2")
+        self.assertEqual(pins.get("a").windows, ["0x1"])
+        self.assertEqual(pins.get("b").windows, ["0x3"])
+        self.assertEqual(pins.get("b").positions, {"0x3": 0})
+        self.assertEqual(pins.class_lookup, {})
+        self.assertNotIn("0x2", pins.memberships)
+
+    def test_table_round_trip_and_reconcile(self):
+        pins = store(("a", ["0x1", "0x2"]), ("b", ["0x3"]))
+        pins.switch("a")
+        pins.step()
+        table = pins.to_table()
+
+        restored = PinGroupStore()
+        restored.load(reconcile({"pins": table, "stages": {}}, ["0x1", "0x2"])["pins"])
+        self.assertEqual(restored.order, ["a", "b"])
+        self.assertEqual(restored.current, "a")
+        self.assertEqual(restored.get("a").cursor, 1)
+        self.assertEqual(len(restored.get("b")), 0)
+        self.assertEqual(restored.memberships, {"0x1": {"a"}, "0x2": {"a"}})
+
+
+class TestToggleWithinGroup(unittest.TestCase):
+    def test_toggle_is_only_focus_dispatches(self):
+        sent = []
+
+        async def execute(command, getOutput=False):
+            sent.append(command)
+
+        controller = WindowController(execute)
+        controller.createGroup("work")
+        for address in ("0x1", "0x2", "0x3"):
+            controller.addWindowToGroup("work", address)
+
+        async def run():
+            await controller.toggleWithinGroup("forward", "0x2")
+            await controller.toggleWithinGroup("backward")
+
+        asyncio.run(run())
+        self.assertEqual(
+            sent,
+            [
+                "dispatch focuswindow address:0x3",
+                "dispatch bringactivetotop",
+                "dispatch focuswindow address:0x2",
+                "dispatch bringactivetotop",
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from hyprplane.controller.handles import WindowRecord
+from hyprplane.controller.spatial import SpatialIndex
+
+
+def client(address, x, y, w, h, workspace=1):
+    return WindowRecord(address, workspace, x=x, y=y, w=w, h=h)
+
+
+class TestSpatialIndex(unittest.TestCase):
+    def setUp(self):
+        # a | b      c sits far to the right of b, d below a
+        # d
+        self.index = SpatialIndex()
+        self.index.rebuild(
+            [
+                client("a", 0, 0, 100, 100),
+                client("b", 110, 0, 100, 100),
+                client("c", 600, 20, 100, 100),
+                client("d", 0, 110, 100, 100),
+                client("e", 110, 0, 100, 100, workspace=2),
+            ]
+        )
+
+    def test_nearest_in_each_direction(self):
+        self.assertEqual(self.index.nearest("a", "right"), "b")
+        self.assertEqual(self.index.nearest("b", "right"), "c")
+        self.assertEqual(self.index.nearest("b", "left"), "a")
+        self.assertEqual(self.index.nearest("a", "down"), "d")
+        self.assertEqual(self.index.nearest("d", "up"), "a")
+        self.assertIsNone(self.index.nearest("a", "left"))
+
+    def test_neighbors_respect_gap(self):
+        neighbors = self.index.neighbors(1, 50)
+        self.assertEqual(neighbors["a"]["right"], "b")
+        self.assertIsNone(neighbors["b"]["right"])
+        self.assertEqual(neighbors["a"]["bottom"], "d")
+        self.assertNotIn("e", neighbors)
+
+    def test_incremental_updates(self):
+        self.index.update("c", 220, 0, 100, 100)
+        self.assertEqual(self.index.neighbors(1, 50)["b"]["right"], "c")
+
+        self.assertEqual(self.index.remove("b"), 1)
+        self.assertEqual(self.index.nearest("a", "right"), "c")
+
+        self.index.assign("f", 1)
+        self.index.update("f", 0, 220, 100, 100)
+        self.assertEqual(self.index.nearest("d", "down"), "f")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,249 @@
+import asyncio
+import unittest
+
+from hyprplane.controller import stage_manager
+from hyprplane.controller.handles import WindowRecord
+from hyprplane.controller.layout_core import SlotAllocator, stage_geometry
+from hyprplane.controller.stage_manager import (
+    GROUP_SIZE,
+    LayoutMode,
+    StageController,
+    WindowGroup,
+)
+from hyprplane.controller.window import WindowController
+from hyprplane.event import HyprEvent
+
+
+def window(i):
+    return WindowRecord(f"0x{i}")
+
+
+class TestWindowGroup(unittest.TestCase):
+    def test_rotate_brings_next_window_to_main(self):
+        group = WindowGroup(window(1), [window(2), window(3)])
+        group.rotate()
+        self.assertEqual(group.main_window.address, "0x2")
+        self.assertEqual([w.address for w in group.side_windows], ["0x3", "0x1"])
+
+    def test_remove_main_promotes_next(self):
+        group = WindowGroup(window(1), [window(2)])
+        self.assertEqual(group.remove("0x1").address, "0x1")
+        self.assertIsNone(group.remove("0x1"))
+        self.assertEqual(group.main_window.address, "0x2")
+        self.assertEqual(len(group), 1)
+
+
+class TestStageGroups(unittest.TestCase):
+    def setUp(self):
+        self.stage = StageController(WindowController())
+
+    def test_add_fills_last_group_then_opens_a_new_one(self):
+        for i in range(GROUP_SIZE + 1):
+            self.stage.add_to_groups(1, window(i))
+        groups = self.stage.window_groups[1]
+        self.assertEqual([len(group) for group in groups], [GROUP_SIZE, 1])
+        self.assertEqual(self.stage.stage_workspace_of(f"0x{GROUP_SIZE}"), 1)
+
+    def test_remove_drops_empty_groups(self):
+        self.stage.window_groups[1] = [
+            WindowGroup(window(1), []),
+            WindowGroup(window(2), [window(3)]),
+        ]
+        self.stage.active_group_index = 1
+        self.assertEqual(self.stage.remove_from_groups(1, "0x1"), 0)
+        self.assertEqual(len(self.stage.window_groups[1]), 1)
+        self.assertEqual(self.stage.active_group_index, 0)
+        self.assertIsNone(self.stage.remove_from_groups(1, "0x9"))
+
+
+class RecordingStage(StageController):
+    def __init__(self):
+        super().__init__(WindowController())
+        self.relayouts = []
+
+    async def relayout_all(self, workspaces=None):
+        self.relayouts.append(None if workspaces is None else set(workspaces))
+
+
+class TestMonitorRelayout(unittest.TestCase):
+    def setUp(self):
+        self.settle = stage_manager.MONITOR_SETTLE_TIME
+        stage_manager.MONITOR_SETTLE_TIME = 0.01
+
+    def tearDown(self):
+        stage_manager.MONITOR_SETTLE_TIME = self.settle
+
+    def run_events(self, *events):
+        stage = RecordingStage()
+
+        async def burst():
+            for name, data in events:
+                stage.handle_monitor_event(HyprEvent(name, data, 0.0))
+            await stage.relayout_task
+
+        asyncio.run(burst())
+        return stage.relayouts
+
+    def test_workspace_moves_merge_into_one_relayout(self):
+        relayouts = self.run_events(
+            ("moveworkspacev2", "1,1,DP-2"), ("moveworkspacev2", "3,3,DP-2")
+        )
+        self.assertEqual(relayouts, [{1, 3}])
+
+    def test_monitor_change_relayouts_everything(self):
+        relayouts = self.run_events(
+            ("moveworkspacev2", "1,1,DP-2"),
+            ("monitoraddedv2", "1,DP-2,desc"),
+            ("configreloaded", ""),
+        )
+        self.assertEqual(relayouts, [None])
+
+
+class TestWindowMove(unittest.TestCase):
+    def setUp(self):
+        self.stage = RecordingStage()
+        self.allocator = SlotAllocator(stage_geometry((1920, 1080, 0, 0)), "DP-1")
+        self.allocator.allocate("0xabc")
+        self.stage.slot_allocators[1] = self.allocator
+        self.stage.add_to_groups(1, window("abc"))
+
+    def move(self, data):
+        asyncio.run(self.stage.handle_window_move(HyprEvent("movewindowv2", data, 0.0)))
+
+    def test_parking_is_not_a_move(self):
+        self.move("abc,-98,special:hyprplane-stage-1")
+        self.move("abc,1,1")
+        self.assertIn("0xabc", self.allocator)
+
+    def test_moving_off_a_stage_frees_its_slot(self):
+        self.move("abc,2,2")
+        self.assertNotIn("0xabc", self.allocator)
+        self.assertIsNone(self.stage.stage_workspace_of("0xabc"))
+
+
+class ParkingStage(RecordingStage):
+    """Records the windows parked and unparked instead of dispatching."""
+
+    def __init__(self):
+        super().__init__()
+        self.parked, self.unparked = [], []
+
+    async def park_windows(self, workspace, records):
+        self.parked.extend(record.address for record in records)
+
+    async def unpark_windows(self, workspace, records, move=True):
+        self.unparked.extend(record.address for record in records)
+
+    async def apply_plan(self, plan):
+        pass
+
+
+class TestClosingVisibleWindows(unittest.TestCase):
+    def test_parked_windows_come_onto_the_emptied_page(self):
+        stage = ParkingStage()
+        allocator = SlotAllocator(stage_geometry((1920, 1080, 0, 0)), "DP-1")
+        # three minis per column and one column per page at 1920x1080
+        geometry = allocator.geometry
+        self.assertEqual((geometry.per_col, geometry.page_cols), (3, 1))
+        stage.slot_allocators[1] = allocator
+        stage.add_to_groups(1, window(0))
+        for i in range(1, 7):
+            stage.add_to_groups(1, window(i))
+            allocator.allocate(f"0x{i}")
+
+        async def close(*windows):
+            for i in windows:
+                await stage.handle_window_change("closewindow", str(i))
+
+        asyncio.run(close(1, 2, 3))
+        self.assertEqual(stage.unparked, ["0x4", "0x5", "0x6"])
+        self.assertEqual(stage.parked, [])
+        self.assertEqual((allocator.page, allocator.page_count), (0, 1))
+        self.assertTrue(all(allocator.visible(p) for p in allocator.positions))
+
+
+class TestEviction(unittest.TestCase):
+    def setUp(self):
+        self.stage = RecordingStage()
+        self.pins = self.stage.window_control.pins
+
+    def test_destroyed_workspace_leaves_nothing_behind(self):
+        stage = self.stage
+        stage.add_to_groups(3, window("abc"))
+        stage.slot_allocators[3] = SlotAllocator(
+            stage_geometry((1920, 1080, 0, 0)), "DP-1"
+        )
+        stage.prevPos[3] = []
+        stage.layout_history[3] = [window("abc")]
+        stage.set_workspace_mode(3, LayoutMode.STAGE_MANAGER)
+        stage.fullscreen_workspaces.add(3)
+
+        asyncio.run(
+            stage.handle_destroy_event(HyprEvent("destroyworkspacev2", "3,3", 0.0))
+        )
+
+        stats = stage.memory_stats()
+        for name in ("layout_history", "prevPos", "window_groups", "current_mode"):
+            self.assertEqual(stats[name]["entries"], 0, name)
+        self.assertEqual(stage.slot_allocators, {})
+        self.assertEqual(stage.fullscreen_workspaces, set())
+
+    def test_destroyed_workspace_gives_parked_windows_back(self):
+        stage = ParkingStage()
+        allocator = SlotAllocator(stage_geometry((1920, 1080, 0, 0)), "DP-1")
+        for i in range(1, 6):
+            allocator.allocate(f"0x{i}")
+        stage.slot_allocators[3] = allocator
+
+        asyncio.run(
+            stage.handle_destroy_event(HyprEvent("destroyworkspace", "3", 0.0))
+        )
+        self.assertEqual(stage.unparked, ["0x4", "0x5"])
+        self.assertEqual(stage.slot_allocators, {})
+
+    def test_closed_window_is_unpinned(self):
+        self.pins.create("lock1")
+        for address in ("0x1", "0x2", "0x3"):
+            self.pins.add("lock1", address)
+        self.pins.get("lock1").cursor = 2
+        self.pins.class_lookup.update({"kitty": "0x2", "firefox": "0x3"})
+        self.stage.layout_history[1] = [window(1), window(2)]
+
+        self.stage.evict_window("0x2")
+
+        self.assertEqual(self.pins.get("lock1").windows, ["0x1", "0x3"])
+        # still pointing at 0x3
+        self.assertEqual(self.pins.get("lock1").cursor, 1)
+        self.assertEqual(self.pins.class_lookup, {"firefox": "0x3"})
+        self.assertNotIn("0x2", self.pins.memberships)
+        self.assertEqual(self.stage.layout_history[1], [window(1)])
+
+
+class TestSuspension(unittest.TestCase):
+    def test_events_wait_for_screencast_to_end(self):
+        stage = RecordingStage()
+        allocator = SlotAllocator(stage_geometry((1920, 1080, 0, 0)), "DP-1")
+        allocator.allocate("0xabc")
+        stage.slot_allocators[1] = allocator
+
+        async def run():
+            await stage.handle_suspend_event(HyprEvent("screencast", "1,0", 0.0))
+            await stage.handle_window_change("closewindow", "abc")
+            self.assertIn("0xabc", allocator)
+            self.assertEqual(stage.suspended_pending, {1})
+            self.assertEqual(stage.relayouts, [])
+            await stage.handle_suspend_event(HyprEvent("screencast", "0,0", 0.0))
+
+        asyncio.run(run())
+        self.assertEqual(stage.relayouts, [{1}])
+        self.assertEqual(stage.suspended_pending, set())
+
+    def test_fullscreen_only_suspends_its_workspace(self):
+        stage = RecordingStage()
+        stage.fullscreen_workspaces.add(2)
+        self.assertTrue(stage.is_suspended(2))
+        self.assertFalse(stage.is_suspended(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import json
+import subprocess
+import sys
+import textwrap
+import unittest
+
+# must only be loaded once they are first used, never while importing
+LAZY_MODULES = ("rich", "structlog", "dbus", "cachetools")
+# share of the cumulative `import hyprplane.server` time that may be spent in
+# modules outside the standard library, hyprplane's own included. Relative,
+# so a slow machine doesn't fail it; about 0.15 when this was written
+IMPORT_BUDGET_SHARE = 0.4
+
+# records every attempt to import a lazy module, installed or not, and lets
+# the import carry on as usual
+RECORD_IMPORTS = """
+import json, sys
+
+lazy = set(sys.argv[1:])
+attempted = set()
+
+class Recorder:
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in lazy:
+            attempted.add(name.split(".")[0])
+        return None
+
+sys.meta_path.insert(0, Recorder())
+{statement}
+print(json.dumps(sorted(attempted | (lazy & set(sys.modules)))))
+"""
+
+
+def runPython(*args):
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True)
+
+
+def importTimes(stderr, module):
+    """(name, self µs, cumulative µs) of `module` and everything it imported,
+    from the output of `python -X importtime`."""
+    tree = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        if name.strip() == module:
+            return tree + [(module, int(own), int(cumulative))]
+        # a top level import done before `module`, e.g. by site
+        if not name.startswith("  "):
+            tree = []
+            continue
+        tree.append((name.strip(), int(own), int(cumulative)))
+    return []
+
+
+def isStdlib(name):
+    return name.startswith("_") or name.split(".")[0] in sys.stdlib_module_names
+
+
+class TestStartupImports(unittest.TestCase):
+    def lazyModulesTouchedBy(self, statement):
+        code = RECORD_IMPORTS.format(statement=textwrap.dedent(statement))
+        proc = runPython("-c", code, *LAZY_MODULES)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        return json.loads(proc.stdout.splitlines()[-1])
+
+    def test_server_import_defers_heavy_modules(self):
+        self.assertEqual(self.lazyModulesTouchedBy("import hyprplane.server"), [])
+
+    def test_attempts_on_missing_modules_are_seen(self):
+        # so the check above can't pass just because nothing is installed
+        statement = """
+        try:
+            import dbus
+        except ImportError:
+            pass
+        """
+        self.assertEqual(self.lazyModulesTouchedBy(statement), ["dbus"])
+
+    def test_server_import_budget(self):
+        # the first run may still have to write the bytecode caches
+        runPython("-c", "import hyprplane.server")
+        proc = runPython("-X", "importtime", "-c", "import hyprplane.server")
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+
+        times = importTimes(proc.stderr, "hyprplane.server")
+        total = times[-1][2]
+        added = sum(own for name, own, _ in times if not isStdlib(name))
+        print(f"hyprplane.server imported in {total} us, {added} us outside stdlib")
+        self.assertLess(added, IMPORT_BUDGET_SHARE * total)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from hyprplane.tracing import Tracer
+
+
+class TestTracer(unittest.TestCase):
+    def test_disabled_tracer_records_nothing(self):
+        tracer = Tracer()
+        with tracer.span("command.lockpin"):
+            pass
+        self.assertEqual(tracer.events, [])
+
+    def test_children_link_to_parent_across_await(self):
+        tracer = Tracer()
+        path = os.path.join(tempfile.mkdtemp(), "trace.json")
+        tracer.start(path)
+
+        async def child():
+            with tracer.span("hyprctl.clients", "hyprctl"):
+                await asyncio.sleep(0)
+
+        async def parent():
+            with tracer.span("command.estage", "command"):
+                await asyncio.gather(child(), child())
+
+        asyncio.run(parent())
+        self.assertEqual(tracer.stop(), path)
+
+        with open(path) as f:
+            events = json.load(f)["traceEvents"]
+        parent_event = next(e for e in events if e["name"] == "command.estage")
+        children = [e for e in events if e["name"] == "hyprctl.clients"]
+        self.assertEqual(len(children), 2)
+        for event in children:
+            self.assertEqual(event["ph"], "X")
+            self.assertEqual(event["args"]["parent"], parent_event["args"]["id"])
+
+    def test_spans_open_at_stop_are_not_kept(self):
+        tracer = Tracer()
+        path = os.path.join(tempfile.mkdtemp(), "trace.json")
+        tracer.start(path)
+
+        async def run():
+            with tracer.span("command.trace", "command"):
+                return await tracer.stop_async()
+
+        self.assertEqual(asyncio.run(run()), path)
+        self.assertEqual(tracer.events, [])
+        with open(path) as f:
+            self.assertEqual(json.load(f)["traceEvents"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()